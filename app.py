@@ -17,8 +17,14 @@ if os.getenv("SUPABASE_SERVICE_KEY") and not os.getenv("SUPABASE_SERVICE_ROLE_KE
     os.environ["SUPABASE_SERVICE_ROLE_KEY"] = os.environ["SUPABASE_SERVICE_KEY"]
 
 # รัน streamlit_app.py แบบสคริปต์หลัก (รองรับสคริปต์คลาสสิก)
+# compile ครั้งเดียวต่อ process แล้วใช้ code object ซ้ำทุก rerun (compile ใหม่เมื่อไฟล์ถูกแก้ = mtime เปลี่ยน)
+# ส่วนที่หนักและไม่มี side effect อยู่ใน telemed_core.py ซึ่ง import ครั้งเดียว
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _compiled_app(path: str, mtime: float):
+    return compile(Path(path).read_text(encoding="utf-8"), "streamlit_app.py", "exec")
+
 try:
-    code = Path(__file__).with_name("streamlit_app.py").read_text(encoding="utf-8")
-    exec(compile(code, "streamlit_app.py", "exec"), {"__name__": "__main__"})
+    script = Path(__file__).with_name("streamlit_app.py")
+    exec(_compiled_app(str(script), script.stat().st_mtime), {"__name__": "__main__"})
 except Exception as e:
     st.error("⚠️ Error while running streamlit_app.py"); st.code("".join(traceback.format_exception(type(e), e, e.__traceback__)))
@@ -0,0 +1,290 @@
+# bench_dashboard.py
+# ============================================================
+# Benchmark ของ pipeline หน้า Dashboard แบบไม่ต้องเปิด Streamlit
+# - ข้อมูลจาก demo_seed (โรงพยาบาล × วัน) ผ่าน data source สำรอง:
+#     --source memory : frame แบบเดียวกับ TableCache (ไม่วัดขั้น load)
+#     --source sqlite : local_backend + TableCache จริง (วัด load_df ด้วย)
+# - ขั้นตอนเหมือน render_dashboard / build_export:
+#     load → filter (hospital_ids_for) → merge (slice_tx + merge_hospitals)
+#     → aggregate (pandas: KPI + groupby) → cube_build / cube_aggregate (FilterCube)
+#     → figures → csv / excel (export_sheets + df_to_excel_bytes) → png (ถ้าใส่ --png)
+# - parametrize: hospitals × days × selectivity (สัดส่วนโรงพยาบาลที่เลือกในตัวกรอง)
+# - รายงานเวลาแต่ละขั้น (median ของ --repeat รอบ) + peak memory (tracemalloc อีกหนึ่งรอบ)
+# - บันทึก baseline เป็น JSON แล้วเทียบภายหลังด้วย --compare
+# ตัวอย่าง:
+#   python bench_dashboard.py --quick
+#   python bench_dashboard.py --save-baseline bench_baseline.json
+#   python bench_dashboard.py --compare bench_baseline.json --fail-on-regression
+# ============================================================
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import demo_seed
+from data_cache import TableCache
+from filter_cube import FilterCube
+from telemed_core import (BACKFILL_MAX_DAYS, HOSPITAL_BAR_SIZES, PALETTE_PASTEL, TX_COLS, aggregate_dashboard,
+                          daily_trend_figure, df_to_excel_bytes, donut_figure, export_sheets, hospital_bar_figure,
+                          hospital_ids_for, hospital_page, hospital_ranking, merge_hospitals, site_table_figure,
+                          slice_tx, type_bar_figure)
+
+GRID_HOSPITALS = (10, 100, 1000)
+GRID_DAYS = (30, 365, 3650)
+GRID_SELECTIVITY = (1.0, 0.1, 0.01)
+QUICK = ((10, 100), (30, 365), (1.0, 0.1))
+STAGES = ("load", "filter", "merge", "aggregate", "cube_build", "cube_aggregate", "figures", "csv", "excel", "png")
+END = date(2025, 12, 31)        # วันสุดท้ายของข้อมูล (คงที่ให้เทียบข้ามรอบได้)
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_S = 0.005        # ต่างกันน้อยกว่านี้ถือเป็น noise
+
+
+class Dataset:
+    """ข้อมูลหนึ่งชุด (hospitals × days) + frame ในรูปแบบเดียวกับ TableCache"""
+
+    def __init__(self, n_hospitals: int, days: int, seed: int, source: str, page_size: int):
+        self.n_hospitals, self.days, self.source, self.page_size = n_hospitals, days, source, page_size
+        self.hospitals = pd.DataFrame(demo_seed.generate_hospitals(n_hospitals, seed))
+        self.tx = demo_seed.generate_transactions(self.hospitals.to_dict("records"), END, days, seed)
+        self.client = None
+        if source == "sqlite":
+            import local_backend
+            self.client = local_backend.LocalClient(":memory:")
+            self.client.load_frame("hospitals", self.hospitals)
+            self.client.load_frame("transactions", self.tx)
+
+    def load(self):
+        """คืน (transactions frame, hospitals frame) แบบที่ data_tables() ให้"""
+        if self.client is not None:
+            tx = TableCache(self.client, "transactions", columns=("id",) + TX_COLS, date_cols=("date",),
+                            int_cols=("transactions_count", "riders_active"), page_size=self.page_size)
+            h = TableCache(self.client, "hospitals", page_size=self.page_size)
+            return tx.snapshot(), h.snapshot().copy()
+        tx = self.tx[["id"] + list(TX_COLS)].copy()
+        tx["date"] = pd.to_datetime(tx["date"])
+        return tx, self.hospitals.copy()
+
+
+def build_figures(agg: dict, start: date, end: date) -> dict:
+    """กราฟชุดเดียวกับ render_dashboard (ค่า widget เริ่มต้น, โหมดสว่าง)"""
+    figs = {}
+    gsite = agg["by_site"].sort_values("transactions_count", ascending=False)
+    if not gsite.empty:
+        figs["pie_sitecontrol"] = donut_figure(gsite, "site_control", PALETTE_PASTEL, False)
+    daily = agg["daily"].sort_values("date")
+    daily_sel = daily[(daily["date"] >= start) & (daily["date"] <= end)]
+    back = 7 if (end - start).days <= 2 else 0
+    daily_back = daily[(daily["date"] >= start - timedelta(days=back)) & (daily["date"] < start)] if back \
+        else daily.iloc[0:0]
+    if not (daily_sel.empty and daily_back.empty):
+        figs["line_daily_trend"] = daily_trend_figure(daily_sel, daily_back)
+    if not agg["by_type"].empty:
+        gtype = agg["by_type"].copy()
+        gtype["avg_tx_per_hosp"] = gtype["transactions_count"] / gtype["hospitals_count"]
+        gtype = gtype.sort_values("transactions_count", ascending=False)
+        figs["pie_hospital_type"] = donut_figure(gtype, "hospital_type", PALETTE_PASTEL, False, total_font=16)
+        figs["bar_hospital_type"] = type_bar_figure(gtype, PALETTE_PASTEL)
+    if not agg["by_hospital"].empty:
+        gh = agg["by_hospital"][["name", "transactions_count"]].sort_values("transactions_count", ascending=False)
+        gh = gh.reset_index(drop=True)
+        figs["bar_hospital_overview"] = hospital_bar_figure(hospital_page(gh, 1, HOSPITAL_BAR_SIZES[1]), PALETTE_PASTEL)
+        hospital_ranking(gh)
+    if not agg["by_site"].empty:
+        figs["table_site"] = site_table_figure(agg["by_site"], False)
+    return figs
+
+
+def run_pipeline(ds: Dataset, selectivity: float, range_days: int, renderer=None) -> Dict[str, float]:
+    """หนึ่งรอบของ pipeline คืนเวลาแต่ละขั้น (วินาที)"""
+    t: Dict[str, float] = {}
+
+    def lap(name, t0):
+        t[name] = time.perf_counter() - t0
+        return time.perf_counter()
+
+    end = END
+    start = end - timedelta(days=range_days - 1)
+    load_from = min(start - timedelta(days=BACKFILL_MAX_DAYS), end.replace(day=1))
+
+    t0 = time.perf_counter()
+    tx_frame, hospitals = ds.load()
+    t0 = lap("load", t0) if ds.client is not None else time.perf_counter()
+
+    names = sorted(hospitals["name"].tolist())
+    k = len(names) if selectivity >= 1 else max(1, int(round(len(names) * selectivity)))
+    filters = {} if k >= len(names) else {"name": names[:k]}
+    hosp_ids = hospital_ids_for(hospitals, filters)
+    t0 = lap("filter", t0)
+
+    rows = merge_hospitals(slice_tx(tx_frame, load_from, end, hosp_ids), hospitals, filters)
+    t0 = lap("merge", t0)
+
+    agg = aggregate_dashboard(rows, start, end)
+    t0 = lap("aggregate", t0)
+
+    cube = FilterCube.build(tx_frame, hospitals)
+    t0 = lap("cube_build", t0)
+    cube.aggregate(start, end, load_from, filters)
+    t0 = lap("cube_aggregate", t0)
+
+    figs = build_figures(agg, start, end)
+    t0 = lap("figures", t0)
+
+    sheets = export_sheets(rows, agg, start, end)
+    sheets["filtered"].to_csv(index=False).encode("utf-8-sig")
+    t0 = lap("csv", t0)
+    df_to_excel_bytes(sheets)
+    t0 = lap("excel", t0)
+
+    if renderer is not None:
+        from telemed_core import PNG_ORDER, compose_dashboard_png
+        rendered = renderer.render([figs[k] for k in PNG_ORDER if k in figs])
+        compose_dashboard_png([png for _, png in rendered if png], "DashBoard Telemedicine", "bench")
+        lap("png", t0)
+    return t
+
+
+def run_scenario(ds: Dataset, selectivity: float, args, renderer=None) -> dict:
+    runs = [run_pipeline(ds, selectivity, args.range_days, renderer) for _ in range(max(1, args.repeat))]
+    stages = {s: statistics.median(r[s] for r in runs) for s in STAGES if s in runs[0]}
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_pipeline(ds, selectivity, args.range_days, renderer)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "hospitals": ds.n_hospitals, "days": ds.days, "selectivity": selectivity,
+        "rows": int(len(ds.tx)), "source": ds.source,
+        "stages": {k: round(v, 6) for k, v in stages.items()},
+        "total_s": round(sum(stages.values()), 6),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def _key(r: dict) -> tuple:
+    return (r["hospitals"], r["days"], r["selectivity"], r.get("source", "memory"))
+
+
+def compare(results: List[dict], baseline: dict, ratio: float) -> List[str]:
+    """รายการ regression (ขั้นที่ช้ากว่า baseline เกิน ratio เท่า)"""
+    base = {_key(r): r for r in baseline.get("results", [])}
+    out = []
+    for r in results:
+        b = base.get(_key(r))
+        if not b:
+            continue
+        for stage, v in r["stages"].items():
+            old = b["stages"].get(stage)
+            if old and v > old * ratio and v - old > REGRESSION_MIN_S:
+                out.append(f"{r['hospitals']}h×{r['days']}d sel={r['selectivity']:g} {stage}: "
+                           f"{old * 1000:.1f} → {v * 1000:.1f} ms (×{v / old:.2f})")
+        if b.get("peak_mb") and r["peak_mb"] > b["peak_mb"] * ratio:
+            out.append(f"{r['hospitals']}h×{r['days']}d sel={r['selectivity']:g} peak: "
+                       f"{b['peak_mb']:.1f} → {r['peak_mb']:.1f} MB")
+    return out
+
+
+def print_table(results: List[dict]) -> None:
+    cols = [s for s in STAGES if any(s in r["stages"] for r in results)]
+    head = f"{'hosp':>5} {'days':>5} {'sel':>5} {'rows':>9} " + " ".join(f"{c[:10]:>10}" for c in cols) \
+        + f" {'total':>9} {'peakMB':>8}"
+    print(head)
+    print("-" * len(head))
+    for r in results:
+        cells = " ".join(f"{r['stages'].get(c, float('nan')) * 1000:>10.1f}" for c in cols)
+        print(f"{r['hospitals']:>5} {r['days']:>5} {r['selectivity']:>5g} {r['rows']:>9,} {cells} "
+              f"{r['total_s'] * 1000:>9.1f} {r['peak_mb']:>8.1f}")
+    print("(เวลาเป็นมิลลิวินาที, median)")
+
+
+def _ints(s: str) -> tuple:
+    return tuple(int(x) for x in s.split(","))
+
+
+def _floats(s: str) -> tuple:
+    return tuple(float(x) for x in s.split(","))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="benchmark pipeline หน้า Dashboard (headless)")
+    ap.add_argument("--hospitals", type=_ints, default=GRID_HOSPITALS)
+    ap.add_argument("--days", type=_ints, default=GRID_DAYS)
+    ap.add_argument("--selectivity", type=_floats, default=GRID_SELECTIVITY)
+    ap.add_argument("--quick", action="store_true", help="grid เล็ก (10,100 รพ. × 30,365 วัน)")
+    ap.add_argument("--range-days", type=int, default=30, help="ช่วงวันที่เลือกบน dashboard")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--source", choices=("memory", "sqlite"), default="memory")
+    ap.add_argument("--page-size", type=int, default=1000, help="ขนาดหน้าของ TableCache (--source sqlite)")
+    ap.add_argument("--png", action="store_true", help="วัดการเรนเดอร์ PNG ด้วย (ต้องมี kaleido + Chrome)")
+    ap.add_argument("--json", metavar="PATH", help="เขียนผลเป็น JSON")
+    ap.add_argument("--save-baseline", metavar="PATH", help="บันทึกผลเป็น baseline")
+    ap.add_argument("--compare", metavar="PATH", help="เทียบกับ baseline")
+    ap.add_argument("--threshold", type=float, default=REGRESSION_RATIO)
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args(argv)
+    if args.quick:
+        args.hospitals, args.days, args.selectivity = QUICK
+
+    renderer = None
+    if args.png:
+        from png_render import PngRenderer
+        renderer = PngRenderer(workers=4, scale=2, cache_size=0, composite_size=0).start()
+
+    # รอบอุ่นเครื่อง (import แบบ lazy ของ plotly/openpyxl ไม่ให้ไปตกกับ scenario แรก)
+    run_pipeline(Dataset(5, 7, args.seed, "memory", args.page_size), 1.0, args.range_days)
+
+    results = []
+    for n_h in args.hospitals:
+        for days in args.days:
+            t0 = time.perf_counter()
+            ds = Dataset(n_h, days, args.seed, args.source, args.page_size)
+            print(f"# dataset {n_h} รพ. × {days} วัน = {len(ds.tx):,} แถว ({time.perf_counter() - t0:.1f}s)",
+                  file=sys.stderr)
+            for sel in args.selectivity:
+                results.append(run_scenario(ds, sel, args, renderer))
+            del ds
+            gc.collect()
+
+    print_table(results)
+    report = {
+        "meta": {"created": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "pandas": pd.__version__, "numpy": np.__version__, "machine": platform.platform(),
+                 "range_days": args.range_days, "repeat": args.repeat, "seed": args.seed, "end": END.isoformat()},
+        "results": results,
+    }
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nช้ากว่า baseline เกิน ×{args.threshold:g}:")
+            for line in regressions:
+                print("  " + line)
+            if args.fail_on_regression:
+                return 1
+        else:
+            print("\nไม่พบ regression เทียบกับ baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
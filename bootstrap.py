@@ -0,0 +1,103 @@
+# bootstrap.py
+# ============================================================
+# งานตอนเริ่ม process (เรียกครั้งเดียวผ่าน st.cache_resource ใน streamlit_app.py)
+# - สร้างผู้ดูแลเริ่มต้น (telemed) ถ้ายังไม่มี
+# - ตรวจว่ามีตาราง/คอลัมน์ที่ไม่บังคับหรือไม่ → Capabilities
+#   ส่วนอื่นของแอปอ่าน flag นี้แทนการลองเขียนแล้ว try/except ทุกครั้ง
+# - ตัดสินว่า "ไม่มี" เฉพาะเมื่อ Postgres/PostgREST ตอบว่าไม่มีจริง
+#   (เครือข่ายล้ม/อื่น ๆ ถือว่ามี เพื่อไม่ให้ปิดฟีเจอร์ทั้ง process เพราะ error ชั่วคราว)
+# ============================================================
+
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Dict, Iterable, List, Tuple
+
+from postgrest.exceptions import APIError
+
+OPTIONAL_TABLES = ("hospital_types", "service_models_master", "settings", "transactions_monthly")
+OPTIONAL_COLUMNS = {"hospitals": ("hospital_type", "service_models")}
+
+MISSING_TABLE_CODES = {"42P01", "PGRST205", "PGRST106"}  # undefined_table / ไม่อยู่ใน schema cache
+MISSING_COLUMN_CODES = {"42703", "PGRST204"}              # undefined_column
+
+DEFAULT_ADMIN = ("telemed", "Telemed@DHI")
+
+
+class Capabilities:
+    """ผลการตรวจตอนเริ่ม process (อ่านอย่างเดียว)"""
+
+    def __init__(self, tables: Dict[str, bool], columns: Dict[Tuple[str, str], bool],
+                 admin_seeded: bool = False, notes: List[str] | None = None):
+        self.tables = tables
+        self.columns = columns
+        self.admin_seeded = admin_seeded
+        self.notes = notes or []
+        self.checked_at = time.time()
+
+    def has_table(self, table: str) -> bool:
+        return self.tables.get(table, True)
+
+    def has_column(self, table: str, col: str) -> bool:
+        return self.columns.get((table, col), True)
+
+    def strip(self, table: str, payload: dict) -> dict:
+        """ตัดคอลัมน์ที่ตารางยังไม่มีออกจาก payload ก่อนเขียน"""
+        return {k: v for k, v in payload.items() if self.has_column(table, k)}
+
+    def missing(self) -> List[str]:
+        return ([t for t, ok in self.tables.items() if not ok]
+                + [f"{t}.{c}" for (t, c), ok in self.columns.items() if not ok])
+
+
+def _code(e: Exception) -> str:
+    return str(getattr(e, "code", "") or "")
+
+
+def probe_table(client, table: str) -> bool:
+    try:
+        client.table(table).select("*").limit(1).execute()
+        return True
+    except APIError as e:
+        return _code(e) not in MISSING_TABLE_CODES
+    except Exception:
+        return True
+
+
+def probe_column(client, table: str, col: str) -> bool:
+    try:
+        client.table(table).select(col).limit(1).execute()
+        return True
+    except APIError as e:
+        return _code(e) not in (MISSING_COLUMN_CODES | MISSING_TABLE_CODES)
+    except Exception:
+        return True
+
+
+def ensure_default_admin(client) -> bool:
+    """สร้างผู้ดูแลเริ่มต้นถ้ายังไม่มี คืน True เมื่อสร้างใหม่"""
+    username, password = DEFAULT_ADMIN
+    try:
+        rows = client.table("admins").select("username").eq("username", username).execute().data
+        if rows:
+            return False
+        from bcrypt import gensalt, hashpw
+        client.table("admins").insert({
+            "id": str(uuid.uuid4()),
+            "username": username,
+            "password_hash": hashpw(password.encode(), gensalt()).decode(),
+            "role": "admin",
+        }).execute()
+        return True
+    except Exception:
+        return False
+
+
+def run(client, tables: Iterable[str] = OPTIONAL_TABLES,
+        columns: Dict[str, Iterable[str]] = OPTIONAL_COLUMNS) -> Capabilities:
+    seeded = ensure_default_admin(client)
+    t_ok = {t: probe_table(client, t) for t in tables}
+    c_ok = {(t, c): probe_column(client, t, c) for t, cols in columns.items() for c in cols}
+    notes = ["สร้างผู้ดูแลเริ่มต้น telemed แล้ว"] if seeded else []
+    return Capabilities(t_ok, c_ok, seeded, notes)
@@ -0,0 +1,338 @@
+# data_cache.py
+# ============================================================
+# Process-wide incremental cache สำหรับตารางหลัก (transactions / hospitals)
+# - เก็บ DataFrame ไว้ใน memory ใช้ร่วมกันทุก session (สร้างผ่าน st.cache_resource)
+# - refresh() ดึงเฉพาะแถวที่เปลี่ยนหลัง watermark (updated_at ถ้ามี ไม่งั้น created_at)
+# - หน้า admin เขียนแล้วให้ patch cache ตรง ๆ (upsert_rows / delete_where)
+#   แทนการล้าง cache ทั้งหมด
+# - full resync เป็นระยะ เพื่อจับแถวที่ถูกลบ/แก้จาก process อื่น
+# - version เปลี่ยน (และแจ้งผู้ติดตาม) เฉพาะเมื่อข้อมูลเปลี่ยนจริง: แถวที่ดึงซ้ำในช่วง lookback
+#   หรือ full resync ที่ได้ข้อมูลเดิมไม่นับ → cache ที่ key ด้วย version (cube/ไฟล์ส่งออก/rollup) ใช้ต่อได้
+# - frame ถือเป็น immutable: ทุกการเปลี่ยนสร้าง frame ใหม่ ผู้อ่านจึงไม่ต้องล็อก
+# - index_cols: dict (คอลัมน์ index) → แถว สำหรับค้นทีละแถวแบบ O(1)
+#   สร้างตอนค้นครั้งแรก แล้ว patch ตาม upsert/delete (full resync สร้างใหม่)
+# - subscribe(fn): แจ้งทุกการเปลี่ยนเป็น fn(removed, added) เพื่อให้โครงสร้างที่ต่อยอด
+#   (เช่น monthly_rollup) ปรับตามทีละ delta; removed=None = โหลดใหม่ทั้งตาราง (added = frame ทั้งหมด)
+# - tables_version / cache_key: key ของผลลัพธ์ที่สร้างจากหลายตาราง (ไฟล์ส่งออก ฯลฯ)
+# ============================================================
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+WATERMARK_COLS = ("updated_at", "created_at")
+WATERMARK_LOOKBACK = pd.Timedelta(minutes=2)  # เผื่อเวลาเครื่องที่เขียน created_at ไม่ตรงกัน
+NO_WATERMARK_TTL = 60.0  # ตารางที่ไม่มีคอลัมน์ watermark → โหลดใหม่ทั้งตารางตามรอบนี้
+
+
+def fetch_all(make_query: Callable, page_size: int = 1000) -> list:
+    """
+    อ่านผลลัพธ์ทีละหน้าด้วย range() จนครบทุกแถว
+    - make_query: ฟังก์ชันที่สร้าง query ใหม่ทุกครั้ง (range() ซ้อนบน builder เดิมไม่ได้)
+    - query ต้องมี order() ที่คงที่ ไม่งั้นหน้าอาจซ้อน/ข้ามกัน
+    """
+    rows, start = [], 0
+    while True:
+        page = make_query().range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def _same_values(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """เทียบทีละแถว (ค่าว่างทั้งคู่ = เท่ากัน); คอลัมน์ object (เช่น list) เทียบเป็นข้อความ"""
+    if a.dtype == b.dtype and a.dtype != object:
+        return (a.to_numpy() == b.to_numpy()) | (a.isna().to_numpy() & b.isna().to_numpy())
+    text = lambda s: np.array(["" if v is None or v is pd.NA or v != v else str(v)
+                               for v in s.to_numpy(dtype=object)], dtype=object)
+    return text(a) == text(b)
+
+
+def tables_version(*tables: "TableCache") -> tuple:
+    """version รวมของหลายตาราง (เปลี่ยนเมื่อข้อมูลของตารางใดเปลี่ยนจริงเท่านั้น)"""
+    return tuple(t.version for t in tables)
+
+
+def cache_key(**parts) -> str:
+    """sha1 ของ parts (ลำดับ key ไม่มีผล ค่าที่ไม่ใช่ JSON ใช้ str())"""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class TableCache:
+    """
+    Cache ของตารางเดียว
+    - columns: คอลัมน์ที่ต้องการ (None = ทั้งหมด)
+    - date_cols: คอลัมน์ที่เก็บเป็น datetime64 (normalize เป็นวัน)
+    - int_cols: คอลัมน์ตัวเลขที่เติม 0 แทนค่าว่าง
+    - min_interval: ไม่เช็ค delta ถี่กว่านี้ (วินาที) แม้มีหลาย session rerun พร้อมกัน
+    - full_every: full resync ทุก ๆ กี่วินาที
+    - index_cols: คอลัมน์ที่ใช้ค้นทีละแถวด้วย lookup() (เช่น hospital_id, date)
+    """
+
+    def __init__(self, client, table: str, columns: Optional[Sequence[str]] = None, key: str = "id",
+                 date_cols: Sequence[str] = (), int_cols: Sequence[str] = (),
+                 min_interval: float = 5.0, full_every: float = 600.0, page_size: int = 1000,
+                 index_cols: Sequence[str] = ()):
+        self.client = client
+        self.table = table
+        self.columns = tuple(columns) if columns else None
+        self.key = key
+        self.date_cols = tuple(date_cols)
+        self.int_cols = tuple(int_cols)
+        self.min_interval = min_interval
+        self.full_every = full_every
+        self.page_size = page_size
+        self.index_cols = tuple(index_cols)
+
+        self.frame = pd.DataFrame(columns=list(self.columns or (key,)))
+        self.version = 0
+        self.wm_col: Optional[str] = None
+        self.watermark: Optional[pd.Timestamp] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self._index: Optional[Dict[tuple, tuple]] = None
+        self._listeners: List[Callable] = []
+
+    # ---------- internal ----------
+    def _notify(self, removed: Optional[pd.DataFrame], added: pd.DataFrame) -> None:
+        for fn in self._listeners:
+            fn(removed, added)
+
+    def _select(self, wm_col: Optional[str]) -> str:
+        if self.columns is None:
+            return "*"
+        cols = list(self.columns)
+        if wm_col and wm_col not in cols:
+            cols.append(wm_col)
+        return ",".join(cols)
+
+    def _fetch(self, wm_col: Optional[str], since: Optional[pd.Timestamp] = None) -> list:
+        def make_query():
+            q = self.client.table(self.table).select(self._select(wm_col))
+            if since is not None:
+                q = q.gte(wm_col, since.isoformat())
+            return q.order(self.key)
+        return fetch_all(make_query, self.page_size)
+
+    def _normalize(self, rows, complete: bool = True) -> pd.DataFrame:
+        df = pd.DataFrame(list(rows))
+        if self.key in df.columns:
+            df[self.key] = df[self.key].astype(str)
+        for c in self.date_cols:
+            if c in df.columns:
+                df[c] = pd.to_datetime(df[c]).dt.normalize()
+        return self._complete(df) if complete else df
+
+    def _complete(self, df: pd.DataFrame) -> pd.DataFrame:
+        for c in self.columns or ():
+            if c not in df.columns:
+                df[c] = None
+        for c in self.int_cols:
+            if c in df.columns:
+                df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+        return df
+
+    def _index_keys(self, df: pd.DataFrame) -> list:
+        parts = []
+        for c in self.index_cols:
+            col = df[c]
+            parts.append(col.dt.date if c in self.date_cols else col.astype(str))
+        return list(zip(*parts))
+
+    def _index_rows(self, df: pd.DataFrame) -> Dict[tuple, tuple]:
+        if df.empty or any(c not in df.columns for c in self.index_cols):
+            return {}
+        return dict(zip(self._index_keys(df), df.itertuples(index=False, name=None)))
+
+    def _index_drop(self, df: pd.DataFrame) -> None:
+        if self._index is not None and not df.empty:
+            for k in self._index_keys(df):
+                self._index.pop(k, None)
+
+    def _advance_watermark(self, df: pd.DataFrame) -> None:
+        if not self.wm_col or self.wm_col not in df.columns or df.empty:
+            return
+        wm = pd.to_datetime(df[self.wm_col], errors="coerce", utc=True).max()
+        if pd.notna(wm) and (self.watermark is None or wm > self.watermark):
+            self.watermark = wm
+
+    def _full_load(self) -> None:
+        if self.columns is None:
+            df = self._normalize(self._fetch(None))
+            wm_col = next((c for c in WATERMARK_COLS if c in df.columns), None)
+        else:
+            # ลองคอลัมน์ watermark ตามลำดับ (ตารางอาจยังไม่มี updated_at)
+            for wm_col in WATERMARK_COLS + (None,):
+                try:
+                    df = self._normalize(self._fetch(wm_col))
+                    break
+                except Exception:
+                    if wm_col is None:
+                        raise
+        self.wm_col = wm_col
+        self.watermark = None
+        self._advance_watermark(df)
+        self._loaded_at = self._checked_at = time.time()
+        if self.version and self._unchanged(df):
+            return   # full resync ที่ได้ข้อมูลเดิม → ไม่เปลี่ยน version / ไม่แจ้งผู้ติดตาม
+        self.frame = df
+        self._index = None
+        self.version += 1
+        self._notify(None, df)
+
+    def _unchanged(self, df: pd.DataFrame) -> bool:
+        """ผล full load ตรงกับ frame ปัจจุบันทุกแถว (ลำดับแถวไม่สำคัญ)"""
+        if len(df) != len(self.frame) or set(df.columns) != set(self.frame.columns):
+            return False
+        if self.key not in df.columns:
+            return df.equals(self.frame)
+        return self._changed(df).empty
+
+    def _changed(self, delta: pd.DataFrame) -> pd.DataFrame:
+        """
+        เฉพาะแถวของ delta ที่ใหม่หรือต่างจากแถวใน cache
+        (ช่วง lookback ของ watermark ดึงแถวล่าสุดซ้ำทุกรอบ → ไม่นับเป็นการเปลี่ยนแปลง)
+        """
+        old = self.frame
+        if delta.empty or old.empty or self.key not in delta.columns or any(c not in old.columns for c in delta.columns):
+            return delta
+        delta = delta.drop_duplicates(self.key, keep="last").reset_index(drop=True)
+        keys = pd.Index(old[self.key])
+        if not keys.is_unique:
+            return delta
+        pos = keys.get_indexer(delta[self.key])
+        hit = np.flatnonzero(pos >= 0)
+        if not len(hit):
+            return delta
+        same = np.ones(len(hit), dtype=bool)
+        for c in delta.columns:
+            same &= _same_values(delta[c].iloc[hit], old[c].iloc[pos[hit]])
+        keep = np.ones(len(delta), dtype=bool)
+        keep[hit[same]] = False
+        return delta[keep]
+
+    def _merge(self, new: pd.DataFrame) -> None:
+        if new.empty:
+            return
+        new = new.drop_duplicates(self.key, keep="last")
+        old = self.frame
+        removed = old.iloc[0:0]
+        if not old.empty:
+            replaced = old[self.key].isin(new[self.key])
+            removed = old[replaced]
+            self._index_drop(removed)
+            old = old[~replaced]
+        self.frame = pd.concat([old, new], ignore_index=True) if not old.empty else new.reset_index(drop=True)
+        if self._index is not None:
+            self._index.update(self._index_rows(self.frame.tail(len(new))))
+        self.version += 1
+        self._notify(removed, new)
+
+    # ---------- public ----------
+    def refresh(self, force: bool = False) -> "TableCache":
+        """โหลดครั้งแรก/full resync ตามรอบ/ดึง delta หลัง watermark"""
+        now = time.time()
+        if not force and self._loaded_at and now - self._checked_at < self.min_interval:
+            return self
+        with self._lock:
+            now = time.time()
+            if not force and self._loaded_at and now - self._checked_at < self.min_interval:
+                return self
+            every = self.full_every if self.wm_col else min(self.full_every, NO_WATERMARK_TTL)
+            if not self._loaded_at or now - self._loaded_at >= every:
+                self._full_load()
+                return self
+            # watermark ว่าง = ตารางยังว่างตอนโหลด → ดึงทั้งหมด (ซึ่งก็คือแถวใหม่)
+            since = self.watermark - WATERMARK_LOOKBACK if self.watermark is not None else None
+            delta = self._normalize(self._fetch(self.wm_col, since))
+            self._merge(self._changed(delta))
+            self._advance_watermark(delta)
+            self._checked_at = time.time()
+        return self
+
+    def snapshot(self) -> pd.DataFrame:
+        """frame ปัจจุบัน (ห้ามแก้ไข in-place)"""
+        return self.refresh().frame
+
+    def upsert_rows(self, rows: Iterable[dict]) -> None:
+        """patch แถวที่เพิ่ง insert/update (ต้องมีคอลัมน์ key)"""
+        rows = [r for r in rows if r and r.get(self.key) is not None]
+        if not rows:
+            return
+        with self._lock:
+            new = self._normalize(rows, complete=False)
+            if not self.frame.empty:
+                # update บางคอลัมน์ → เติมคอลัมน์ที่เหลือจากแถวเดิม
+                base = self.frame.set_index(self.key)
+                new = new.set_index(self.key)
+                known = new.index.intersection(base.index)
+                if len(known):
+                    merged = base.loc[known].copy()
+                    merged.update(new.loc[known])
+                    new = pd.concat([merged, new.loc[new.index.difference(known)]])
+                new = new.reset_index()
+            self._merge(self._complete(new))
+
+    def delete_where(self, col: str, values: Iterable) -> int:
+        """ลบแถวที่ col อยู่ใน values ออกจาก cache คืนจำนวนแถวที่ลบ"""
+        values = [str(v) for v in values]
+        with self._lock:
+            if self.frame.empty or col not in self.frame.columns or not values:
+                return 0
+            mask = self.frame[col].astype(str).isin(values)
+            n = int(mask.sum())
+            if n:
+                removed = self.frame[mask]
+                self._index_drop(removed)
+                self.frame = self.frame[~mask].reset_index(drop=True)
+                self.version += 1
+                self._notify(removed, removed.iloc[0:0])
+            return n
+
+    def subscribe(self, fn: Callable[[Optional[pd.DataFrame], pd.DataFrame], None]) -> None:
+        """ลงทะเบียนผู้ติดตามการเปลี่ยนแปลง (ถ้าโหลดแล้ว เรียก fn(None, frame) ทันทีเพื่อตั้งต้น)"""
+        with self._lock:
+            self._listeners.append(fn)
+            if self._loaded_at:
+                fn(None, self.frame)
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._loaded_at)
+
+    def lookup(self, *key) -> Optional[dict]:
+        """
+        แถวเดียวตาม index_cols (เช่น lookup(hospital_id, date)) ไม่พบคืน None
+        ค่าคอลัมน์วันที่คืนเป็น datetime.date
+        """
+        if not self.index_cols:
+            raise ValueError(f"{self.table}: ไม่ได้กำหนด index_cols")
+        self.refresh()
+        with self._lock:
+            if self._index is None:
+                self._index = self._index_rows(self.frame)
+            row = self._index.get(tuple(self._key_part(c, v) for c, v in zip(self.index_cols, key)))
+            cols = list(self.frame.columns)
+        if row is None:
+            return None
+        out = dict(zip(cols, row))
+        for c in self.date_cols:
+            if isinstance(out.get(c), pd.Timestamp):
+                out[c] = out[c].date()
+        return out
+
+    def _key_part(self, col: str, value):
+        if col in self.date_cols:
+            return value if type(value) is date else pd.Timestamp(value).date()
+        return str(value)
@@ -0,0 +1,210 @@
+# demo_seed.py
+# ============================================================
+# สร้างข้อมูลตัวอย่าง (โรงพยาบาล N แห่ง × D วัน) สำหรับทดสอบ/วัดประสิทธิภาพ
+# - กระจายจังหวัดตาม TH_PROVINCES, ทีมตามภูมิภาค, ประเภทตาม DEFAULT_HOSPITAL_TYPES
+# - ยอดรายวันขึ้นกับประเภทโรงพยาบาล + วันในสัปดาห์ + แนวโน้มรายปี + noise (สร้างด้วย NumPy ทั้งก้อน)
+# - riders_active ไม่เกิน riders_count ของโรงพยาบาล
+# - เขียนทีละ batch ใหญ่ (insert หลายพันแถวต่อครั้ง)
+# - ชื่อ "<prefix><เลข 4 หลัก> <จังหวัด>": เลขที่มีในฐานข้อมูลแล้วถูกข้าม → รันซ้ำไม่สร้างโรงพยาบาลซ้ำ
+# ใช้ได้ทั้งจากหน้า admin และ CLI:
+#   python demo_seed.py --hospitals 300 --days 1095            # เขียนลง Supabase (service key)
+#   python demo_seed.py --hospitals 300 --days 1095 --csv out   # เขียนเป็น CSV (ไม่ต่อเครือข่าย)
+#   python demo_seed.py --delete                                # ลบข้อมูลตัวอย่างทั้งหมด
+# ============================================================
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+import uuid
+from datetime import date, datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from data_cache import fetch_all
+from telemed_core import (DEFAULT_HOSPITAL_TYPES, DEFAULT_SERVICE_MODELS, SITE_CONTROL_CHOICES,
+                          SYSTEM_CHOICES, TH_PROVINCES)
+
+DEMO_PREFIX = "รพ.ทดสอบ "
+# ข้อมูลตัวอย่างชุดเดิม (5 รพ.) ยังลบได้ด้วยปุ่ม/คำสั่งเดียวกัน
+LEGACY_DEMO_NAMES = ['รพ.หาดใหญ่', 'รพ.เชียงใหม่', 'รพ.ขอนแก่น', 'รพ.ชลบุรี', 'รพ.นครศรีธรรมราช']
+BATCH_SIZE = 2000
+
+REGION_TEAM = {'ภาคใต้': 'ทีมใต้', 'ภาคเหนือ': 'ทีมเหนือ', 'ภาคอีสาน': 'ทีมอีสาน'}  # ภาคอื่น → ทีมเหนือ
+# ประเภท → (สัดส่วนโรงพยาบาล, ยอดเฉลี่ยต่อวัน, ช่วงจำนวน rider)
+TYPE_PROFILE = {
+    'รพ.ศูนย์/รพ.ทั่วไป': (0.25, 45.0, (5, 12)),
+    'รพ.ชุมชน':          (0.50, 18.0, (2, 6)),
+    'สถาบัน/เฉพาะทาง':    (0.10, 25.0, (3, 8)),
+    'เอกชน/คลินิก':       (0.15, 8.0, (1, 4)),
+}
+WEEKDAY_FACTOR = np.array([1.10, 1.05, 1.0, 1.0, 0.95, 0.55, 0.40])  # จันทร์..อาทิตย์
+
+
+def _profile(htype: str):
+    return TYPE_PROFILE.get(htype, (0.0, 15.0, (2, 6)))
+
+
+def generate_hospitals(n: int, seed: Optional[int] = None, prefix: str = DEMO_PREFIX,
+                       skip: Iterable[int] = ()) -> List[dict]:
+    """โรงพยาบาลหมายเลข 1..n ยกเว้นหมายเลขใน skip (ค่าสุ่มของหมายเลขเดิมไม่เปลี่ยนตาม skip)"""
+    skip = set(skip)
+    rng = np.random.default_rng(seed)
+    provinces = list(TH_PROVINCES.keys())
+    types = [t for t in DEFAULT_HOSPITAL_TYPES]
+    weights = np.array([_profile(t)[0] or 0.05 for t in types])
+    prov = rng.choice(provinces, size=n)
+    htype = rng.choice(types, size=n, p=weights / weights.sum())
+    rows = []
+    for i in range(n):
+        region = TH_PROVINCES[prov[i]]
+        lo, hi = _profile(htype[i])[2]
+        k = int(rng.integers(1, len(DEFAULT_SERVICE_MODELS) + 1))
+        row = {
+            'id': str(uuid.uuid4()),
+            'name': f"{prefix}{i + 1:04d} {prov[i]}",
+            'province': prov[i],
+            'region': region,
+            'site_control': REGION_TEAM.get(region, SITE_CONTROL_CHOICES[1]),
+            'system_type': str(rng.choice(SYSTEM_CHOICES)),
+            'service_models': sorted(rng.choice(DEFAULT_SERVICE_MODELS, size=k, replace=False).tolist()),
+            'riders_count': int(rng.integers(lo, hi + 1)),
+            'hospital_type': str(htype[i]),
+        }
+        if i + 1 not in skip:
+            rows.append(row)
+    return rows
+
+
+def existing_numbers(client, prefix: str = DEMO_PREFIX) -> Set[int]:
+    """หมายเลขของโรงพยาบาลทดสอบที่มีในฐานข้อมูลแล้ว"""
+    rows = fetch_all(lambda: client.table('hospitals').select('name').like('name', f"{prefix}%").order('name'))
+    out = set()
+    for r in rows:
+        head = str(r.get('name') or '')[len(prefix):].split(' ', 1)[0]
+        if head.isdigit():
+            out.add(int(head))
+    return out
+
+
+def generate_transactions(hospitals: List[dict], end: date, days: int,
+                          seed: Optional[int] = None) -> pd.DataFrame:
+    """ตาราง transactions (hospital × วัน) ย้อนหลัง days วันถึง end"""
+    rng = np.random.default_rng(None if seed is None else seed + 1)
+    n_h = len(hospitals)
+    dates = pd.date_range(end=pd.Timestamp(end), periods=days, freq='D')
+    if not n_h or not days:
+        return pd.DataFrame(columns=['id', 'hospital_id', 'date', 'transactions_count', 'riders_active', 'created_at'])
+
+    base = np.array([_profile(h.get('hospital_type'))[1] for h in hospitals])
+    base = base * rng.lognormal(0.0, 0.35, n_h)                     # ขนาดต่างกันในประเภทเดียวกัน
+    cap = np.array([int(h.get('riders_count') or 0) for h in hospitals])
+    growth = rng.normal(0.10, 0.08, n_h)                            # แนวโน้มต่อปี
+
+    t_years = ((dates - dates[0]).days.to_numpy() / 365.0)
+    wd = WEEKDAY_FACTOR[dates.dayofweek.to_numpy()]
+    mean = base[:, None] * wd[None, :] * (1.0 + growth[:, None] * t_years[None, :])
+    tx = rng.poisson(np.clip(mean, 0.1, None))
+    util = np.clip(rng.beta(4, 2, size=tx.shape), 0, 1)
+    ra = np.minimum(np.rint(util * cap[:, None]), cap[:, None]).astype(np.int64)
+    ra[tx == 0] = 0
+
+    n = n_h * days
+    now = datetime.now(timezone.utc).isoformat()   # UTC เหมือนค่า default ของตาราง (watermark ของ TableCache)
+    return pd.DataFrame({
+        'id': [str(uuid.uuid4()) for _ in range(n)],
+        'hospital_id': np.repeat([h['id'] for h in hospitals], days),
+        'date': np.tile(dates.strftime('%Y-%m-%d').to_numpy(), n_h),
+        'transactions_count': tx.reshape(-1).astype(np.int64),
+        'riders_active': ra.reshape(-1),
+        'created_at': now,
+    })
+
+
+def iter_batches(df: pd.DataFrame, size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    for i in range(0, len(df), size):
+        yield df.iloc[i:i + size].to_dict('records')
+
+
+def write_rows(client, table: str, rows, size: int = BATCH_SIZE,
+               on_batch: Optional[Callable[[int, int], None]] = None) -> int:
+    """insert ทีละ batch (rows: list ของ dict หรือ DataFrame) คืนจำนวนแถว"""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    done = 0
+    for batch in iter_batches(df, size):
+        client.table(table).insert(batch).execute()
+        done += len(batch)
+        if on_batch:
+            on_batch(done, len(df))
+    return done
+
+
+def seed(client, n_hospitals: int, days: int, end: Optional[date] = None, seed_value: Optional[int] = None,
+         batch_size: int = BATCH_SIZE, strip: Optional[Callable[[dict], dict]] = None,
+         on_batch: Optional[Callable[[int, int], None]] = None) -> dict:
+    """
+    สร้างแล้วเขียนลงฐานข้อมูล คืน {'hospitals', 'transactions'} (list ของ dict / DataFrame)
+    - strip: ตัดคอลัมน์ที่ตาราง hospitals ยังไม่มี (เช่น Capabilities.strip)
+    - หมายเลขที่มีอยู่แล้วถูกข้าม (ไม่เขียนทั้งโรงพยาบาลและ transactions ของหมายเลขนั้น)
+    """
+    hospitals = generate_hospitals(n_hospitals, seed_value, skip=existing_numbers(client))
+    if strip:
+        hospitals = [strip(h) for h in hospitals]
+    tx = generate_transactions(hospitals, end or date.today(), days, seed_value)
+    write_rows(client, 'hospitals', hospitals, batch_size)
+    write_rows(client, 'transactions', tx, batch_size, on_batch)
+    return {'hospitals': hospitals, 'transactions': tx}
+
+
+def demo_hospital_ids(client) -> List[str]:
+    rows = client.table('hospitals').select('id').like('name', f"{DEMO_PREFIX}%").execute().data or []
+    rows += client.table('hospitals').select('id').in_('name', LEGACY_DEMO_NAMES).execute().data or []
+    return [str(r['id']) for r in rows]
+
+
+# ---------------- CLI ----------------
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="สร้าง/ลบข้อมูลตัวอย่างของ Telemedicine dashboard")
+    ap.add_argument('--hospitals', type=int, default=300)
+    ap.add_argument('--days', type=int, default=365)
+    ap.add_argument('--end', type=date.fromisoformat, default=date.today(), help='วันสุดท้าย (YYYY-MM-DD)')
+    ap.add_argument('--seed', type=int, default=None)
+    ap.add_argument('--batch', type=int, default=BATCH_SIZE)
+    ap.add_argument('--csv', metavar='DIR', help='เขียน hospitals.csv / transactions.csv แทนการเขียนลงฐานข้อมูล')
+    ap.add_argument('--delete', action='store_true', help='ลบข้อมูลตัวอย่างทั้งหมด')
+    args = ap.parse_args(argv)
+
+    t0 = time.time()
+    if args.csv:
+        hospitals = generate_hospitals(args.hospitals, args.seed)
+        tx = generate_transactions(hospitals, args.end, args.days, args.seed)
+        os.makedirs(args.csv, exist_ok=True)
+        pd.DataFrame(hospitals).to_csv(os.path.join(args.csv, 'hospitals.csv'), index=False)
+        tx.to_csv(os.path.join(args.csv, 'transactions.csv'), index=False)
+        print(f"wrote {len(hospitals):,} hospitals / {len(tx):,} transactions to {args.csv} in {time.time() - t0:.1f}s")
+        return
+
+    from supabase_client import supabase_admin
+    client = supabase_admin()
+    if args.delete:
+        ids = demo_hospital_ids(client)
+        for i in range(0, len(ids), 150):
+            part = ids[i:i + 150]
+            client.table('transactions').delete().in_('hospital_id', part).execute()
+            client.table('hospitals').delete().in_('id', part).execute()
+        print(f"deleted {len(ids):,} demo hospitals in {time.time() - t0:.1f}s")
+        return
+
+    def progress(done, total):
+        print(f"\r{done:,}/{total:,} transactions ({done / max(time.time() - t0, 1e-6):,.0f} rows/s)", end='', flush=True)
+
+    out = seed(client, args.hospitals, args.days, args.end, args.seed, args.batch, on_batch=progress)
+    print(f"\nseeded {len(out['hospitals']):,} hospitals / {len(out['transactions']):,} transactions "
+          f"in {time.time() - t0:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# excel_export.py
+# ============================================================
+# เขียน .xlsx แบบ streaming (openpyxl write_only) สำหรับไฟล์ส่งออก/รายงาน
+# - ไม่ copy DataFrame: แปลงทีละ chunk ของคอลัมน์เป็นค่า Python แล้ว append ทีละแถว
+#   openpyxl write_only เขียนแถวลงไฟล์ชั่วคราวทันที → memory คงที่ตามขนาด chunk ไม่ใช่ขนาดชีต
+# - วันที่เป็น cell วันที่จริงของ Excel (openpyxl ใส่ number format yyyy-mm-dd ให้ date เอง) ไม่ใช่ข้อความ
+#   datetime64 ที่ไม่มีเวลา → date, มีเวลา → datetime, timezone ถูกตัดออก (Excel ไม่รองรับ)
+# - ชีตที่ยาวเกิน EXCEL_MAX_ROWS แบ่งเป็นหลายชีต: name, name_2, name_3, ...
+# - เวลาส่วนใหญ่อยู่ที่การ serialize XML ของ openpyxl: ถ้าติดตั้ง lxml ไว้ openpyxl จะใช้เองและเร็วขึ้นมาก
+# ============================================================
+
+from __future__ import annotations
+
+import io
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import BinaryIO, Callable, Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+EXCEL_MAX_ROWS = 1_048_576   # รวมแถวหัวตาราง
+SHEET_NAME_MAX = 31
+CHUNK_ROWS = 20_000
+CELL_TYPES = (str, int, float, bool, date, time, timedelta, Decimal, np.number, np.bool_)
+DATE_WIDTH, DATETIME_WIDTH = 12, 20   # คอลัมน์แคบเกินไป Excel จะแสดงวันที่เป็น ####
+
+
+def _converter(s: pd.Series) -> Tuple[Callable[[pd.Series], np.ndarray], int | None]:
+    """ฟังก์ชันแปลง chunk ของคอลัมน์เป็น array ของค่า Python + ความกว้างคอลัมน์สำหรับวันที่ (None = ค่าเริ่มต้น)"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        tz = getattr(s.dt, "tz", None) is not None
+        valid = s.dropna()
+        if tz:
+            valid = valid.dt.tz_localize(None)
+        date_only = bool((valid == valid.dt.normalize()).all())
+
+        def conv(part: pd.Series) -> np.ndarray:
+            if tz:
+                part = part.dt.tz_localize(None)
+            if date_only:
+                return part.dt.date.to_numpy(dtype=object)
+            return np.array(part.dt.to_pydatetime(), dtype=object)
+        return conv, DATE_WIDTH if date_only else DATETIME_WIDTH
+    if s.dtype != object:
+        return (lambda part: part.to_numpy(dtype=object)), None
+    width = None
+    first = s.first_valid_index()
+    if first is not None and isinstance(s.loc[first], date):
+        width = DATETIME_WIDTH if isinstance(s.loc[first], datetime) else DATE_WIDTH
+
+    def conv_object(part: pd.Series) -> np.ndarray:
+        # ค่าที่ Excel ไม่รู้จัก (เช่น list ของ service_models) → ข้อความ แบบเดียวกับ to_excel เดิม
+        arr = part.to_numpy(dtype=object)
+        odd = [i for i, v in enumerate(arr) if not isinstance(v, CELL_TYPES) and v is not None and v is not pd.NA]
+        if odd:
+            arr = arr.copy()
+            for i in odd:
+                arr[i] = str(arr[i])
+        return arr
+    return conv_object, width
+
+
+def _rows(df: pd.DataFrame, convs: list, start: int, stop: int, chunk: int) -> Iterator[tuple]:
+    for lo in range(start, stop, chunk):
+        hi = min(lo + chunk, stop)
+        cols = []
+        for i, conv in enumerate(convs):
+            arr = conv(df.iloc[lo:hi, i])
+            missing = pd.isna(arr)
+            if missing.any():   # NaN/NaT/pd.NA → cell ว่าง (array อาจเป็น view ของ frame จึง copy ก่อนแก้)
+                arr = arr.copy()
+                arr[missing] = None
+            cols.append(arr)
+        yield from zip(*cols)
+
+
+def sheet_parts(name: str, n_rows: int, max_rows: int = EXCEL_MAX_ROWS) -> Iterator[Tuple[str, int, int]]:
+    """(ชื่อชีต, แถวเริ่ม, แถวจบ) ของแต่ละส่วน — ส่วนแรกใช้ชื่อเดิม ส่วนถัดไปเติม _2, _3, ..."""
+    per_sheet = max_rows - 1
+    n_parts = max(1, -(-n_rows // per_sheet))
+    for i in range(n_parts):
+        suffix = f"_{i + 1}" if i else ""
+        yield name[:SHEET_NAME_MAX - len(suffix)] + suffix, i * per_sheet, min((i + 1) * per_sheet, n_rows)
+
+
+def write_xlsx(sheets: Dict[str, pd.DataFrame], fh: BinaryIO,
+               max_rows: int = EXCEL_MAX_ROWS, chunk: int = CHUNK_ROWS) -> None:
+    """เขียน {ชื่อชีต: DataFrame} ลง fh (ไฟล์หรือ BytesIO) — ไม่เขียน index เหมือน to_excel(index=False)"""
+    wb = Workbook(write_only=True)
+    bold = Font(bold=True)
+    for name, df in sheets.items():
+        convs, widths = zip(*[_converter(df.iloc[:, i]) for i in range(df.shape[1])]) if df.shape[1] else ((), ())
+        for part, start, stop in sheet_parts(name, len(df), max_rows):
+            ws = wb.create_sheet(part)
+            for i, w in enumerate(widths):
+                if w:   # ต้องตั้งก่อนเขียนแถวแรก (write_only เขียน <cols> ตอนเริ่มชีต)
+                    ws.column_dimensions[get_column_letter(i + 1)].width = w
+            header = []
+            for c in df.columns:
+                cell = WriteOnlyCell(ws, value=str(c))
+                cell.font = bold
+                header.append(cell)
+            ws.append(header)
+            for row in _rows(df, convs, start, stop, chunk):
+                ws.append(row)
+    if not wb.worksheets:
+        wb.create_sheet("Sheet1")
+    wb.save(fh)
+
+
+def to_xlsx_bytes(sheets: Dict[str, pd.DataFrame], **kwargs) -> bytes:
+    output = io.BytesIO()
+    write_xlsx(sheets, output, **kwargs)
+    return output.getvalue()
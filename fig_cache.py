@@ -0,0 +1,79 @@
+# fig_cache.py
+# ============================================================
+# Cache ของ plotly Figure ในหน้า Dashboard (ต่อ process ใช้ร่วมทุก session)
+# - key = ชื่อกราฟ + hash ของข้อมูลที่ใช้สร้าง (DataFrame รวมลำดับแถว) + ธีม/palette/ตัวเลือกการเรียง
+#   → rerun ที่ข้อมูลและตัวเลือกของกราฟนั้นไม่เปลี่ยน ได้ Figure เดิมทันทีโดยไม่ต้องเรียก px/go ใหม่
+# - Figure ที่ได้จาก cache ใช้ร่วมกัน ห้ามแก้ไข in-place (update_layout ฯลฯ)
+# - แจ้ง hit/miss + เวลาทีละครั้งผ่าน on_result (streamlit_app ส่งเข้า perf.Recorder → หน้า perf panel)
+# ============================================================
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _feed(h, part) -> None:
+    if isinstance(part, pd.DataFrame):
+        h.update(repr((list(part.columns), [str(t) for t in part.dtypes], part.shape)).encode("utf-8"))
+        if len(part):
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+    elif isinstance(part, pd.Series):
+        _feed(h, part.to_frame())
+    elif isinstance(part, np.ndarray):
+        h.update(part.tobytes())
+    elif isinstance(part, (list, tuple)):
+        h.update(b"[")
+        for p in part:
+            _feed(h, p)
+        h.update(b"]")
+    elif isinstance(part, dict):
+        _feed(h, sorted(part.items(), key=lambda kv: str(kv[0])))
+    else:
+        h.update(repr(part).encode("utf-8"))
+    h.update(b"|")
+
+
+def spec_key(*parts) -> str:
+    """hash ของข้อมูล/ตัวเลือกที่กำหนดหน้าตากราฟ"""
+    h = hashlib.sha1()
+    for p in parts:
+        _feed(h, p)
+    return h.hexdigest()
+
+
+class FigureCache:
+    def __init__(self, size: int = 96):
+        self.size = size
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, build: Callable[[], object], *parts,
+            on_result: Optional[Callable[[str, bool, float], None]] = None):
+        """Figure ของ name ตาม parts (สร้างด้วย build() เมื่อยังไม่มี)"""
+        t0 = time.perf_counter()
+        key = (name, spec_key(*parts))
+        with self._lock:
+            fig = self._items.get(key)
+            if fig is not None:
+                self._items.move_to_end(key)
+        hit = fig is not None
+        if not hit:
+            fig = build()
+            with self._lock:
+                self._items[key] = fig
+                while len(self._items) > self.size:
+                    self._items.popitem(last=False)
+        if on_result:
+            on_result(name, hit, time.perf_counter() - t0)
+        return fig
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,184 @@
+# filter_cube.py
+# ============================================================
+# Filter cube ของหน้า Dashboard
+# - รวมยอด transactions เป็นแถวละ (วัน, โรงพยาบาล) เก็บเป็น NumPy array เรียงตามวัน
+# - คุณสมบัติโรงพยาบาล (name/site_control/region/hospital_type) เก็บเป็น categorical code
+# - เปลี่ยนตัวกรอง = mask บน array ของโรงพยาบาล + searchsorted ช่วงวัน + bincount
+#   (ไม่ต้อง merge/isin/groupby ทั้ง DataFrame ทุก rerun)
+# - สร้างใหม่เฉพาะเมื่อ version ของข้อมูลเปลี่ยน (CubeCache ถือ cube ล่าสุดต่อคู่ TableCache)
+# - ผลลัพธ์ aggregate() มีรูปแบบเดียวกับ aggregate_dashboard() ใน streamlit_app.py
+# ============================================================
+
+from __future__ import annotations
+
+import threading
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DIM_COLS = ("name", "site_control", "region", "hospital_type")
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _day(d: date) -> int:
+    return int((np.datetime64(d, "D") - _EPOCH).astype(np.int64))
+
+
+def _sum_by(codes: np.ndarray, weights: np.ndarray, n: int) -> np.ndarray:
+    return np.rint(np.bincount(codes, weights=weights, minlength=n)).astype(np.int64)
+
+
+class FilterCube:
+    def __init__(self, day: np.ndarray, hosp: np.ndarray, tx: np.ndarray, ra: np.ndarray, rows: np.ndarray,
+                 hospital_ids: np.ndarray, dims: Dict[str, pd.Categorical], riders_count: np.ndarray):
+        self.day = day                      # int32 วันนับจาก epoch (เรียงจากน้อยไปมาก)
+        self.hosp = hosp                    # int32 index ของโรงพยาบาล
+        self.tx = tx                        # int64 transactions_count
+        self.ra = ra                        # int64 riders_active
+        self.rows = rows                    # int64 จำนวนแถวดิบในช่อง (ใช้คิด capacity แบบเดิม)
+        self.hospital_ids = hospital_ids    # object: id ของโรงพยาบาลตาม index
+        self.dims = dims                    # col -> Categorical (ยาว = จำนวนโรงพยาบาล, code -1 = ว่าง) เฉพาะคอลัมน์ที่มี
+        self.riders_count = riders_count    # int64 capacity ต่อโรงพยาบาล
+
+    @property
+    def n_hosp(self) -> int:
+        return len(self.hospital_ids)
+
+    @classmethod
+    def build(cls, tx_frame: pd.DataFrame, hospitals_df: pd.DataFrame) -> "FilterCube":
+        """
+        tx_frame: hospital_id, date (datetime64), transactions_count, riders_active
+        hospitals_df: id + DIM_COLS + riders_count (คอลัมน์ที่ไม่มีถือเป็นค่าว่าง)
+        """
+        h_ids = hospitals_df["id"].astype(str).to_numpy() if "id" in hospitals_df.columns else np.array([], dtype=object)
+        tx_h = tx_frame["hospital_id"].astype(str).to_numpy() if not tx_frame.empty else np.array([], dtype=object)
+        # transactions ที่ไม่พบโรงพยาบาล → ต่อท้ายเป็นโรงพยาบาลที่ไม่มีคุณสมบัติ (เหมือน left merge)
+        orphans = np.setdiff1d(np.unique(tx_h), h_ids) if len(tx_h) else np.array([], dtype=object)
+        all_ids = np.concatenate([h_ids, orphans]).astype(object)
+        index = pd.Index(all_ids)
+
+        # คอลัมน์ที่ไม่มีในตาราง (เช่น hospital_type ที่ไม่บังคับ) ไม่สร้าง dim → ตัวกรองของคอลัมน์นั้นถูกข้าม
+        # เหมือน merge_hospitals ฝั่ง pandas
+        dims = {}
+        for col in DIM_COLS:
+            if col not in hospitals_df.columns:
+                continue
+            vals = hospitals_df[col]
+            vals = pd.concat([vals.reset_index(drop=True), pd.Series([None] * len(orphans))], ignore_index=True)
+            dims[col] = pd.Categorical(vals.where(vals.notna(), None))
+        rc = hospitals_df["riders_count"] if "riders_count" in hospitals_df.columns else pd.Series(0, index=hospitals_df.index)
+        riders_count = np.concatenate([pd.to_numeric(rc, errors="coerce").fillna(0).to_numpy(np.int64),
+                                       np.zeros(len(orphans), dtype=np.int64)])
+
+        if tx_frame.empty:
+            empty = np.array([], dtype=np.int64)
+            return cls(empty.astype(np.int32), empty.astype(np.int32), empty, empty, empty, all_ids, dims, riders_count)
+
+        n = len(all_ids)
+        h = index.get_indexer(tx_h).astype(np.int64)
+        d = ((pd.to_datetime(tx_frame["date"]).to_numpy().astype("datetime64[D]") - _EPOCH).astype(np.int64))
+        key = d * n + h
+        uniq, inv = np.unique(key, return_inverse=True)  # เรียงตามวันแล้วตามโรงพยาบาล
+        tx = _sum_by(inv, pd.to_numeric(tx_frame["transactions_count"], errors="coerce").fillna(0).to_numpy(np.float64), len(uniq))
+        ra = _sum_by(inv, pd.to_numeric(tx_frame["riders_active"], errors="coerce").fillna(0).to_numpy(np.float64), len(uniq))
+        rows = np.bincount(inv, minlength=len(uniq)).astype(np.int64)
+        return cls((uniq // n).astype(np.int32), (uniq % n).astype(np.int32), tx, ra, rows, all_ids, dims, riders_count)
+
+    def hospital_mask(self, filters: Dict[str, List]) -> np.ndarray:
+        """filters: col -> ค่าที่เลือก (เฉพาะตัวกรองที่ไม่ว่าง) → bool ต่อโรงพยาบาล"""
+        mask = np.ones(self.n_hosp, dtype=bool)
+        for col, values in filters.items():
+            cat = self.dims.get(col)
+            if cat is None or not values:
+                continue
+            wanted = cat.categories.get_indexer(pd.Index(list(values)))
+            mask &= np.isin(cat.codes, wanted[wanted >= 0])
+        return mask
+
+    def _group(self, col: str, rows_h: np.ndarray, hosp_tx: np.ndarray, hosp_ra: np.ndarray) -> tuple:
+        """รวมยอดต่อโรงพยาบาลขึ้นเป็นต่อกลุ่มของ col (ข้ามโรงพยาบาลที่ค่าว่าง)"""
+        cat = self.dims.get(col)
+        if cat is None:
+            none = np.zeros(0, dtype=np.int64)
+            return pd.Index([], dtype=object), none, none, none, none
+        codes = cat.codes.astype(np.int64)
+        ok = (codes >= 0) & (rows_h > 0)
+        k = len(cat.categories)
+        c = codes[ok]
+        return (cat.categories, np.bincount(c, minlength=k),
+                _sum_by(c, hosp_tx[ok].astype(np.float64), k),
+                _sum_by(c, hosp_ra[ok].astype(np.float64), k),
+                _sum_by(c, (rows_h[ok] * self.riders_count[ok]).astype(np.float64), k))
+
+    def aggregate(self, start: date, end: date, load_from: Optional[date], filters: Dict[str, List]) -> dict:
+        """KPI + groupby ทั้งหมดของ dashboard (daily ครอบคลุม load_from..end)"""
+        lo = np.searchsorted(self.day, _day(min(load_from or start, start)), "left")
+        hi = np.searchsorted(self.day, _day(end), "right")
+        d, h, tx, ra, nr = self.day[lo:hi], self.hosp[lo:hi], self.tx[lo:hi], self.ra[lo:hi], self.rows[lo:hi]
+        keep = self.hospital_mask(filters)[h] if len(h) else np.zeros(0, dtype=bool)
+        d, h, tx, ra, nr = d[keep], h[keep], tx[keep], ra[keep], nr[keep]
+        sel = d >= _day(start)
+        n = self.n_hosp
+
+        # ---- ต่อโรงพยาบาล (ช่วงที่เลือก) ----
+        rows_h = _sum_by(h[sel], nr[sel].astype(np.float64), n)
+        hosp_tx = _sum_by(h[sel], tx[sel].astype(np.float64), n)
+        hosp_ra = _sum_by(h[sel], ra[sel].astype(np.float64), n)
+
+        # ---- รายวัน (ทั้งหน้าต่าง) ----
+        days, inv = np.unique(d, return_inverse=True)
+        daily_tx = _sum_by(inv, tx.astype(np.float64), len(days))
+        daily_ra = _sum_by(inv, ra.astype(np.float64), len(days))
+        daily = pd.DataFrame({"date": (days.astype("datetime64[D]")).astype(object),
+                              "transactions_count": daily_tx, "riders_active": daily_ra})
+
+        sel_days = days >= _day(start)
+        month = days >= _day(end.replace(day=1))
+        kpi = {
+            "total_tx": int(hosp_tx.sum()),
+            "hospitals": int(np.count_nonzero(rows_h)),
+            "riders_cap": int((rows_h * self.riders_count).sum()),
+            "avg_day": int(round(daily_tx[sel_days].mean())) if sel_days.any() else 0,
+            "riders_active": int(hosp_ra.sum()),
+            "month_accum": int(daily_tx[month].sum()),
+        }
+
+        cats, cnt, g_tx, g_ra, g_rc = self._group("site_control", rows_h, hosp_tx, hosp_ra)
+        has = cnt > 0
+        by_site = pd.DataFrame({"site_control": np.asarray(cats)[has], "transactions_count": g_tx[has],
+                                "riders_active": g_ra[has], "riders_count": g_rc[has]})
+
+        cats, cnt, g_tx, g_ra, g_rc = self._group("hospital_type", rows_h, hosp_tx, hosp_ra)
+        has = cnt > 0
+        by_type = pd.DataFrame({"hospital_type": np.asarray(cats)[has], "transactions_count": g_tx[has],
+                                "riders_active": g_ra[has], "riders_total": g_rc[has],
+                                "hospitals_count": cnt[has]})
+
+        cats, cnt, g_tx, g_ra, _ = self._group("name", rows_h, hosp_tx, hosp_ra)
+        has = cnt > 0
+        by_hosp = pd.DataFrame({"name": np.asarray(cats)[has], "transactions_count": g_tx[has],
+                                "riders_active": g_ra[has]})
+
+        return {"kpi": kpi, "by_site": by_site, "by_type": by_type, "by_hospital": by_hosp, "daily": daily}
+
+
+class CubeCache:
+    """cube ล่าสุดของ TableCache (transactions, hospitals) — สร้างใหม่เมื่อ version ของตารางใดเปลี่ยนเท่านั้น"""
+
+    def __init__(self):
+        self.key: Optional[tuple] = None
+        self.cube: Optional[FilterCube] = None
+        self._lock = threading.Lock()
+
+    def get(self, tx_table, hosp_table) -> FilterCube:
+        tx_table.refresh()
+        hosp_table.refresh()
+        with self._lock:   # หลาย session พร้อมกัน → สร้างครั้งเดียว
+            # อ่าน version ก่อน frame: ถ้ามีการเขียนแทรกระหว่างนี้ รอบถัดไปจะเห็น version ใหม่แล้วสร้างใหม่
+            key = (tx_table.version, hosp_table.version)
+            if self.cube is None or key != self.key:
+                self.cube = FilterCube.build(tx_table.frame, hosp_table.frame)
+                self.key = key
+            return self.cube
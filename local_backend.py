@@ -0,0 +1,427 @@
+# local_backend.py
+# ============================================================
+# Backend ข้อมูลในเครื่อง (SQLite) ที่ใช้แทน Supabase client ได้
+# - รองรับ query builder เฉพาะส่วนที่แอปใช้:
+#     table(t).select(cols, count=) / insert / update / upsert(on_conflict=) / delete(count=, returning=)
+#     .eq .neq .in_ .gt .gte .lt .lte .like .is_ .order(desc=) .limit .range → .execute() → .data / .count
+#     rpc(fn, params).execute()
+# - error ตอบเป็น postgrest APIError พร้อม code เดียวกับ Postgres/PostgREST
+#   (ไม่มีตาราง 42P01, ไม่มีคอลัมน์ 42703, ไม่มี RPC PGRST202, ชนค่า unique 23505)
+#   → fallback เดิมของแอปทำงานเหมือนตอนต่อ Supabase จริง
+# - RPC: save_transaction / delete_hospitals (ตรงกับ sql/*.sql)
+#   dashboard_aggregates ไม่มี → แอปคำนวณด้วย pandas (เหมือนโปรเจกต์ที่ยังไม่ติดตั้ง SQL)
+# - เลือกด้วย env: DATA_BACKEND=local, LOCAL_DB_PATH=<ไฟล์> (ค่าเริ่มต้น local_data.sqlite3, ':memory:' ได้)
+#   หรือ DATA_BACKEND=snapshot, SNAPSHOT_PATH=<โฟลเดอร์ snapshot | latest> (SQLite ใน memory เติมจาก Parquet ดู snapshot.py)
+# ใช้วัดประสิทธิภาพ/ทดสอบ code path จริงในเครื่องโดยไม่ต้องต่อเครือข่าย
+# ============================================================
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+from postgrest.exceptions import APIError
+
+DEFAULT_PATH = "local_data.sqlite3"
+
+# ตาราง → {คอลัมน์: ชนิด} (ชนิด: text / int / date / ts / json) ตาม schema ของโปรเจกต์ Supabase
+SCHEMA: Dict[str, Dict[str, str]] = {
+    "hospitals": {"id": "text", "name": "text", "province": "text", "region": "text",
+                  "site_control": "text", "system_type": "text", "service_models": "json",
+                  "riders_count": "int", "hospital_type": "text", "created_at": "ts", "updated_at": "ts"},
+    "transactions": {"id": "text", "hospital_id": "text", "date": "date", "transactions_count": "int",
+                     "riders_active": "int", "created_at": "ts", "updated_at": "ts"},
+    "admins": {"id": "text", "username": "text", "password_hash": "text", "role": "text", "created_at": "ts"},
+    "hospital_types": {"id": "text", "name": "text", "created_at": "ts"},
+    "service_models_master": {"id": "text", "name": "text", "created_at": "ts"},
+    "settings": {"key": "text", "value": "json", "updated_at": "ts"},
+}
+PRIMARY_KEYS = {"settings": ("key",)}
+UNIQUE = {
+    "hospitals": [("name",)],
+    "transactions": [("hospital_id", "date")],       # sql/transactions_unique.sql
+    "admins": [("username",)],
+    "hospital_types": [("name",)],
+    "service_models_master": [("name",)],
+}
+INDEXES = {"transactions": [("date",), ("updated_at",)], "hospitals": [("updated_at",)]}
+TOUCH_COLS = ("updated_at",)   # sql/updated_at.sql: ตั้งเป็นเวลาปัจจุบันทุกครั้งที่ insert/update
+
+
+def _error(code: str, message: str, details: Optional[str] = None) -> APIError:
+    return APIError({"code": code, "message": message, "details": details, "hint": None})
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _ts(v) -> Optional[str]:
+    """timestamptz → ISO UTC รูปแบบเดียว (เทียบเป็นสตริงได้) ค่าไม่มี timezone ถือเป็น UTC"""
+    if v is None:
+        return None
+    t = pd.Timestamp(v)
+    t = t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    return t.isoformat(timespec="microseconds")
+
+
+def _to_db(kind: str, v):
+    if v is None or (not isinstance(v, (list, dict)) and pd.isna(v)):
+        return None
+    if kind == "json":
+        return json.dumps(v, ensure_ascii=False)
+    if kind == "int":
+        return int(v)
+    if kind == "date":
+        return v.isoformat() if isinstance(v, (date, datetime)) else pd.Timestamp(v).date().isoformat()
+    if kind == "ts":
+        return _ts(v)
+    return str(v)
+
+
+def _from_db(kind: str, v):
+    if v is not None and kind == "json":
+        return json.loads(v)
+    return v
+
+
+class Response:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class Query:
+    """builder หนึ่งคำสั่ง (method คืน self ต่อกันได้แบบ postgrest)"""
+
+    def __init__(self, db: "LocalClient", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.cols = "*"
+        self.payload: Any = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self.count: Optional[str] = None
+        self.returning = True
+        self.filters: List[tuple] = []
+        self.orders: List[tuple] = []
+        self.limit_n: Optional[int] = None
+        self.offset = 0
+
+    # ---------- operations ----------
+    def select(self, columns: str = "*", count=None, **_):
+        self.op, self.cols, self.count = "select", columns or "*", count
+        return self
+
+    def insert(self, json, count=None, returning=None, upsert: bool = False, **_):
+        self.op, self.payload, self.count = ("upsert" if upsert else "insert"), json, count
+        self.returning = str(getattr(returning, "value", returning) or "representation") != "minimal"
+        return self
+
+    def upsert(self, json, count=None, returning=None, ignore_duplicates: bool = False,
+               on_conflict: str = "", **_):
+        self.insert(json, count=count, returning=returning, upsert=True)
+        self.on_conflict, self.ignore_duplicates = on_conflict or None, ignore_duplicates
+        return self
+
+    def update(self, json, count=None, returning=None, **_):
+        self.op, self.payload, self.count = "update", json, count
+        self.returning = str(getattr(returning, "value", returning) or "representation") != "minimal"
+        return self
+
+    def delete(self, count=None, returning=None, **_):
+        self.op, self.count = "delete", count
+        self.returning = str(getattr(returning, "value", returning) or "representation") != "minimal"
+        return self
+
+    # ---------- filters / modifiers ----------
+    def _f(self, col, op, val):
+        self.filters.append((col, op, val))
+        return self
+
+    def eq(self, column, value): return self._f(column, "=", value)
+    def neq(self, column, value): return self._f(column, "!=", value)
+    def gt(self, column, value): return self._f(column, ">", value)
+    def gte(self, column, value): return self._f(column, ">=", value)
+    def lt(self, column, value): return self._f(column, "<", value)
+    def lte(self, column, value): return self._f(column, "<=", value)
+    def like(self, column, pattern): return self._f(column, "like", pattern)
+    def in_(self, column, values): return self._f(column, "in", list(values))
+    def is_(self, column, value): return self._f(column, "is", value)
+
+    def order(self, column, desc: bool = False, nullsfirst: bool = False, **_):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_):
+        self.limit_n = int(size)
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self.offset, self.limit_n = int(start), int(end) - int(start) + 1
+        return self
+
+    def execute(self) -> Response:
+        return self.db._execute(self)
+
+
+class RpcCall:
+    def __init__(self, db: "LocalClient", fn: str, params: Optional[dict]):
+        self.db, self.fn, self.params = db, fn, params or {}
+
+    def execute(self) -> Response:
+        func = RPCS.get(self.fn)
+        if func is None:
+            raise _error("PGRST202", f"Could not find the function public.{self.fn} in the schema cache")
+        with self.db._lock:
+            try:
+                data = func(self.db, **self.params)
+                self.db.conn.commit()
+            except Exception:
+                self.db.conn.rollback()
+                raise
+        return Response(data)
+
+
+class LocalClient:
+    """แทน supabase.Client เฉพาะ table() / rpc()"""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            if path != ":memory:":
+                self.conn.execute("pragma journal_mode=wal")
+            self.conn.execute("pragma synchronous=normal")
+            self._create_schema()
+
+    def _create_schema(self) -> None:
+        for t, cols in SCHEMA.items():
+            pk = PRIMARY_KEYS.get(t, ("id",))
+            defs = [f'"{c}" {"integer" if k == "int" else "text"}' for c, k in cols.items()]
+            defs.append(f"primary key ({', '.join(pk)})")
+            defs += [f"unique ({', '.join(u)})" for u in UNIQUE.get(t, [])]
+            self.conn.execute(f'create table if not exists "{t}" ({", ".join(defs)})')
+            for ix in INDEXES.get(t, []):
+                self.conn.execute(f'create index if not exists "{t}_{"_".join(ix)}_idx" on "{t}" ({", ".join(ix)})')
+        self.conn.commit()
+
+    # ---------- public (เหมือน supabase.Client) ----------
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[dict] = None) -> RpcCall:
+        return RpcCall(self, fn, params)
+
+    def load_frame(self, table: str, df: pd.DataFrame) -> int:
+        """เติมข้อมูลก้อนใหญ่ (executemany ไม่ผ่าน builder) สำหรับเตรียมข้อมูลทดสอบ/benchmark"""
+        schema = self._schema(table)
+        cols = [self._col(table, c) for c in df.columns]
+        conv = [schema[c] for c in cols]
+        rows = ([_to_db(k, v) for k, v in zip(conv, r)] for r in df.itertuples(index=False, name=None))
+        with self._lock:
+            self.conn.executemany(f'insert into "{table}" ({", ".join(chr(34) + c + chr(34) for c in cols)}) '
+                                  f'values ({",".join("?" * len(cols))})', rows)
+            self.conn.commit()
+        return len(df)
+
+    # ---------- internal ----------
+    def _schema(self, table: str) -> Dict[str, str]:
+        if table not in SCHEMA:
+            raise _error("42P01", f'relation "public.{table}" does not exist')
+        return SCHEMA[table]
+
+    def _col(self, table: str, col: str) -> str:
+        if col not in self._schema(table):
+            raise _error("42703", f"column {table}.{col} does not exist")
+        return col
+
+    def _where(self, q: Query, schema: Dict[str, str]):
+        sql, args = [], []
+        for col, op, val in q.filters:
+            kind = schema[self._col(q.table, col)]
+            if op == "in":
+                if not val:
+                    sql.append("0")
+                    continue
+                sql.append(f'"{col}" in ({",".join("?" * len(val))})')
+                args += [_to_db(kind, v) for v in val]
+            elif op == "is":
+                sql.append(f'"{col}" is null' if val in (None, "null") else f'"{col}" is not null')
+            elif op == "like":
+                sql.append(f'"{col}" like ?')
+                args.append(str(val).replace("*", "%"))
+            else:
+                sql.append(f'"{col}" {op} ?')
+                args.append(_to_db(kind, val))
+        return (" where " + " and ".join(sql)) if sql else "", args
+
+    def _rows(self, table: str, cur) -> List[dict]:
+        schema = SCHEMA[table]
+        return [{k: _from_db(schema[k], r[k]) for k in r.keys()} for r in cur.fetchall()]
+
+    def _columns(self, q: Query) -> List[str]:
+        schema = self._schema(q.table)
+        if q.cols.strip() == "*":
+            return list(schema)
+        return [self._col(q.table, c.strip()) for c in q.cols.split(",") if c.strip()]
+
+    def _execute(self, q: Query) -> Response:
+        schema = self._schema(q.table)
+        with self._lock:
+            try:
+                out = getattr(self, f"_{q.op}")(q, schema)
+                if q.op != "select":
+                    self.conn.commit()
+                return out
+            except sqlite3.IntegrityError as e:
+                self.conn.rollback()
+                raise _error("23505", "duplicate key value violates unique constraint", str(e)) from e
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                if "ON CONFLICT clause does not match" in str(e):
+                    raise _error("42P10", "there is no unique or exclusion constraint matching "
+                                          "the ON CONFLICT specification") from e
+                raise _error("XX000", str(e)) from e
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def _select(self, q: Query, schema) -> Response:
+        cols = self._columns(q)
+        where, args = self._where(q, schema)
+        count = None
+        if q.count:
+            count = self.conn.execute(f'select count(*) from "{q.table}"{where}', args).fetchone()[0]
+        order = ", ".join(f'"{self._col(q.table, c)}" {"desc" if d else "asc"}' for c, d in q.orders)
+        sql = f'select {", ".join(chr(34) + c + chr(34) for c in cols)} from "{q.table}"{where}'
+        if order:
+            sql += f" order by {order}"
+        if q.limit_n is not None or q.offset:
+            sql += f" limit {q.limit_n if q.limit_n is not None else -1} offset {q.offset}"
+        return Response(self._rows(q.table, self.conn.execute(sql, args)), count)
+
+    def _payload_rows(self, q: Query, schema) -> List[dict]:
+        rows = q.payload if isinstance(q.payload, list) else [q.payload]
+        now = _now()
+        out = []
+        for r in rows:
+            r = {self._col(q.table, k): _to_db(schema[k], v) for k, v in r.items()}
+            if "id" in schema and r.get("id") is None and PRIMARY_KEYS.get(q.table, ("id",)) == ("id",):
+                r["id"] = str(uuid.uuid4())                  # default gen_random_uuid()
+            if "created_at" in schema and r.get("created_at") is None:
+                r["created_at"] = now
+            for c in TOUCH_COLS:
+                if c in schema:
+                    r[c] = now
+            out.append(r)
+        return out
+
+    def _write(self, q: Query, schema, upsert: bool) -> Response:
+        rows = self._payload_rows(q, schema)
+        data, n = [], 0
+        target = [c.strip() for c in (q.on_conflict or ",".join(PRIMARY_KEYS.get(q.table, ("id",)))).split(",")]
+        for r in rows:
+            cols = list(r)
+            sql = (f'insert into "{q.table}" ({", ".join(chr(34) + c + chr(34) for c in cols)}) '
+                   f'values ({",".join("?" * len(cols))})')
+            if upsert:
+                # เหมือน PostgREST: แถวเดิมอัปเดตเฉพาะคอลัมน์ที่ส่งมา (ไม่แตะ id/created_at ของแถวเดิม)
+                keep = {"created_at"} | set(target) | ({"id"} if "id" not in target else set())
+                sets = [f'"{c}" = excluded."{c}"' for c in cols if c not in keep]
+                action = "do nothing" if q.ignore_duplicates or not sets else "do update set " + ", ".join(sets)
+                sql += f' on conflict ({", ".join(chr(34) + c + chr(34) for c in target)}) {action}'
+            cur = self.conn.execute(sql + " returning *", list(r.values()))
+            got = self._rows(q.table, cur)
+            n += len(got)
+            data += got
+        return Response(data if q.returning else [], n if q.count else None)
+
+    def _insert(self, q: Query, schema) -> Response:
+        return self._write(q, schema, upsert=False)
+
+    def _upsert(self, q: Query, schema) -> Response:
+        return self._write(q, schema, upsert=True)
+
+    def _update(self, q: Query, schema) -> Response:
+        payload = {self._col(q.table, k): _to_db(schema[k], v) for k, v in q.payload.items()}
+        for c in TOUCH_COLS:
+            if c in schema:
+                payload[c] = _now()
+        where, args = self._where(q, schema)
+        sets = ", ".join(f'"{c}" = ?' for c in payload)
+        cur = self.conn.execute(f'update "{q.table}" set {sets}{where} returning *', list(payload.values()) + args)
+        data = self._rows(q.table, cur)
+        return Response(data if q.returning else [], len(data) if q.count else None)
+
+    def _delete(self, q: Query, schema) -> Response:
+        where, args = self._where(q, schema)
+        if q.returning:
+            data = self._rows(q.table, self.conn.execute(f'delete from "{q.table}"{where} returning *', args))
+            return Response(data, len(data) if q.count else None)
+        cur = self.conn.execute(f'delete from "{q.table}"{where}', args)
+        return Response([], cur.rowcount if q.count else None)
+
+
+# ---------------- RPC (ตรงกับ sql/*.sql) ----------------
+def _rpc_save_transaction(db: LocalClient, p_hospital_id, p_date, p_transactions_count, p_riders_active):
+    row = db.conn.execute('select coalesce(riders_count, 0) from hospitals where id = ?', (str(p_hospital_id),)).fetchone()
+    if row is None:
+        raise _error("P0001", "hospital_not_found")
+    if int(p_riders_active) > int(row[0]):
+        raise _error("P0001", "riders_over_capacity", f"capacity={row[0]}")
+    q = Query(db, "transactions").upsert({"hospital_id": p_hospital_id, "date": p_date,
+                                          "transactions_count": p_transactions_count,
+                                          "riders_active": p_riders_active}, on_conflict="hospital_id,date")
+    return db._upsert(q, SCHEMA["transactions"]).data[0]
+
+
+def _rpc_delete_hospitals(db: LocalClient, p_ids: Sequence[str]):
+    ids = [str(i) for i in p_ids or []]
+    marks = ",".join("?" * len(ids)) or "null"
+    n_tx = db.conn.execute(f"delete from transactions where hospital_id in ({marks})", ids).rowcount
+    n_h = db.conn.execute(f"delete from hospitals where id in ({marks})", ids).rowcount
+    return {"hospitals": n_h, "transactions": n_tx}
+
+
+RPCS = {
+    "save_transaction": _rpc_save_transaction,
+    "delete_hospitals": _rpc_delete_hospitals,
+}
+
+
+# ---------------- เลือก backend ----------------
+def backend_name() -> str:
+    return (os.getenv("DATA_BACKEND") or "supabase").strip().lower()
+
+
+def is_local() -> bool:
+    return backend_name() in ("local", "sqlite", "snapshot")
+
+
+@lru_cache(maxsize=None)
+def connect(path: str = DEFAULT_PATH) -> LocalClient:
+    """client เดียวต่อไฟล์ต่อ process (ใช้ร่วมกันระหว่าง streamlit_app / supabase_client / CLI)"""
+    return LocalClient(path)
+
+
+def from_env() -> Optional[LocalClient]:
+    """DATA_BACKEND=local → LocalClient ของ LOCAL_DB_PATH, snapshot → LocalClient จาก Parquet, ไม่งั้น None (ใช้ Supabase)"""
+    if not is_local():
+        return None
+    if backend_name() == "snapshot":
+        import snapshot
+        return snapshot.boot(os.getenv("SNAPSHOT_PATH") or "latest")
+    return connect(os.getenv("LOCAL_DB_PATH") or DEFAULT_PATH)
@@ -0,0 +1,86 @@
+# master_data.py
+# ============================================================
+# Cache ของตารางอ้างอิงขนาดเล็ก (hospital_types / service_models_master / settings)
+# - โหลดทุกตารางพร้อมกันในครั้งเดียว (ยิง query ขนานกัน) เก็บใน memory ต่อ process
+# - แต่ละตารางมี version ของตัวเอง เพิ่มทุกครั้งที่โหลดใหม่
+# - เขียนแล้วเรียก invalidate(table) → โหลดใหม่เฉพาะตารางนั้น
+# - reload ทั้งหมดตามรอบ ttl เพื่อเห็นการแก้ไขจาก process อื่น
+# ============================================================
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence
+
+import pandas as pd
+
+MASTER_TABLES = ("hospital_types", "service_models_master", "settings")
+
+
+class MasterData:
+    def __init__(self, client, tables: Sequence[str] = MASTER_TABLES, ttl: float = 300.0):
+        self.client = client
+        self.tables = tuple(tables)
+        self.ttl = ttl
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self.versions: Dict[str, int] = {t: 0 for t in self.tables}
+        self._loaded_at = 0.0
+        self._lock = threading.RLock()
+
+    def _fetch(self, table: str) -> pd.DataFrame:
+        try:
+            return pd.DataFrame(self.client.table(table).select("*").execute().data or [])
+        except Exception:
+            return pd.DataFrame()
+
+    def _store(self, table: str, df: pd.DataFrame) -> None:
+        self.frames[table] = df
+        self.versions[table] = self.versions.get(table, 0) + 1
+
+    def load_all(self) -> "MasterData":
+        """โหลดทุกตาราง (ขนานกัน)"""
+        with self._lock:
+            if self.tables:
+                with ThreadPoolExecutor(len(self.tables)) as pool:
+                    for t, df in zip(self.tables, pool.map(self._fetch, self.tables)):
+                        self._store(t, df)
+            self._loaded_at = time.time()
+        return self
+
+    def _ensure(self) -> None:
+        if not self._loaded_at or time.time() - self._loaded_at >= self.ttl:
+            with self._lock:
+                if not self._loaded_at or time.time() - self._loaded_at >= self.ttl:
+                    self.load_all()
+
+    # ---------- public ----------
+    def frame(self, table: str) -> pd.DataFrame:
+        """ข้อมูลทั้งตาราง (ห้ามแก้ไข in-place) ตารางที่ไม่ได้ดูแลคืน DataFrame ว่าง"""
+        self._ensure()
+        return self.frames.get(table, pd.DataFrame())
+
+    def names(self, table: str, fallback: List[str]) -> List[str]:
+        df = self.frame(table)
+        lst = sorted(df["name"].dropna().tolist()) if not df.empty and "name" in df.columns else []
+        return lst if lst else fallback
+
+    def setting(self, key: str, default):
+        """ค่าใน settings (value เป็น dict) ไม่พบคืน default"""
+        df = self.frame("settings")
+        try:
+            v = df.loc[df["key"] == key, "value"].iloc[0]
+            return v if isinstance(v, dict) else default
+        except Exception:
+            return default
+
+    def version(self, table: str) -> int:
+        return self.versions.get(table, 0)
+
+    def invalidate(self, table: str) -> None:
+        """หลังเขียนตาราง: โหลดใหม่เฉพาะตารางนั้น"""
+        if table not in self.tables:
+            return
+        with self._lock:
+            self._store(table, self._fetch(table))
@@ -0,0 +1,202 @@
+# monthly_rollup.py
+# ============================================================
+# ยอดรวมรายเดือนสำหรับหน้า "รายงานสรุปรายเดือน" (tab รายงาน / Excel / LINE)
+# - ต่อ (เดือน, hospital_id): transactions_count / riders_active / days (จำนวนแถว)
+# - ต่อวัน: ยอดรวมทุกโรงพยาบาล (ชีต daily)
+# - ต่อ (เดือน, site_control): รวมจากยอดต่อโรงพยาบาล + ตาราง hospitals ตอนอ่าน
+#   (ทีมของโรงพยาบาลเปลี่ยนได้ จึงไม่เก็บแยก) → อ่านหนึ่งเดือน = O(จำนวนโรงพยาบาล)
+# แหล่งข้อมูล (เลือกใน streamlit_app.rollup_source):
+# - SqlRollup: ตาราง transactions_monthly / transactions_daily ที่ trigger ดูแล (sql/monthly_rollup.sql)
+# - MonthlyRollup: ใน memory ต่อ process ติดตาม TableCache ของ transactions ทีละ delta
+#   (data_cache.TableCache.subscribe) → การบันทึก/นำเข้า/ลบ ปรับเฉพาะเดือนที่เกี่ยวข้อง
+# ============================================================
+
+from __future__ import annotations
+
+import threading
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+import pandas as pd
+
+from data_cache import fetch_all
+
+SUM_COLS = ("transactions_count", "riders_active")
+HOSP_COLS = ("hospital_id",) + SUM_COLS + ("days",)
+DAILY_COLS = ("date",) + SUM_COLS
+TOTAL_COLS = ("month",) + SUM_COLS + ("hospitals",)
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(m: date, n: int) -> date:
+    """ต้นเดือนที่ห่างจาก m ไป n เดือน (ติดลบได้)"""
+    i = m.year * 12 + m.month - 1 + n
+    return date(i // 12, i % 12 + 1, 1)
+
+
+def month_end(m: date) -> date:
+    return add_months(m, 1) - timedelta(days=1)
+
+
+def _frame(rows, cols) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=list(cols))
+    for c in cols:
+        if c in SUM_COLS or c in ("days", "hospitals"):
+            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+    return df
+
+
+class MonthlyRollup:
+    """ยอดรวมใน memory: {เดือน: {hospital_id: [tx, ra, days]}} และ {วัน: [tx, ra, rows]}"""
+
+    def __init__(self):
+        self.by_hosp: Dict[date, Dict[str, list]] = {}
+        self.by_day: Dict[date, list] = {}
+        self.version = 0
+        self._lock = threading.Lock()
+
+    # ---------- เขียน ----------
+    @staticmethod
+    def _prepare(df: Optional[pd.DataFrame]) -> pd.DataFrame:
+        if df is None or df.empty or "date" not in df.columns:
+            return pd.DataFrame(columns=["date", "month", "hospital_id", *SUM_COLS])
+        d = pd.to_datetime(df["date"]).dt.normalize()
+        out = pd.DataFrame({"date": d, "month": d.values.astype("datetime64[M]"),
+                            "hospital_id": df["hospital_id"].astype(str)})
+        for c in SUM_COLS:
+            out[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+        return out.dropna(subset=["date"])
+
+    @staticmethod
+    def _bump(store: dict, key, values) -> None:
+        cur = store.get(key)
+        if cur is None:
+            cur = store[key] = [0] * len(values)
+        for i, v in enumerate(values):
+            cur[i] += int(v)
+        if cur[-1] <= 0:
+            del store[key]
+
+    def apply(self, removed: Optional[pd.DataFrame], added: Optional[pd.DataFrame]) -> None:
+        """ปรับยอดตามแถวที่หายไป (removed) และแถวใหม่ (added) — ใช้เวลาตามขนาด delta"""
+        parts = [self._prepare(removed).assign(n=-1), self._prepare(added).assign(n=1)]
+        delta = pd.concat([p for p in parts if not p.empty]) if any(not p.empty for p in parts) else None
+        if delta is None:
+            return
+        for c in SUM_COLS:
+            delta[c] = delta[c] * delta["n"]
+        hosp = delta.groupby(["month", "hospital_id"])[[*SUM_COLS, "n"]].sum()
+        day = delta.groupby("date")[[*SUM_COLS, "n"]].sum()
+        with self._lock:
+            for (m, hid), row in zip(hosp.index, hosp.itertuples(index=False, name=None)):
+                m = pd.Timestamp(m).date()
+                months = self.by_hosp.setdefault(m, {})
+                self._bump(months, hid, row)
+                if not months:
+                    del self.by_hosp[m]
+            for d, row in zip(day.index, day.itertuples(index=False, name=None)):
+                self._bump(self.by_day, pd.Timestamp(d).date(), row)
+            self.version += 1
+
+    def reset(self, frame: Optional[pd.DataFrame]) -> None:
+        with self._lock:
+            self.by_hosp, self.by_day = {}, {}
+        self.apply(None, frame)
+
+    def on_change(self, removed: Optional[pd.DataFrame], added: pd.DataFrame) -> None:
+        """listener ของ TableCache.subscribe (removed=None = โหลดใหม่ทั้งตาราง)"""
+        if removed is None:
+            self.reset(added)
+        else:
+            self.apply(removed, added)
+
+    # ---------- อ่าน ----------
+    def month(self, m: date) -> pd.DataFrame:
+        with self._lock:
+            rows = [(hid, *v) for hid, v in self.by_hosp.get(month_start(m), {}).items()]
+        return _frame(rows, HOSP_COLS)
+
+    def daily(self, start: date, end: date) -> pd.DataFrame:
+        with self._lock:
+            rows = [(d, *v[:2]) for d, v in self.by_day.items() if start <= d <= end]
+        return _frame(sorted(rows), DAILY_COLS)
+
+    def totals(self, first: date, last: date) -> pd.DataFrame:
+        """ยอดรวมต่อเดือน first..last (ต้นเดือน) — O(เดือน × โรงพยาบาล)"""
+        first, last = month_start(first), month_start(last)
+        with self._lock:
+            rows = [(m, sum(v[0] for v in h.values()), sum(v[1] for v in h.values()), len(h))
+                    for m, h in self.by_hosp.items() if first <= m <= last]
+        return _frame(sorted(rows), TOTAL_COLS)
+
+
+class SqlRollup:
+    """อ่านจากตารางที่ trigger ใน Postgres ดูแล (sql/monthly_rollup.sql)"""
+
+    TABLE, DAILY, TOTALS = "transactions_monthly", "transactions_daily", "transactions_monthly_totals"
+
+    def __init__(self, client, page_size: int = 1000):
+        self.client = client
+        self.page_size = page_size
+
+    def _rows(self, table: str, col: str, order: str, lo: date, hi: date) -> list:
+        def make_query():
+            return (self.client.table(table).select("*")
+                    .gte(col, lo.isoformat()).lte(col, hi.isoformat()).order(order))
+        return fetch_all(make_query, self.page_size)
+
+    def month(self, m: date) -> pd.DataFrame:
+        m = month_start(m)
+        return _frame(self._rows(self.TABLE, "month", "hospital_id", m, m), HOSP_COLS)
+
+    def daily(self, start: date, end: date) -> pd.DataFrame:
+        df = _frame(self._rows(self.DAILY, "date", "date", start, end), DAILY_COLS)
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+        return df
+
+    def totals(self, first: date, last: date) -> pd.DataFrame:
+        df = _frame(self._rows(self.TOTALS, "month", "month", month_start(first), month_start(last)), TOTAL_COLS)
+        df["month"] = pd.to_datetime(df["month"]).dt.date
+        return df
+
+
+# ---------------- ตารางรายงาน ----------------
+def report_tables(by_hosp: pd.DataFrame, daily: pd.DataFrame, hospitals_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """by_hospital / by_site / daily (คอลัมน์ transactions, ra) จากยอดรวมของเดือนเดียว"""
+    hosp = hospitals_df.reindex(columns=["id", "name", "site_control"]).copy()
+    hosp["id"] = hosp["id"].astype(str)
+    mm = by_hosp.merge(hosp, left_on="hospital_id", right_on="id", how="left")
+    mm["name"] = mm["name"].fillna(mm["hospital_id"])
+    mm = mm.rename(columns={"transactions_count": "transactions", "riders_active": "ra"})
+    by_name = mm.groupby("name")[["transactions", "ra"]].sum().reset_index()
+    by_site = mm.groupby("site_control")[["transactions", "ra"]].sum().reset_index()
+    day = daily.rename(columns={"transactions_count": "transactions", "riders_active": "ra"})
+    return {"by_hospital": by_name, "by_site": by_site, "daily": day}
+
+
+def hospital_rows(m: date, by_hosp: pd.DataFrame, hospitals_df: pd.DataFrame) -> pd.DataFrame:
+    """ยอดต่อโรงพยาบาลของเดือน m พร้อมคุณสมบัติโรงพยาบาล (สำหรับส่งออก Parquet)"""
+    attrs = [c for c in ("id", "name", "site_control", "region", "province", "hospital_type") if c in hospitals_df.columns]
+    hosp = hospitals_df[attrs].astype({"id": str}) if "id" in attrs else pd.DataFrame(columns=["id"])
+    out = by_hosp.merge(hosp, left_on="hospital_id", right_on="id", how="left").drop(columns="id")
+    out.insert(0, "month", pd.Timestamp(month_start(m)))
+    return out
+
+
+def compare_months(totals: pd.DataFrame, m: date) -> Dict[str, Optional[dict]]:
+    """ยอดของเดือน m เทียบเดือนก่อนหน้าและเดือนเดียวกันปีก่อน (ไม่มีข้อมูล = None)"""
+    rows = {r["month"]: r for r in totals.to_dict("records")}
+    m = month_start(m)
+    return {"current": rows.get(m), "prev_month": rows.get(add_months(m, -1)),
+            "prev_year": rows.get(add_months(m, -12))}
+
+
+def summary_text(m: date, by_hosp: pd.DataFrame) -> str:
+    """ข้อความสรุปสำหรับ LINE Notify"""
+    active = by_hosp[by_hosp["days"] > 0]
+    return (f"สรุป {m.strftime('%Y-%m')}\n"
+            f"รวมธุรกรรม: {int(active['transactions_count'].sum()):,} รายการ\n"
+            f"โรงพยาบาล: {active['hospital_id'].nunique()} แห่ง")
@@ -4,5 +4,5 @@ user, roles = require_login()          # ถ้าหน้านี้เฉพ
 import os, streamlit as st
 st.title("ENV check (staging)")
 for k in ("SUPABASE_URL","SUPABASE_ANON_KEY","SUPABASE_SERVICE_KEY",
-          "SUPABASE_SERVICE_ROLE_KEY","ENV"):
+          "SUPABASE_SERVICE_ROLE_KEY","ENV","DATA_BACKEND","SNAPSHOT_PATH"):
     st.write(k, "→", "✓" if os.getenv(k) else "✗")
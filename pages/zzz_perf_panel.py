@@ -0,0 +1,71 @@
+from auth_guard import require_admin
+require_admin()                        # เฉพาะผู้ดูแล
+
+from datetime import date
+
+import streamlit as st
+
+import perf
+
+st.title("Performance (session นี้)")
+rec = perf.session_recorder()
+reruns = rec.reruns()
+
+if not perf.ENABLED:
+    st.warning("ปิดการจับเวลาอยู่ (PERF_TRACE=0)")
+
+if not reruns:
+    st.info("ยังไม่มีข้อมูล — เปิดหน้า Dashboard/Admin ก่อน แล้วกลับมาหน้านี้")
+else:
+    last = reruns[-1]
+    st.markdown(f"#### รอบล่าสุด · {last['page']} · {last['ts']} · {last['total_s'] * 1000:,.0f} ms"
+                + ("" if last["complete"] else " (จบด้วย st.stop/rerun)"))
+    spans = rec.spans_frame()
+    cur = spans[spans["rerun"] == spans["rerun"].max()].copy()
+    cur["ms"] = cur["s"] * 1000
+    st.bar_chart(cur.groupby("name")["ms"].sum())
+    st.dataframe(cur[["name", "kind", "ms", "bytes"]], use_container_width=True, hide_index=True)
+
+    st.markdown(f"#### เวลาต่อรอบ ({len(reruns)} รอบล่าสุด)")
+    st.line_chart([r["total_s"] * 1000 for r in reruns])
+
+    st.markdown("#### สรุปต่อขั้น (ทุกรอบใน session)")
+    st.dataframe(rec.summary(), use_container_width=True, hide_index=True)
+
+    figs = spans[spans["kind"].isin(["figure_hit", "figure_miss"])]
+    if not figs.empty:
+        st.markdown("#### Figure cache (session นี้)")
+        tab = (figs.assign(ms=figs["s"] * 1000)
+               .pivot_table(index="name", columns="kind", values="ms", aggfunc=["count", "mean"], fill_value=0))
+        tab.columns = [f"{k.replace('figure_', '')}_{'n' if agg == 'count' else 'ms'}" for agg, k in tab.columns]
+        for c in ("hit_n", "miss_n"):
+            if c not in tab.columns:
+                tab[c] = 0
+        tab["hit_rate"] = tab["hit_n"] / (tab["hit_n"] + tab["miss_n"])
+        st.dataframe(tab.reset_index(), use_container_width=True, hide_index=True)
+
+    c1, c2 = st.columns(2)
+    c1.download_button("⬇️ ดาวน์โหลด JSON lines", rec.to_jsonl(), f"perf_{date.today().isoformat()}.jsonl",
+                       "application/x-ndjson", use_container_width=True)
+    if c2.button("ล้างข้อมูล", use_container_width=True):
+        rec.clear(); st.rerun()
+
+st.markdown("#### Profile หนึ่งรอบ")
+kind = st.selectbox("Profiler", perf.PROFILERS, help="pyinstrument ต้องติดตั้งแยก (pip install pyinstrument)")
+if st.button("Profile รอบถัดไป"):
+    rec.profile_next = kind
+if rec.profile_next:
+    st.caption(f"จะ profile ({rec.profile_next}) รอบถัดไปของหน้าหลัก — เปิดหน้า Dashboard แล้วกลับมาดูผล")
+
+res = rec.profile_result
+if res:
+    if res.get("error"):
+        st.error(f"เริ่ม {res['kind']} ไม่สำเร็จ: {res['error']}")
+    else:
+        st.caption(f"{res['kind']} · {res['page']} · {res['ts']}")
+        if res.get("html"):
+            import streamlit.components.v1 as components
+            components.html(res["html"], height=600, scrolling=True)
+        st.code(res["text"], language="text")
+        st.download_button("⬇️ ดาวน์โหลดผล profile", res["text"].encode("utf-8"),
+                           f"profile_{res['kind']}_{res['ts'].replace(':', '')}.txt", "text/plain")
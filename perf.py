@@ -0,0 +1,189 @@
+# perf.py
+# ============================================================
+# จับเวลา/ขนาดข้อมูลของแต่ละขั้นในหนึ่งรอบ rerun (เบา ๆ: perf_counter + นับ byte)
+# - Recorder หนึ่งตัวต่อ session (เก็บใน st.session_state) เก็บประวัติ N รอบล่าสุด
+# - ใช้ได้ 3 แบบ:
+#     with rec.timer('load_df:hospitals', 'data') as t: ...; t.nbytes = ...
+#     lap = rec.laps('dashboard'); ...; lap('kpi'); ...; lap('chart:site_pie')
+#     rec.add('png', seconds, nbytes, kind='export')
+# - สรุปต่อชื่อขั้น (จำนวนครั้ง/เฉลี่ย/p95/รวม/byte) และส่งออกเป็น JSON lines
+# - profile รอบ rerun เดียวแบบเลือกเปิด: cProfile (มีในตัว) หรือ pyinstrument (ถ้าติดตั้ง)
+# หน้าแสดงผล: pages/zzz_perf_panel.py (เฉพาะ admin)
+# ============================================================
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+HISTORY = int(os.getenv("PERF_HISTORY", "50") or 50)   # จำนวนรอบ rerun ที่เก็บต่อ session
+ENABLED = os.getenv("PERF_TRACE", "1") not in ("0", "false", "off")
+SESSION_KEY = "_perf_recorder"
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def nbytes(obj) -> int:
+    """ขนาดโดยประมาณของผลลัพธ์ (bytes / DataFrame / list ของ dict จาก Supabase)"""
+    if obj is None:
+        return 0
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=False).sum())
+    data = getattr(obj, "data", obj)
+    if isinstance(data, (list, dict)):
+        try:
+            return len(json.dumps(data, default=str, ensure_ascii=False).encode("utf-8"))
+        except Exception:
+            return 0
+    return 0
+
+
+class _Timer:
+    def __init__(self, rec: "Recorder", name: str, kind: str):
+        self.rec, self.name, self.kind = rec, name, kind
+        self.nbytes = 0
+        self.t0 = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.rec.add(self.name, time.perf_counter() - self.t0, self.nbytes, self.kind)
+
+
+class Recorder:
+    def __init__(self, history: int = HISTORY):
+        self.history: deque = deque(maxlen=history)
+        self.current: Optional[dict] = None
+        self.profile_next: Optional[str] = None     # ชนิด profiler ของรอบถัดไป
+        self.profile_result: Optional[dict] = None  # ผล profile ล่าสุด
+        self._profiler = None
+        self._lock = threading.Lock()
+
+    # ---------- rerun ----------
+    def begin_rerun(self, page: str = "") -> None:
+        """เริ่มรอบใหม่ (รอบก่อนหน้าที่ไม่ได้ปิดเพราะ st.stop/rerun ถูกปิดให้ที่นี่)"""
+        if self.current is not None:
+            self.end_rerun(complete=False)
+        self.current = {"ts": datetime.now().isoformat(timespec="seconds"), "page": page,
+                        "t0": time.perf_counter(), "spans": []}
+        if self.profile_next:
+            self._start_profile(self.profile_next)
+            self.profile_next = None
+
+    def end_rerun(self, complete: bool = True) -> None:
+        cur, self.current = self.current, None
+        if cur is None:
+            return
+        self._stop_profile(cur["page"], complete)
+        cur["total_s"] = time.perf_counter() - cur.pop("t0")
+        cur["complete"] = complete
+        with self._lock:
+            self.history.append(cur)
+
+    # ---------- spans ----------
+    def add(self, name: str, seconds: float, nbytes: int = 0, kind: str = "stage") -> None:
+        if not ENABLED or self.current is None:
+            return
+        self.current["spans"].append({"name": name, "kind": kind, "s": seconds, "bytes": int(nbytes or 0)})
+
+    def timer(self, name: str, kind: str = "stage") -> _Timer:
+        return _Timer(self, name, kind)
+
+    def laps(self, prefix: str = "", kind: str = "stage") -> Callable[[str], None]:
+        """จับเวลาต่อเนื่อง: lap(name) บันทึกเวลาตั้งแต่ lap ก่อนหน้า (หรือตอนสร้าง)"""
+        last = [time.perf_counter()]
+
+        def lap(name: str, nbytes: int = 0) -> None:
+            now = time.perf_counter()
+            self.add(f"{prefix}:{name}" if prefix else name, now - last[0], nbytes, kind)
+            last[0] = now
+        return lap
+
+    # ---------- สรุป ----------
+    def reruns(self) -> List[dict]:
+        with self._lock:
+            return list(self.history)
+
+    def spans_frame(self) -> pd.DataFrame:
+        rows = [dict(s, rerun=i, ts=r["ts"], page=r["page"])
+                for i, r in enumerate(self.reruns()) for s in r["spans"]]
+        return pd.DataFrame(rows, columns=["rerun", "ts", "page", "name", "kind", "s", "bytes"])
+
+    def summary(self) -> pd.DataFrame:
+        """ต่อชื่อขั้นของทุกรอบใน session: count / mean_ms / p95_ms / total_s / bytes"""
+        df = self.spans_frame()
+        if df.empty:
+            return pd.DataFrame(columns=["name", "kind", "count", "mean_ms", "p95_ms", "total_s", "bytes"])
+        g = df.groupby(["name", "kind"])
+        out = pd.DataFrame({
+            "count": g["s"].size(),
+            "mean_ms": g["s"].mean() * 1000,
+            "p95_ms": g["s"].quantile(0.95) * 1000,
+            "total_s": g["s"].sum(),
+            "bytes": g["bytes"].sum(),
+        }).reset_index()
+        return out.sort_values("total_s", ascending=False).reset_index(drop=True)
+
+    def to_jsonl(self) -> bytes:
+        """หนึ่งบรรทัดต่อรอบ rerun"""
+        return "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in self.reruns()).encode("utf-8")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.history.clear()
+        self.profile_result = None
+
+    # ---------- profiler ----------
+    def _start_profile(self, kind: str) -> None:
+        try:
+            if kind == "pyinstrument":
+                from pyinstrument import Profiler
+                prof = Profiler()
+                prof.start()
+            else:
+                import cProfile
+                prof = cProfile.Profile()
+                prof.enable()
+            self._profiler = (kind, prof)
+        except Exception as e:
+            self._profiler = None
+            self.profile_result = {"kind": kind, "error": f"{type(e).__name__}: {e}"}
+
+    def _stop_profile(self, page: str, complete: bool) -> None:
+        if self._profiler is None:
+            return
+        kind, prof = self._profiler
+        self._profiler = None
+        result = {"kind": kind, "page": page, "complete": complete,
+                  "ts": datetime.now().isoformat(timespec="seconds")}
+        if kind == "pyinstrument":
+            prof.stop()
+            result["text"] = prof.output_text(unicode=True, color=False)
+            result["html"] = prof.output_html()
+        else:
+            import pstats
+            prof.disable()
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(60)
+            result["text"] = buf.getvalue()
+        self.profile_result = result
+
+
+def session_recorder() -> Recorder:
+    """Recorder ของ session ปัจจุบัน (สร้างครั้งแรกที่เรียก)"""
+    import streamlit as st
+    rec = st.session_state.get(SESSION_KEY)
+    if rec is None:
+        rec = st.session_state[SESSION_KEY] = Recorder()
+    return rec
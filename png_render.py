@@ -0,0 +1,179 @@
+# png_render.py
+# ============================================================
+# PNG renderer สำหรับ export กราฟ plotly (ใช้กับ build_dashboard_png)
+# - เปิด kaleido ค้างไว้ (warm) ต่อ process แล้ว render หลายกราฟพร้อมกัน
+#     kaleido >= 1.0 : Kaleido(n=workers) 1 ตัวใน event loop ของ thread เบื้องหลัง
+#     kaleido 0.2.x  : PlotlyScope หลายตัว (ตัวละ 1 subprocess) + thread pool
+#     อื่น ๆ          : pio.to_image ทีละรูป (fallback)
+# - PNG ของแต่ละกราฟ cache แบบ LRU ด้วย hash ของ figure JSON
+# - ภาพรวม (composite) cache ด้วย key ของภาพย่อยทั้งหมด → สร้างใหม่เมื่อภาพย่อยเปลี่ยนเท่านั้น
+# ============================================================
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib.util
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import plotly.io as pio
+
+RENDER_TIMEOUT = 60  # วินาทีต่อชุด
+
+
+class LRU:
+    """dict แบบ LRU ที่ thread-safe (ใช้ร่วมกันหลาย session)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+def figure_key(fig, scale: float = 2) -> str:
+    """hash ของ figure JSON (+ scale) ใช้เป็น key ของ PNG"""
+    raw = fig.to_json() if hasattr(fig, "to_json") else pio.to_json(fig)
+    return hashlib.sha1(f"{scale}|{raw}".encode("utf-8")).hexdigest()
+
+
+class PngRenderer:
+    def __init__(self, workers: int = 4, scale: float = 2, cache_size: int = 64, composite_size: int = 16):
+        self.workers = max(1, workers)
+        self.scale = scale
+        self.images = LRU(cache_size)
+        self.composites = LRU(composite_size)
+        self._mode = self._detect()
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._kaleido = None
+        self._scopes: Optional[queue.Queue] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    # ---------- backend ----------
+    @staticmethod
+    def _detect() -> str:
+        try:
+            import kaleido
+        except Exception:
+            return "pio"
+        if hasattr(kaleido, "Kaleido"):
+            return "kaleido"
+        try:
+            # kaleido 0.2.x: ตรวจว่ามี PlotlyScope (start() สร้าง scope จริงทีหลัง)
+            return "scope" if importlib.util.find_spec("kaleido.scopes.plotly") else "pio"
+        except Exception:
+            return "pio"
+
+    def start(self) -> "PngRenderer":
+        """เริ่ม worker เบื้องหลัง (ไม่บล็อก) เรียกซ้ำได้"""
+        with self._start_lock:
+            if self._started:
+                return self
+            self._started = True
+        if self._mode == "kaleido":
+            threading.Thread(target=self._run_loop, daemon=True, name="kaleido-pool").start()
+        elif self._mode == "scope":
+            from kaleido.scopes.plotly import PlotlyScope
+            self._scopes = queue.Queue()
+            for _ in range(self.workers):
+                self._scopes.put(PlotlyScope())
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="kaleido-scope")
+            self._ready.set()
+        else:
+            self._ready.set()
+        return self
+
+    def _run_loop(self) -> None:
+        import kaleido
+
+        async def main():
+            try:
+                async with kaleido.Kaleido(n=self.workers) as k:
+                    self._kaleido = k
+                    self._loop = asyncio.get_running_loop()
+                    self._ready.set()
+                    await asyncio.Event().wait()  # ค้างไว้จนจบ process
+            except Exception:
+                self._kaleido = None
+                self._mode = "pio"
+                self._ready.set()
+
+        asyncio.run(main())
+
+    def _render_misses(self, figs: Sequence) -> List[Optional[bytes]]:
+        opts = {"format": "png", "scale": self.scale}
+        if self._mode == "kaleido" and self._kaleido is not None:
+            async def batch():
+                return await asyncio.gather(*[self._kaleido.calc_fig(f, opts=opts) for f in figs],
+                                            return_exceptions=True)
+            res = asyncio.run_coroutine_threadsafe(batch(), self._loop).result(RENDER_TIMEOUT)
+            return [r if isinstance(r, (bytes, bytearray)) else None for r in res]
+        if self._mode == "scope" and self._pool is not None:
+            def one(fig):
+                scope = self._scopes.get()
+                try:
+                    return scope.transform(fig.to_dict() if hasattr(fig, "to_dict") else fig, **opts)
+                except Exception:
+                    return None
+                finally:
+                    self._scopes.put(scope)
+            return list(self._pool.map(one, figs, timeout=RENDER_TIMEOUT))
+
+        out = []
+        for fig in figs:
+            try:
+                out.append(pio.to_image(fig, **opts))
+            except Exception:
+                out.append(None)
+        return out
+
+    # ---------- public ----------
+    def render(self, figs: Sequence) -> List[tuple]:
+        """คืน [(key, png_bytes|None), ...] ตามลำดับ figs (ดึงจาก cache ก่อน ที่เหลือ render พร้อมกัน)"""
+        keys = [figure_key(f, self.scale) for f in figs]
+        out = {k: self.images.get(k) for k in keys}
+        missing = [(k, f) for k, f in zip(keys, figs) if out[k] is None]
+        if missing:
+            self.start()
+            self._ready.wait(RENDER_TIMEOUT)
+            try:
+                pngs = self._render_misses([f for _, f in missing])
+            except Exception:
+                pngs = [None] * len(missing)
+            for (k, _), png in zip(missing, pngs):
+                if png:
+                    self.images.put(k, bytes(png))
+                out[k] = png
+        return [(k, out[k]) for k in keys]
+
+    def composite(self, key: tuple, build: Callable[[], bytes]) -> bytes:
+        """ภาพรวมที่ประกอบจากภาพย่อย (key ควรรวม key ของภาพย่อย + หัวเรื่อง/ธีม)"""
+        data = self.composites.get(key)
+        if data is None:
+            data = build()
+            self.composites.put(key, data)
+        return data
@@ -0,0 +1,174 @@
+# snapshot.py
+# ============================================================
+# ส่งออกแบบ columnar (Arrow/Parquet) + snapshot ของข้อมูลทั้งชุด
+# - to_parquet_bytes: DataFrame → Parquet (zstd) คง dtype ไว้ให้ pandas อ่านกลับได้ทันที
+#     วันที่ (date/month) → date32, คุณสมบัติโรงพยาบาล (ชื่อ/ทีม/ภูมิภาค/ประเภท ฯลฯ) → dictionary (category)
+# - write_snapshot: transactions + hospitals ทั้งตาราง → <SNAPSHOT_DIR>/<YYYY-MM-DD>/*.parquet + manifest.json
+#   (เขียนลงโฟลเดอร์ชั่วคราวก่อนแล้วค่อย rename → ไม่มี snapshot ครึ่ง ๆ กลาง ๆ)
+# - boot: โหลด snapshot เข้า local_backend.LocalClient (SQLite ใน memory)
+#   DATA_BACKEND=snapshot SNAPSHOT_PATH=<โฟลเดอร์ snapshot หรือ latest> → แอปทั้งหมดอ่านจาก snapshot
+#   ไม่ยิง Supabase เลย (การแก้ไขในโหมดนี้อยู่แค่ใน memory ของ process)
+# CLI:
+#   python snapshot.py                     # snapshot จากฐานข้อมูลตาม env (service key) ลง SNAPSHOT_DIR
+#   python snapshot.py --out /data/snaps   # เลือกโฟลเดอร์ปลายทาง
+#   python snapshot.py --list
+# ============================================================
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_cache import fetch_all
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_TABLES = ("hospitals", "transactions")
+CATEGORY_COLS = ("name", "province", "region", "site_control", "system_type", "hospital_type")
+DATE_COLS = ("date", "month")
+TS_COLS = ("created_at", "updated_at")
+COMPRESSION = "zstd"
+MANIFEST = "manifest.json"
+
+
+# ---------------- Arrow / Parquet ----------------
+def _column(s: pd.Series) -> pa.Array:
+    try:
+        return pa.array(s, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # object ปนหลายชนิด (เช่น list กับข้อความ) → เก็บเป็นข้อความ
+        return pa.array(s.map(lambda v: None if v is None or v is pd.NA else str(v)), type=pa.string())
+
+
+def to_arrow(df: pd.DataFrame, categories: Iterable[str] = CATEGORY_COLS) -> pa.Table:
+    """DataFrame → Arrow Table (ไม่ copy frame): วันที่เป็น date32, คอลัมน์ใน categories เป็น dictionary"""
+    categories = set(categories)
+    arrays, names = [], []
+    for c in df.columns:
+        arr = _column(df[c])
+        if c in DATE_COLS and pa.types.is_timestamp(arr.type):
+            if arr.type.tz is not None:
+                arr = arr.cast(pa.timestamp(arr.type.unit))
+            arr = arr.cast(pa.date32())
+        if c in categories and (pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type)):
+            arr = arr.dictionary_encode()
+        arrays.append(arr)
+        names.append(str(c))
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def to_parquet_bytes(df: pd.DataFrame, categories: Iterable[str] = CATEGORY_COLS) -> bytes:
+    buf = io.BytesIO()
+    pq.write_table(to_arrow(df, categories), buf, compression=COMPRESSION)
+    return buf.getvalue()
+
+
+def read_parquet(source) -> pd.DataFrame:
+    """Parquet → DataFrame (date32 → datetime.date, dictionary → category, list → list ของ Python)"""
+    table = pq.read_table(source)
+    df = table.to_pandas()
+    for i, field in enumerate(table.schema):
+        if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            df[field.name] = table.column(i).to_pylist()
+    return df
+
+
+# ---------------- Snapshot ----------------
+def fetch_tables(client, tables: Iterable[str] = SNAPSHOT_TABLES, page_size: int = 1000) -> Dict[str, pd.DataFrame]:
+    """อ่านทั้งตาราง (ทุกคอลัมน์ เรียงตาม id) ผ่าน client แบบ supabase"""
+    return {t: pd.DataFrame(fetch_all(lambda t=t: client.table(t).select("*").order("id"), page_size))
+            for t in tables}
+
+
+def write_snapshot(frames: Dict[str, pd.DataFrame], root: str = SNAPSHOT_DIR, day: Optional[date] = None) -> str:
+    """เขียน snapshot ของวัน day (ค่าเริ่มต้นวันนี้ เขียนซ้ำวันเดิมจะแทนที่) คืน path ของโฟลเดอร์"""
+    day = day or date.today()
+    path = os.path.join(root, day.isoformat())
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    manifest = {"created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "tables": {}}
+    for table, df in frames.items():
+        # ข้อความ ISO จาก PostgREST → timestamp/date จริง
+        conv = {c: pd.to_datetime(df[c], utc=c in TS_COLS, format="ISO8601")
+                for c in ("date",) + TS_COLS if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c])}
+        if conv:
+            df = df.assign(**conv)
+        pq.write_table(to_arrow(df), os.path.join(tmp, f"{table}.parquet"), compression=COMPRESSION)
+        manifest["tables"][table] = {"rows": int(len(df))}
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+
+def list_snapshots(root: str = SNAPSHOT_DIR) -> List[str]:
+    """โฟลเดอร์ snapshot ที่สมบูรณ์ (มี manifest) เรียงจากเก่าไปใหม่"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, d) for d in os.listdir(root)
+                  if ".tmp-" not in d and os.path.isfile(os.path.join(root, d, MANIFEST)))
+
+
+def resolve(path: str = "latest", root: str = SNAPSHOT_DIR) -> str:
+    if path and path != "latest":
+        return path
+    found = list_snapshots(root)
+    if not found:
+        raise FileNotFoundError(f"ไม่พบ snapshot ใน {root}")
+    return found[-1]
+
+
+def read_snapshot(path: str) -> Dict[str, pd.DataFrame]:
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        tables = json.load(f)["tables"]
+    return {t: read_parquet(os.path.join(path, f"{t}.parquet")) for t in tables}
+
+
+@lru_cache(maxsize=None)
+def boot(path: str = "latest"):
+    """LocalClient (SQLite ใน memory) ที่เติมข้อมูลจาก snapshot แล้ว — หนึ่งตัวต่อ path ต่อ process"""
+    import local_backend
+    client = local_backend.LocalClient(":memory:")
+    for table, df in read_snapshot(resolve(path)).items():
+        if table not in local_backend.SCHEMA or df.empty:
+            continue
+        cols = [c for c in df.columns if c in local_backend.SCHEMA[table]]
+        df = df[cols].astype({c: object for c in cols if isinstance(df[c].dtype, pd.CategoricalDtype)})
+        client.load_frame(table, df)
+    return client
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="snapshot Parquet ของ transactions + hospitals")
+    ap.add_argument("--out", default=SNAPSHOT_DIR, help="โฟลเดอร์ที่เก็บ snapshot")
+    ap.add_argument("--list", action="store_true", help="แสดง snapshot ที่มีอยู่")
+    args = ap.parse_args(argv)
+
+    if args.list:
+        for p in list_snapshots(args.out):
+            with open(os.path.join(p, MANIFEST), encoding="utf-8") as f:
+                m = json.load(f)
+            print(p, m["created_at"], {t: v["rows"] for t, v in m["tables"].items()})
+        return
+
+    from supabase_client import supabase_admin
+    t0 = time.time()
+    frames = fetch_tables(supabase_admin())
+    path = write_snapshot(frames, args.out)
+    print(f"wrote {path} ({', '.join(f'{t} {len(df):,}' for t, df in frames.items())}) in {time.time() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
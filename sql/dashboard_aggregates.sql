@@ -0,0 +1,70 @@
+-- sql/dashboard_aggregates.sql
+-- ============================================================
+-- KPI + groupby ของหน้า Dashboard ในรอบเดียว (เรียกผ่าน sb.rpc('dashboard_aggregates', ...))
+-- - ติดตั้ง: รันไฟล์นี้ใน Supabase SQL editor
+-- - ถ้ายังไม่ติดตั้ง แอปจะ fallback ไปคำนวณด้วย pandas เอง (DASHBOARD_AGG_MODE=auto)
+-- - p_from: วันแรกที่ต้องใช้ (ย้อนหลังสำหรับกราฟ / ต้นเดือน) → daily ครอบคลุม p_from..p_end
+-- - p_hospital_ids: null = ทุกโรงพยาบาล
+-- ============================================================
+
+create or replace function public.dashboard_aggregates(
+  p_start date,
+  p_end date,
+  p_from date default null,
+  p_hospital_ids text[] default null
+) returns json
+language sql
+stable
+as $$
+  with tx as (
+    select t.date, t.hospital_id, t.transactions_count, t.riders_active,
+           h.name, h.site_control, h.hospital_type, coalesce(h.riders_count, 0) as riders_count
+    from public.transactions t
+    left join public.hospitals h on h.id = t.hospital_id
+    where t.date between least(coalesce(p_from, p_start), p_start) and p_end
+      and (p_hospital_ids is null or t.hospital_id::text = any(p_hospital_ids))
+  ),
+  sel as (
+    select * from tx where date between p_start and p_end
+  )
+  select json_build_object(
+    'kpi', (
+      select json_build_object(
+        'total_tx',      coalesce(sum(transactions_count), 0),
+        'hospitals',     count(distinct hospital_id),
+        'riders_cap',    coalesce(sum(riders_count), 0),
+        'riders_active', coalesce(sum(riders_active), 0),
+        'avg_day',       coalesce((select avg(s) from (select sum(transactions_count) as s from sel group by date) d), 0),
+        'month_accum',   (select coalesce(sum(transactions_count), 0) from tx
+                          where date between date_trunc('month', p_end)::date and p_end)
+      ) from sel
+    ),
+    'by_site', (
+      select coalesce(json_agg(r), '[]'::json) from (
+        select site_control, sum(transactions_count) as transactions_count,
+               sum(riders_active) as riders_active, sum(riders_count) as riders_count
+        from sel where site_control is not null group by site_control
+      ) r
+    ),
+    'by_type', (
+      select coalesce(json_agg(r), '[]'::json) from (
+        select hospital_type, sum(transactions_count) as transactions_count,
+               sum(riders_active) as riders_active, sum(riders_count) as riders_total,
+               count(distinct hospital_id) as hospitals_count
+        from sel where hospital_type is not null group by hospital_type
+      ) r
+    ),
+    'by_hospital', (
+      select coalesce(json_agg(r), '[]'::json) from (
+        select name, sum(transactions_count) as transactions_count, sum(riders_active) as riders_active
+        from sel where name is not null group by name
+      ) r
+    ),
+    'daily', (
+      select coalesce(json_agg(r order by r.date), '[]'::json) from (
+        select date, sum(transactions_count) as transactions_count, sum(riders_active) as riders_active
+        from tx group by date
+      ) r
+    )
+  );
+$$;
@@ -0,0 +1,26 @@
+-- sql/delete_hospitals.sql
+-- ============================================================
+-- ลบโรงพยาบาลหลายแห่งพร้อม transactions ของโรงพยาบาลนั้นในรอบเดียว (sb.rpc('delete_hospitals', ...))
+-- - ทำใน transaction เดียว: ลบ transactions ก่อนแล้วจึงลบ hospitals
+-- - คืน {"hospitals": <จำนวน>, "transactions": <จำนวน>}
+-- - ถ้ายังไม่ติดตั้ง แอปจะลบด้วย in_() ทีละก้อนแทน
+-- ============================================================
+
+create or replace function public.delete_hospitals(p_ids text[])
+returns json
+language plpgsql
+as $$
+declare
+  n_tx integer;
+  n_h integer;
+begin
+  delete from public.transactions
+   where hospital_id in (select id from public.hospitals where id::text = any(p_ids));
+  get diagnostics n_tx = row_count;
+
+  delete from public.hospitals where id::text = any(p_ids);
+  get diagnostics n_h = row_count;
+
+  return json_build_object('hospitals', n_h, 'transactions', n_tx);
+end;
+$$;
@@ -0,0 +1,131 @@
+-- sql/monthly_rollup.sql
+-- ============================================================
+-- ยอดรวมรายเดือนสำหรับหน้ารายงาน (monthly_rollup.SqlRollup)
+-- - transactions_monthly: ต่อ (month, hospital_id)  transactions_count / riders_active / days
+-- - transactions_daily:   ต่อวัน รวมทุกโรงพยาบาล
+-- - view transactions_monthly_site / transactions_monthly_totals: ต่อ (month, site_control) / ต่อเดือน
+-- - trigger ระดับ statement (transition table) ปรับยอดตาม insert/update/delete ของ transactions
+--   → นำเข้าทีละ batch ปรับยอดครั้งเดียวต่อคำสั่ง ไม่ใช่ต่อแถว
+-- - ไม่บังคับ: ถ้าไม่ติดตั้ง แอปคำนวณยอดรวมเองใน memory จาก cache ของ transactions
+-- - รันซ้ำได้ (สร้างยอดใหม่จาก transactions ทั้งหมดทุกครั้ง)
+-- ============================================================
+
+create table if not exists public.transactions_monthly (
+  month date not null,
+  hospital_id text not null,
+  transactions_count bigint not null default 0,
+  riders_active bigint not null default 0,
+  days integer not null default 0,
+  primary key (month, hospital_id)
+);
+
+create table if not exists public.transactions_daily (
+  date date primary key,
+  transactions_count bigint not null default 0,
+  riders_active bigint not null default 0,
+  rows integer not null default 0
+);
+
+create or replace view public.transactions_monthly_site as
+select m.month, h.site_control,
+       sum(m.transactions_count) as transactions_count,
+       sum(m.riders_active) as riders_active,
+       count(*) as hospitals
+from public.transactions_monthly m
+left join public.hospitals h on h.id::text = m.hospital_id
+group by m.month, h.site_control;
+
+create or replace view public.transactions_monthly_totals as
+select month,
+       sum(transactions_count) as transactions_count,
+       sum(riders_active) as riders_active,
+       count(*) as hospitals
+from public.transactions_monthly
+group by month;
+
+-- p_rows: json array ของแถว transactions, p_sign: +1 (แถวใหม่) / -1 (แถวเดิม)
+create or replace function public.transactions_rollup_add(p_rows jsonb, p_sign integer)
+returns void
+language sql
+as $$
+  with r as (
+    select (x->>'date')::date as date, x->>'hospital_id' as hospital_id,
+           coalesce((x->>'transactions_count')::bigint, 0) as tx,
+           coalesce((x->>'riders_active')::bigint, 0) as ra
+    from jsonb_array_elements(p_rows) x
+  )
+  insert into public.transactions_monthly as m (month, hospital_id, transactions_count, riders_active, days)
+  select date_trunc('month', date)::date, hospital_id, p_sign * sum(tx), p_sign * sum(ra), p_sign * count(*)
+  from r group by 1, 2
+  on conflict (month, hospital_id) do update
+    set transactions_count = m.transactions_count + excluded.transactions_count,
+        riders_active = m.riders_active + excluded.riders_active,
+        days = m.days + excluded.days;
+
+  with r as (
+    select (x->>'date')::date as date,
+           coalesce((x->>'transactions_count')::bigint, 0) as tx,
+           coalesce((x->>'riders_active')::bigint, 0) as ra
+    from jsonb_array_elements(p_rows) x
+  )
+  insert into public.transactions_daily as d (date, transactions_count, riders_active, rows)
+  select date, p_sign * sum(tx), p_sign * sum(ra), p_sign * count(*)
+  from r group by 1
+  on conflict (date) do update
+    set transactions_count = d.transactions_count + excluded.transactions_count,
+        riders_active = d.riders_active + excluded.riders_active,
+        rows = d.rows + excluded.rows;
+
+  delete from public.transactions_monthly
+   where days <= 0
+     and month in (select distinct date_trunc('month', (x->>'date')::date)::date
+                   from jsonb_array_elements(p_rows) x);
+  delete from public.transactions_daily
+   where rows <= 0
+     and date in (select distinct (x->>'date')::date from jsonb_array_elements(p_rows) x);
+$$;
+
+-- transition table อ้างถึงได้เฉพาะใน branch ที่ตรงกับ TG_OP (plpgsql plan ตอนรันจริง)
+create or replace function public.transactions_rollup_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform public.transactions_rollup_add((select coalesce(jsonb_agg(to_jsonb(o)), '[]') from old_rows o), -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform public.transactions_rollup_add((select coalesce(jsonb_agg(to_jsonb(n)), '[]') from new_rows n), 1);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists transactions_rollup_ins on public.transactions;
+create trigger transactions_rollup_ins after insert on public.transactions
+  referencing new table as new_rows
+  for each statement execute function public.transactions_rollup_trigger();
+
+drop trigger if exists transactions_rollup_upd on public.transactions;
+create trigger transactions_rollup_upd after update on public.transactions
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function public.transactions_rollup_trigger();
+
+drop trigger if exists transactions_rollup_del on public.transactions;
+create trigger transactions_rollup_del after delete on public.transactions
+  referencing old table as old_rows
+  for each statement execute function public.transactions_rollup_trigger();
+
+-- ตั้งต้นจากข้อมูลเดิม (ล็อกกันการเขียนระหว่างคำนวณ)
+do $$
+begin
+  lock table public.transactions in share row exclusive mode;
+  truncate public.transactions_monthly, public.transactions_daily;
+  insert into public.transactions_monthly (month, hospital_id, transactions_count, riders_active, days)
+  select date_trunc('month', date)::date, hospital_id::text,
+         sum(coalesce(transactions_count, 0)), sum(coalesce(riders_active, 0)), count(*)
+  from public.transactions group by 1, 2;
+  insert into public.transactions_daily (date, transactions_count, riders_active, rows)
+  select date, sum(coalesce(transactions_count, 0)), sum(coalesce(riders_active, 0)), count(*)
+  from public.transactions group by 1;
+end $$;
@@ -0,0 +1,40 @@
+-- sql/save_transaction.sql
+-- ============================================================
+-- บันทึก transaction 1 แถว (โรงพยาบาล, วันที่) ในรอบเดียว (sb.rpc('save_transaction', ...))
+-- - ตรวจ Rider Active ไม่เกิน riders_count ของโรงพยาบาลใน DB
+-- - insert ... on conflict (hospital_id, date) do update → บันทึกพร้อมกันหลายคนก็ไม่เกิดแถวซ้ำ
+-- - ต้องติดตั้ง sql/transactions_unique.sql ก่อน (unique index + ค่า default ของ id)
+-- - ถ้ายังไม่ติดตั้ง แอปจะตรวจ capacity เองแล้ว upsert(on_conflict='hospital_id,date') แทน
+-- - error: P0001 'riders_over_capacity' / 'hospital_not_found'
+-- ============================================================
+
+create or replace function public.save_transaction(
+  p_hospital_id public.transactions.hospital_id%type,
+  p_date date,
+  p_transactions_count integer,
+  p_riders_active integer
+) returns json
+language plpgsql
+as $$
+declare
+  cap integer;
+  saved public.transactions;
+begin
+  select coalesce(h.riders_count, 0) into cap from public.hospitals h where h.id = p_hospital_id;
+  if not found then
+    raise exception 'hospital_not_found' using errcode = 'P0001';
+  end if;
+  if p_riders_active > cap then
+    raise exception 'riders_over_capacity' using errcode = 'P0001', detail = format('capacity=%s', cap);
+  end if;
+
+  insert into public.transactions as t (hospital_id, date, transactions_count, riders_active)
+  values (p_hospital_id, p_date, p_transactions_count, p_riders_active)
+  on conflict (hospital_id, date) do update
+    set transactions_count = excluded.transactions_count,
+        riders_active = excluded.riders_active
+  returning t.* into saved;
+
+  return row_to_json(saved);
+end;
+$$;
@@ -0,0 +1,33 @@
+-- sql/transactions_unique.sql
+-- ============================================================
+-- unique (hospital_id, date) สำหรับนำเข้าแบบ batch (tx_import.py)
+-- - ให้ upsert(on_conflict='hospital_id,date') ทำงานได้ในคำสั่งเดียว
+-- - ลบแถวซ้ำเดิมก่อน (เก็บแถวที่สร้างล่าสุด)
+-- - id / created_at มีค่า default → upsert ไม่ต้องส่ง id (แถวเดิมคง id เดิม)
+-- - ไม่บังคับ: ถ้าไม่ติดตั้ง การนำเข้าจะดึง id เดิมทีละก้อนแทน (ช้ากว่า)
+-- ============================================================
+
+delete from public.transactions t
+using public.transactions d
+where t.hospital_id = d.hospital_id
+  and t.date = d.date
+  -- created_at ว่าง = เก่าที่สุด (ไม่งั้นเปรียบเทียบได้ null แล้วแถวซ้ำไม่ถูกลบ)
+  and (coalesce(t.created_at, '-infinity'), t.ctid) < (coalesce(d.created_at, '-infinity'), d.ctid);
+
+create unique index if not exists transactions_hospital_date_key
+  on public.transactions (hospital_id, date);
+
+do $$
+declare
+  id_type text;
+begin
+  select data_type into id_type from information_schema.columns
+   where table_schema = 'public' and table_name = 'transactions' and column_name = 'id';
+  if id_type = 'uuid' then
+    alter table public.transactions alter column id set default gen_random_uuid();
+  else
+    alter table public.transactions alter column id set default gen_random_uuid()::text;
+  end if;
+end $$;
+
+alter table public.transactions alter column created_at set default now();
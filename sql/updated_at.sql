@@ -0,0 +1,26 @@
+-- sql/updated_at.sql
+-- ============================================================
+-- คอลัมน์ updated_at สำหรับ incremental cache (data_cache.py)
+-- - ถ้ามี updated_at แคชจะใช้เป็น watermark แทน created_at
+--   จึงเห็นแถวที่ถูก "แก้ไข" จาก process อื่นด้วย (ไม่ต้องรอ full resync)
+-- - ไม่บังคับ: ถ้าไม่ติดตั้ง แคชยังใช้ created_at ได้ตามเดิม
+-- ============================================================
+
+create or replace function public.touch_updated_at() returns trigger
+language plpgsql as $$
+begin
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+alter table public.transactions add column if not exists updated_at timestamptz not null default now();
+create index if not exists transactions_updated_at_idx on public.transactions (updated_at);
+drop trigger if exists transactions_touch_updated_at on public.transactions;
+create trigger transactions_touch_updated_at before insert or update on public.transactions
+  for each row execute function public.touch_updated_at();
+
+alter table public.hospitals add column if not exists updated_at timestamptz not null default now();
+drop trigger if exists hospitals_touch_updated_at on public.hospitals;
+create trigger hospitals_touch_updated_at before insert or update on public.hospitals
+  for each row execute function public.touch_updated_at();
@@ -1,10 +1,12 @@
 # streamlit_app.py
 
 import os
-import io
+import time
+import threading
 import streamlit as st
 import bcrypt
 import uuid
+import requests
 
 def get_env(name: str, default: str = "") -> str:
     # ลองจาก st.secrets ก่อน ถ้าไม่มีค่อยไป os.getenv
@@ -18,15 +20,35 @@ def get_env(name: str, default: str = "") -> str:
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import plotly.io as pio
-from PIL import Image, ImageDraw, ImageFont
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from typing import List, Dict
+from collections import OrderedDict
 from supabase import create_client, Client
 from postgrest.exceptions import APIError
+from postgrest.types import CountMethod, ReturnMethod
 from auth_guard import require_login, current_user
-
-APP_VERSION = "v4.9.5"
+from data_cache import TableCache, cache_key, fetch_all, tables_version
+from filter_cube import CubeCache, FilterCube
+from master_data import MasterData, MASTER_TABLES
+from tx_grid import TxGrid, GridQuery, PAGE_SIZES
+from telemed_core import (
+    APP_VERSION, PALETTE_PASTEL, PALETTE_DARK, SITE_CONTROL_CHOICES, SYSTEM_CHOICES,
+    DEFAULT_SERVICE_MODELS, DEFAULT_HOSPITAL_TYPES, TH_PROVINCES, th_date, date_labels,
+    TX_COLS, slice_tx, hospital_ids_for, merge_hospitals, export_sheets, df_to_excel_bytes,
+    AGG_FRAMES, aggregate_dashboard,
+    BACKFILL_OPTIONS, BACKFILL_MAX_DAYS, PNG_ORDER, compose_dashboard_png,
+    empty_figure, donut_figure, daily_trend_figure, type_bar_figure, hospital_bar_figure, site_table_figure,
+    HOSPITAL_BAR_SIZES, hospital_page, hospital_ranking,
+)
+from png_render import PngRenderer
+from fig_cache import FigureCache
+import tx_import
+import bootstrap
+import demo_seed
+import local_backend
+import perf
+import monthly_rollup
+import snapshot
 
 # ---------------- Page / Theme ----------------
 st.set_page_config(page_title="DashBoard Telemedicine", page_icon="📊", layout="wide")
@@ -35,6 +57,10 @@ st.set_page_config(page_title="DashBoard Telemedicine", page_icon="📊", layout
 require_login()
 user_email, role = current_user()
 
+# ---------------- Instrumentation (ดู perf.py / pages/zzz_perf_panel.py) ----------------
+PERF = perf.session_recorder()
+PERF.begin_rerun(st.query_params.get('page', 'dashboard'))
+
 st.title("Dashboard (staging)")
 st.write("Welcome,", user_email or "-")
 if role == "admin":
@@ -45,43 +71,16 @@ else:
 
 
 
-PALETTE_PASTEL = ["#A7C7E7","#F8C8DC","#B6E2D3","#FDE2B3","#EAD7F7","#CDE5F0",
-                  "#FFD6E8","#C8E6C9","#FFF3B0","#D7E3FC","#F2D7EE","#B8F1ED"]
-PALETTE_DARK   = ["#60A5FA","#F472B6","#34D399","#FBBF24","#C084FC","#67E8F9",
-                  "#FCA5A5","#86EFAC","#FDE68A","#A5B4FC","#F5D0FE","#99F6E4"]
-
-SITE_CONTROL_CHOICES = ['ทีมใต้', 'ทีมเหนือ', 'ทีมอีสาน']
-SYSTEM_CHOICES = ['HOSxpV4', 'HOSxpV3', 'WebPortal']
-DEFAULT_SERVICE_MODELS = ['Rider', 'App', 'Station to Station']
-DEFAULT_HOSPITAL_TYPES = ['รพ.ศูนย์/รพ.ทั่วไป','รพ.ชุมชน','สถาบัน/เฉพาะทาง','เอกชน/คลินิก']
-
-# -------- 77 จังหวัด + ภูมิภาค --------
-TH_PROVINCES = {
-    'กรุงเทพมหานคร':'ภาคกลาง','นนทบุรี':'ภาคกลาง','ปทุมธานี':'ภาคกลาง','พระนครศรีอยุธยา':'ภาคกลาง',
-    'อ่างทอง':'ภาคกลาง','ลพบุรี':'ภาคกลาง','สิงห์บุรี':'ภาคกลาง','ชัยนาท':'ภาคกลาง','สระบุรี':'ภาคกลาง',
-    'นครปฐม':'ภาคกลาง','สมุทรสาคร':'ภาคกลาง','สมุทรสงคราม':'ภาคกลาง','สุพรรณบุรี':'ภาคกลาง','สมุทรปราการ':'ภาคกลาง',
-    'นครนายก':'ภาคกลาง',
-    'ชลบุรี':'ภาคตะวันออก','ระยอง':'ภาคตะวันออก','จันทบุรี':'ภาคตะวันออก','ตราด':'ภาคตะวันออก',
-    'ฉะเชิงเทรา':'ภาคตะวันออก','ปราจีนบุรี':'ภาคตะวันออก','สระแก้ว':'ภาคตะวันออก',
-    'กาญจนบุรี':'ภาคตะวันตก','ตาก':'ภาคตะวันตก','ราชบุรี':'ภาคตะวันตก','เพชรบุรี':'ภาคตะวันตก','ประจวบคีรีขันธ์':'ภาคตะวันตก',
-    'เชียงใหม่':'ภาคเหนือ','เชียงราย':'ภาคเหนือ','ลำปาง':'ภาคเหนือ','ลำพูน':'ภาคเหนือ','พะเยา':'ภาคเหนือ','แพร่':'ภาคเหนือ',
-    'น่าน':'ภาคเหนือ','แม่ฮ่องสอน':'ภาคเหนือ','อุตรดิตถ์':'ภาคเหนือ','สุโขทัย':'ภาคเหนือ','พิษณุโลก':'ภาคเหนือ',
-    'พิจิตร':'ภาคเหนือ','กำแพงเพชร':'ภาคเหนือ','เพชรบูรณ์':'ภาคเหนือ','นครสวรรค์':'ภาคเหนือ','อุทัยธานี':'ภาคเหนือ',
-    'เลย':'ภาคอีสาน','หนองคาย':'ภาคอีสาน','บึงกาฬ':'ภาคอีสาน','หนองบัวลำภู':'ภาคอีสาน','อุดรธานี':'ภาคอีสาน',
-    'สกลนคร':'ภาคอีสาน','นครพนม':'ภาคอีสาน','กาฬสินธุ์':'ภาคอีสาน','มุกดาหาร':'ภาคอีสาน','ขอนแก่น':'ภาคอีสาน',
-    'ชัยภูมิ':'ภาคอีสาน','นครราชสีมา':'ภาคอีสาน','บุรีรัมย์':'ภาคอีสาน','สุรินทร์':'ภาคอีสาน','ศรีสะเกษ':'ภาคอีสาน',
-    'อุบลราชธานี':'ภาคอีสาน','ยโสธร':'ภาคอีสาน','อำนาจเจริญ':'ภาคอีสาน','มหาสารคาม':'ภาคอีสาน','ร้อยเอ็ด':'ภาคอีสาน',
-    'ชุมพร':'ภาคใต้','ระนอง':'ภาคใต้','สุราษฎร์ธานี':'ภาคใต้','พังงา':'ภาคใต้','ภูเก็ต':'ภาคใต้','กระบี่':'ภาคใต้',
-    'ตรัง':'ภาคใต้','พัทลุง':'ภาคใต้','นครศรีธรรมราช':'ภาคใต้','สงขลา':'ภาคใต้','สตูล':'ภาคใต้','ปัตตานี':'ภาคใต้',
-    'ยะลา':'ภาคใต้','นราธิวาส':'ภาคใต้',
-}
-
 # ---------------- Supabase ----------------
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY', '')
 
 @st.cache_resource(show_spinner=False)
 def get_client() -> Client:
+    """Supabase ตาม env, หรือ SQLite ในเครื่องเมื่อ DATA_BACKEND=local (ดู local_backend.py)"""
+    local = local_backend.from_env()
+    if local is not None:
+        return local
     if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
         st.error('❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY.'); st.stop()
     return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
@@ -95,7 +94,9 @@ def sb_exec(q, msg_ok=None, msg_fail='เกิดข้อผิดพลาด
     Execute Supabase query and show detailed error in Streamlit if failed.
     """
     try:
-        res = q.execute()
+        with PERF.timer('sb_exec', 'supabase') as t:
+            res = q.execute()
+            t.nbytes = perf.nbytes(res)
         if msg_ok: st.success(msg_ok)
         return res
     except APIError as e:
@@ -113,72 +114,286 @@ def sb_exec(q, msg_ok=None, msg_fail='เกิดข้อผิดพลาด
         raise
 
 @st.cache_data(ttl=60, show_spinner=False)
-def load_df(table: str) -> pd.DataFrame:
+def _load_table(table: str) -> pd.DataFrame:
     try:
         return pd.DataFrame(sb.table(table).select('*').execute().data)
     except Exception:
         return pd.DataFrame()
 
-def safe_cols(df: pd.DataFrame, cols: List[str]) -> List[str]:
-    return [c for c in cols if c in df.columns]
+def load_df(table: str) -> pd.DataFrame:
+    with PERF.timer(f'load_df:{table}', 'data') as t:
+        df = _load_df(table)
+        t.nbytes = perf.nbytes(df)
+    return df
+
+def _load_df(table: str) -> pd.DataFrame:
+    if not CAPS.has_table(table):
+        return pd.DataFrame()
+    if table in MASTER_TABLES:
+        return master_data().frame(table).copy()
+    if INCREMENTAL_CACHE and table in CACHED_TABLES:
+        try:
+            return data_tables()[table].snapshot().copy()
+        except Exception:
+            return pd.DataFrame()
+    return _load_table(table)
+
+# ---------------- Transactions (projected + paged) ----------------
+PAGE_SIZE = int(get_env('SUPABASE_MAX_ROWS', '1000') or 1000)  # ต้องไม่เกิน max-rows ของ PostgREST
+IN_CHUNK = 150  # จำนวน id ต่อ in_() หนึ่งครั้ง (กัน URL ยาวเกิน)
+
+def query_tx(start: date | None = None, end: date | None = None,
+             hospital_ids: tuple | None = None, cols: tuple = TX_COLS) -> pd.DataFrame:
+    """
+    ดึง transactions เฉพาะคอลัมน์ที่ต้องใช้ โดยส่ง filter ไปทำที่ฝั่ง Supabase
+    - start/end → gte/lte บนคอลัมน์ date
+    - hospital_ids → in_ (None = ทุกโรงพยาบาล, () = ไม่มีแถว)
+    """
+    if hospital_ids is not None and not hospital_ids:
+        return pd.DataFrame(columns=list(cols))
+
+    def make_query(ids=None):
+        q = sb.table('transactions').select(','.join(cols))
+        if start: q = q.gte('date', start.isoformat())
+        if end: q = q.lte('date', end.isoformat())
+        if ids is not None: q = q.in_('hospital_id', list(ids))
+        return q.order('date').order('id')
+
+    if hospital_ids is None:
+        rows = fetch_all(make_query, PAGE_SIZE)
+    else:
+        ids = list(hospital_ids); rows = []
+        for i in range(0, len(ids), IN_CHUNK):
+            chunk = ids[i:i+IN_CHUNK]
+            rows.extend(fetch_all(lambda: make_query(chunk), PAGE_SIZE))
+    return pd.DataFrame(rows, columns=list(cols))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_tx_query(start: date | None, end: date | None,
+                   hospital_ids: tuple | None, cols: tuple) -> pd.DataFrame:
+    df = query_tx(start, end, hospital_ids, cols)   # error ไม่ถูก cache → รอบหน้าลองใหม่
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date']).dt.date
+    return df
+
+def load_tx(start: date | None = None, end: date | None = None,
+            hospital_ids: tuple | None = None, cols: tuple = TX_COLS) -> pd.DataFrame:
+    """
+    transactions ตามช่วงวัน/โรงพยาบาล (ใช้แทน load_df('transactions')), date เป็น datetime.date
+    - INCREMENTAL_CACHE: ตัดจาก cache ใน memory (refresh แบบ delta)
+    - ไม่งั้น: query แบบ projected + paged ไปที่ Supabase (cache 60 วินาที)
+    - โหลดไม่สำเร็จ → แสดง error แล้วหยุด (ไม่แสดงเป็น "ไม่มีข้อมูล" ทั้ง dashboard/ไฟล์ส่งออก)
+    """
+    with PERF.timer('load_tx', 'data') as t:
+        try:
+            if INCREMENTAL_CACHE:
+                df = slice_tx(data_tables()['transactions'].snapshot(), start, end, hospital_ids, cols)
+            else:
+                df = _load_tx_query(start, end, hospital_ids, cols)
+        except Exception as e:
+            st.error('❌ โหลดข้อมูล transactions ไม่สำเร็จ')
+            st.exception(e)
+            st.stop()
+        t.nbytes = perf.nbytes(df)
+    return df
+
+def find_tx(hospital_id: str, day: date) -> dict | None:
+    """แถวเดียวตาม (hospital_id, date): index ใน cache ถ้าโหลดแล้ว ไม่งั้นยิง query แถวเดียว"""
+    if INCREMENTAL_CACHE:
+        tbl = data_tables()['transactions']
+        if tbl.loaded:
+            try:
+                return tbl.lookup(hospital_id, day)
+            except Exception:
+                pass
+    try:
+        rows = (sb.table('transactions').select(','.join(('id',)+TX_COLS))
+                .eq('hospital_id', hospital_id).eq('date', day.isoformat()).limit(1).execute().data)
+    except Exception:
+        st.error('❌ โหลดข้อมูลของวันที่นี้ไม่สำเร็จ')
+        return None
+    if not rows:
+        return None
+    row = rows[0]; row['date'] = pd.to_datetime(row['date']).date()
+    return row
+
+def save_transaction(hospital_id: str, day: date, tx: int, ra: int, hospitals_df: pd.DataFrame) -> List[dict]:
+    """
+    บันทึก 1 แถวต่อ (hospital_id, date) ในรอบเดียว คืนแถวที่บันทึก
+    - RPC save_transaction (sql/save_transaction.sql): ตรวจ capacity + upsert ใน Postgres
+    - ยังไม่ติดตั้งฟังก์ชัน → ตรวจ capacity จากข้อมูลโรงพยาบาลในแอป แล้ว upsert(on_conflict)
+    - Rider Active เกิน capacity → ValueError
+    """
+    status = _rpc_status()
+    if 'save_transaction' not in status['missing']:
+        try:
+            data = sb.rpc('save_transaction', {'p_hospital_id': hospital_id, 'p_date': day.isoformat(),
+                                               'p_transactions_count': tx, 'p_riders_active': ra}).execute().data
+            return data if isinstance(data, list) else [data]
+        except APIError as e:
+            if e.code not in RPC_MISSING_CODES:
+                if 'riders_over_capacity' in (e.message or ''):
+                    raise ValueError('Rider Active มากกว่า Capacity') from e
+                if 'hospital_not_found' in (e.message or ''):
+                    raise ValueError('ไม่พบโรงพยาบาล') from e
+                raise
+            status['missing'].add('save_transaction')
+    rc = 0
+    if 'id' in hospitals_df.columns and 'riders_count' in hospitals_df.columns:
+        rc_series = hospitals_df.loc[hospitals_df['id'].astype(str)==str(hospital_id), 'riders_count']
+        rc = int(pd.to_numeric(rc_series, errors='coerce').fillna(0).iloc[0]) if not rc_series.empty else 0
+    if ra > rc:
+        raise ValueError('Rider Active มากกว่า Capacity')
+    row = pd.DataFrame([{'hospital_id': hospital_id, 'date': day.isoformat(),
+                         'transactions_count': tx, 'riders_active': ra}])
+    return tx_import.write_chunk(sb, row)
+
+def delete_hospitals(ids: List[str]) -> tuple:
+    """
+    ลบโรงพยาบาลพร้อม transactions ทั้งหมดของโรงพยาบาลนั้น คืน (จำนวนโรงพยาบาล, จำนวน transaction)
+    - RPC delete_hospitals (sql/delete_hospitals.sql): ลบทั้งหมดในรอบเดียว/transaction เดียว
+    - ยังไม่ติดตั้งฟังก์ชัน → delete ด้วย in_() ทีละ IN_CHUNK id
+    """
+    ids = [str(i) for i in ids]
+    if not ids:
+        return 0, 0
+    status = _rpc_status()
+    counts = None
+    if 'delete_hospitals' not in status['missing']:
+        try:
+            data = sb.rpc('delete_hospitals', {'p_ids': ids}).execute().data or {}
+            if isinstance(data, list): data = data[0] if data else {}
+            counts = (int(data.get('hospitals', 0)), int(data.get('transactions', 0)))
+        except APIError as e:
+            if e.code not in RPC_MISSING_CODES:
+                raise
+            status['missing'].add('delete_hospitals')
+    if counts is None:
+        n_h = n_tx = 0
+        for i in range(0, len(ids), IN_CHUNK):
+            part = ids[i:i+IN_CHUNK]
+            n_tx += sb_exec(sb.table('transactions').delete(count=CountMethod.exact, returning=ReturnMethod.minimal).in_('hospital_id', part)).count or 0
+            n_h += sb_exec(sb.table('hospitals').delete(count=CountMethod.exact, returning=ReturnMethod.minimal).in_('id', part)).count or 0
+        counts = (n_h, n_tx)
+    cache_delete('transactions', 'hospital_id', ids)
+    cache_delete('hospitals', 'id', ids)
+    return counts
+
+# ---------------- Incremental cache (transactions / hospitals) ----------------
+INCREMENTAL_CACHE = get_env('INCREMENTAL_CACHE', '1') not in ('0', 'false', 'off')
+CACHED_TABLES = ('transactions', 'hospitals')
+
+@st.cache_resource(show_spinner=False)
+def data_tables() -> Dict[str, TableCache]:
+    """cache ระดับ process ใช้ร่วมทุก session (ดู data_cache.py)"""
+    return {
+        'transactions': TableCache(sb, 'transactions', columns=('id',)+TX_COLS, date_cols=('date',),
+                                   int_cols=('transactions_count','riders_active'), page_size=PAGE_SIZE,
+                                   index_cols=('hospital_id','date')),
+        'hospitals': TableCache(sb, 'hospitals', page_size=PAGE_SIZE),
+    }
+
+def cache_upsert(table: str, rows: List[dict]):
+    """หลังเขียนสำเร็จ: patch cache แทนการล้างทั้งหมด"""
+    if INCREMENTAL_CACHE and table in CACHED_TABLES:
+        data_tables()[table].upsert_rows(rows)
+    else:
+        clear_data_cache()
+
+def cache_delete(table: str, col: str, values: List) -> int:
+    if INCREMENTAL_CACHE and table in CACHED_TABLES:
+        return data_tables()[table].delete_where(col, values)
+    clear_data_cache()
+    return 0
+
+def clear_data_cache():
+    """ล้างเฉพาะ cache แบบ TTL (ตารางเล็ก/โหมดไม่ใช้ incremental cache)"""
+    _load_table.clear(); _load_tx_query.clear()
+
+# ---------------- Monthly rollup (หน้ารายงาน) ----------------
+@st.cache_resource(show_spinner=False)
+def memory_rollup() -> monthly_rollup.MonthlyRollup:
+    """ยอดรวมรายเดือนใน memory ที่ติดตาม cache ของ transactions ทีละ delta (ดู monthly_rollup.py)"""
+    roll = monthly_rollup.MonthlyRollup()
+    data_tables()['transactions'].subscribe(roll.on_change)
+    return roll
+
+def rollup_source(first: date, last: date):
+    """
+    แหล่งยอดรวมรายเดือนสำหรับเดือน first..last
+    - ติดตั้ง sql/monthly_rollup.sql แล้ว → อ่านตาราง rollup (trigger ดูแล)
+    - INCREMENTAL_CACHE → MonthlyRollup ใน memory (refresh cache ก่อน เพื่อรับ delta จาก process อื่น)
+    - ไม่งั้น → สร้างจาก transactions เฉพาะช่วงเดือนที่ต้องใช้
+    """
+    if CAPS.has_table(monthly_rollup.SqlRollup.TABLE):
+        return monthly_rollup.SqlRollup(sb, PAGE_SIZE)
+    if INCREMENTAL_CACHE:
+        roll = memory_rollup()
+        data_tables()['transactions'].refresh()
+        return roll
+    roll = monthly_rollup.MonthlyRollup()
+    roll.reset(load_tx(first, monthly_rollup.month_end(last)))
+    return roll
+
+# ตัวกรองฝั่งโรงพยาบาลของหน้า dashboard: session key -> คอลัมน์ใน hospitals
+HOSPITAL_FILTERS = (('site_filter','site_control'), ('hosp_sel','name'),
+                    ('region_filter','region'), ('type_filter','hospital_type'))
+
+def active_filters() -> Dict[str, list]:
+    """ตัวกรองที่มีค่าเลือกอยู่ (ลิสต์ว่าง = ไม่กรอง)"""
+    return {col: list(st.session_state[key]) for key, col in HOSPITAL_FILTERS if st.session_state.get(key)}
+
+def filtered_hospital_ids(hospitals_df: pd.DataFrame) -> tuple | None:
+    """
+    แปลงตัวกรองฝั่งโรงพยาบาล (ชื่อ/ทีม/ภูมิภาค/ประเภท) เป็นรายการ hospital_id สำหรับ in_()
+    - None = ผ่านทุกแห่ง (ไม่ต้องส่ง in_)
+    """
+    return hospital_ids_for(hospitals_df, active_filters())
 
 def rerun():
     try: st.rerun()
     except Exception: pass
 
-def ensure_default_admin():
-    try:
-        rows = sb.table('admins').select('username').eq('username','telemed').execute().data
-        if not rows:
-            from bcrypt import gensalt, hashpw
-            sb.table('admins').insert({
-                'id':str(uuid.uuid4()),
-                'username':'telemed',
-                'password_hash':hashpw('Telemed@DHI'.encode(), gensalt()).decode(),
-                'role':'admin'
-            }).execute()
-    except Exception:
-        pass
-ensure_default_admin()
+@st.cache_resource(show_spinner=False)
+def app_capabilities() -> bootstrap.Capabilities:
+    """seed ผู้ดูแลเริ่มต้น + ตรวจตาราง/คอลัมน์ที่ไม่บังคับ ครั้งเดียวต่อ process (ดู bootstrap.py)"""
+    return bootstrap.run(sb)
+CAPS = app_capabilities()
+
+@st.cache_resource(show_spinner=False)
+def _master_data(tables: tuple) -> MasterData:
+    return MasterData(sb, tables)
+
+def master_data() -> MasterData:
+    """ตารางอ้างอิงเล็ก ๆ ใน memory ต่อ process (ดู master_data.py) เฉพาะตารางที่มีอยู่จริง"""
+    return _master_data(tuple(t for t in MASTER_TABLES if CAPS.has_table(t)))
 
 def get_master_names(table: str, fallback: List[str]) -> List[str]:
-    try:
-        df = pd.DataFrame(sb.table(table).select('name').order('name', desc=False).execute().data)
-        lst = df['name'].dropna().tolist() if not df.empty and 'name' in df.columns else []
-        return lst if lst else fallback
-    except Exception:
-        return fallback
+    return master_data().names(table, fallback)
 
 def upsert_master(table: str, name: str):
+    if not CAPS.has_table(table):
+        st.warning(f'⚠️ ยังไม่มีตาราง {table}'); return
+    if name in master_data().names(table, []): return
     try:
-        ex = sb.table(table).select('id').eq('name', name).limit(1).execute().data
-        if ex: return
         sb.table(table).insert({'id':str(uuid.uuid4()), 'name': name}).execute()
     except Exception:
         st.warning(f'⚠️ ยังไม่มีตาราง {table} หรือเพิ่มไม่สำเร็จ')
+    master_data().invalidate(table)
 
 def rename_master(table: str, old: str, new: str):
     try:
         sb.table(table).update({'name': new}).eq('name', old).execute()
     except Exception:
         st.warning(f'⚠️ เปลี่ยนชื่อใน {table} ไม่สำเร็จ')
+    master_data().invalidate(table)
 
 def delete_master(table: str, name: str):
     try:
         sb.table(table).delete().eq('name', name).execute()
     except Exception:
         st.warning(f'⚠️ ลบใน {table} ไม่สำเร็จ')
-
-def df_to_excel_bytes(sheets: Dict[str, pd.DataFrame]) -> bytes:
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        for sheet_name, df in sheets.items():
-            df2 = df.copy()
-            for c in df2.columns:
-                if pd.api.types.is_datetime64_any_dtype(df2[c]):
-                    df2[c] = df2[c].dt.strftime("%Y-%m-%d")
-            df2.to_excel(writer, sheet_name=sheet_name[:31], index=False)
-    return output.getvalue()
+    master_data().invalidate(table)
 
 def plot(fig, key: str, config: dict | None = None):
     base = {'displaylogo': False, 'scrollZoom': True}
@@ -186,46 +401,37 @@ def plot(fig, key: str, config: dict | None = None):
     st.plotly_chart(fig, use_container_width=True, config=base, key=key)
 
 # -------- PNG Builder (Server-side) --------
-def build_dashboard_png(figs: dict, title: str, subtitle: str, dark: bool=False) -> bytes:
-    images = []
-    order = ['pie_sitecontrol','line_daily_trend','pie_hospital_type','bar_hospital_type','bar_hospital_overview']
-    for k in order:
-        fig = figs.get(k)
-        if fig is not None:
-            try:
-                img_bytes = pio.to_image(fig, format="png", scale=2)  # need kaleido
-                images.append(Image.open(io.BytesIO(img_bytes)))
-            except Exception:
-                pass
-
-    bg = (17,24,39) if dark else (248,250,252)
-    title_color = (229,231,235) if dark else (17,24,39)
-    sub_color   = (203,213,225) if dark else (55,65,81)
+PNG_WORKERS = int(get_env('PNG_RENDER_WORKERS', '4') or 4)
 
-    if not images:
-        im = Image.new("RGB", (1280, 320), bg)
-        d = ImageDraw.Draw(im); f = ImageFont.load_default()
-        d.text((40,40), title, fill=title_color, font=f)
-        d.text((40,80), subtitle, fill=sub_color, font=f)
-        buf = io.BytesIO(); im.save(buf, "PNG"); return buf.getvalue()
+@st.cache_resource(show_spinner=False)
+def png_renderer() -> PngRenderer:
+    """kaleido ค้างไว้ต่อ process + cache PNG ของแต่ละกราฟ (ดู png_render.py)"""
+    return PngRenderer(workers=PNG_WORKERS, scale=2)
 
-    pad, header = 40, 140
-    width = max(i.width for i in images)
-    height = header + sum(i.height for i in images) + pad*(len(images)+1)
-    canvas = Image.new("RGB", (width+pad*2, height), bg)
+# -------- Figure cache (ดู fig_cache.py) --------
+@st.cache_resource(show_spinner=False)
+def figure_cache() -> FigureCache:
+    return FigureCache(size=int(get_env('FIGURE_CACHE_SIZE', '96') or 96))
 
-    d = ImageDraw.Draw(canvas); f = ImageFont.load_default()
-    d.text((pad, 16), title, fill=title_color, font=f)
-    d.text((pad, 52), subtitle, fill=sub_color, font=f)
+def _figure_result(name: str, hit: bool, seconds: float) -> None:
+    PERF.add(f'figure:{name}', seconds, kind='figure_hit' if hit else 'figure_miss')
 
-    y = header - 20
-    for im in images:
-        canvas.paste(im, (pad, y))
-        y += im.height + pad
+def cached_figure(name: str, build, *parts) -> go.Figure:
+    """Figure จาก cache ตาม (ธีม px + parts) สร้างด้วย build() เมื่อยังไม่มี — ห้ามแก้ไขผลลัพธ์ in-place"""
+    return figure_cache().get(name, build, px.defaults.template, *parts, on_result=_figure_result)
 
-    buf = io.BytesIO()
-    canvas.save(buf, "PNG")
-    return buf.getvalue()
+def build_dashboard_png(figs: dict, title: str, subtitle: str, dark: bool=False) -> bytes:
+    renderer = png_renderer()
+    figs_in = [figs[k] for k in PNG_ORDER if figs.get(k) is not None]
+    with PERF.timer('png:render', 'export') as t:
+        rendered = renderer.render(figs_in)  # need kaleido
+        parts = [(k, png) for k, png in rendered if png]
+        t.nbytes = sum(len(png) for _, png in parts)
+    key = (tuple(k for k, _ in parts), title, subtitle, dark)
+    with PERF.timer('png:composite', 'export') as t:
+        out = renderer.composite(key, lambda: compose_dashboard_png([png for _, png in parts], title, subtitle, dark))
+        t.nbytes = len(out)
+    return out
 
 # ---------------- Theme/UI ----------------
 if 'ui' not in st.session_state: st.session_state['ui']={'dark': False}
@@ -351,7 +557,10 @@ with st.sidebar:
     if _role == "admin":
         st.success("Admin mode")
     else:
-        st.info("Viewer mode")# ---------------- Router ----------------
+        st.info("Viewer mode")
+    if local_backend.backend_name() == 'snapshot':
+        st.warning(f"โหมด snapshot: {snapshot.resolve(get_env('SNAPSHOT_PATH') or 'latest')} — ไม่ต่อ Supabase, การแก้ไขไม่ถูกบันทึกถาวร")
+# ---------------- Router ----------------
 page = st.query_params.get('page','dashboard')
 with st.sidebar:
     choices = ['dashboard','admin']
@@ -364,11 +573,6 @@ with st.sidebar:
 with st.sidebar:
     sidebar_dl_container = st.container()
 
-# ---------------- Thai date ----------------
-TH_MONTHS = ["ม.ค.","ก.พ.","มี.ค.","เม.ย.","พ.ค.","มิ.ย.","ก.ค.","ส.ค.","ก.ย.","ต.ค.","พ.ย.","ธ.ค."]
-def th_date(d: date) -> str:
-    return f"{d.day} {TH_MONTHS[d.month-1]} {d.year+543}"
-
 # ---------- Dropdown-style multiselect ----------
 def multiselect_dropdown(label: str, options: list, state_key: str, default_all: bool = True):
     options = options or []
@@ -397,126 +601,204 @@ def multiselect_dropdown(label: str, options: list, state_key: str, default_all:
     return st.session_state[state_key]
 
 # ---------- Daily trend ----------
-def render_daily_trend_with_backfill(df_selected: pd.DataFrame,
-                                     df_all_no_date: pd.DataFrame,
+def render_daily_trend_with_backfill(daily: pd.DataFrame,
                                      start_date: date, end_date: date,
                                      dark: bool) -> None:
-    daily_sel = (df_selected.groupby('date')
-                 .agg(transactions_count=('transactions_count','sum'),
-                      riders_active=('riders_active','sum'))
-                 .reset_index()
-                 .sort_values('date'))
+    """daily: ยอดรายวัน (date, transactions_count, riders_active) ครอบคลุมช่วงย้อนหลังด้วย"""
+    daily = daily.sort_values('date')
+    daily_sel = daily[(daily['date'] >= start_date) & (daily['date'] <= end_date)]
 
     back_days = 0
     if (end_date - start_date).days <= 2:
         opt = st.selectbox(
             'เติมข้อมูลย้อนหลังสำหรับกราฟ',
-            ['ไม่เติม','ย้อนหลัง 7 วัน','ย้อนหลัง 14 วัน','ย้อนหลัง 30 วัน'],
-            index=1
+            list(BACKFILL_OPTIONS.keys()),
+            index=1, key='trend_backfill'
         )
-        back_days = {'ไม่เติม':0,'ย้อนหลัง 7 วัน':7,'ย้อนหลัง 14 วัน':14,'ย้อนหลัง 30 วัน':30}[opt]
+        back_days = BACKFILL_OPTIONS[opt]
 
     daily_back = pd.DataFrame(columns=['date','transactions_count','riders_active'])
-    if back_days > 0 and not df_all_no_date.empty:
+    if back_days > 0 and not daily.empty:
         start_ext = start_date - timedelta(days=back_days)
-        mask = (df_all_no_date['date'] >= start_ext) & (df_all_no_date['date'] < start_date)
-        daily_back = (df_all_no_date.loc[mask]
-                      .groupby('date')
-                      .agg(transactions_count=('transactions_count','sum'),
-                           riders_active=('riders_active','sum'))
-                      .reset_index()
-                      .sort_values('date'))
+        daily_back = daily[(daily['date'] >= start_ext) & (daily['date'] < start_date)]
 
     if daily_sel.empty and daily_back.empty:
-        fig = go.Figure()
-        fig.add_annotation(text="ไม่มีข้อมูล", x=0.5, y=0.5, showarrow=False)
-        fig.update_xaxes(visible=False); fig.update_yaxes(visible=False)
-        fig.update_layout(height=360, margin=dict(l=0,r=0,t=10,b=10))
         st.markdown('#### แนวโน้มรายวัน')
-        st.plotly_chart(fig, use_container_width=True, config={'displaylogo': False})
+        st.plotly_chart(empty_figure(), use_container_width=True, config={'displaylogo': False})
         return
 
-    def thai_label(d):
-        THW = ['วันจันทร์','วันอังคาร','วันพุธ','วันพฤหัสบดี','วันศุกร์','วันเสาร์','วันอาทิตย์']
-        dt = pd.to_datetime(d)
-        return f"{THW[dt.dayofweek]} {dt.day}/{dt.month}/{str(dt.year)[-2:]}"
-
-    fig = go.Figure()
-
-    if not daily_back.empty:
-        fig.add_trace(go.Scatter(
-            x=daily_back['date'].apply(thai_label),
-            y=daily_back['transactions_count'],
-            mode='lines+markers+text',
-            name='ย้อนหลัง (Transactions)',
-            text=daily_back['transactions_count'],
-            textposition='top center',
-            textfont=dict(size=10),
-            line=dict(width=2, dash='dot'),
-            line_shape='spline',
-            opacity=0.85
-        ))
-        fig.add_trace(go.Scatter(
-            x=daily_back['date'].apply(thai_label),
-            y=daily_back['riders_active'],
-            mode='lines+markers+text',
-            name='ย้อนหลัง (Rider Active)',
-            text=daily_back['riders_active'],
-            textposition='top center',
-            textfont=dict(size=10),
-            line=dict(width=1.5, dash='dot'),
-            line_shape='spline',
-            opacity=0.7,
-            visible='legendonly'
-        ))
-
-    if not daily_sel.empty:
-        fig.add_trace(go.Scatter(
-            x=daily_sel['date'].apply(thai_label),
-            y=daily_sel['transactions_count'],
-            mode='lines+markers+text',
-            name='Transactions',
-            text=daily_sel['transactions_count'],
-            textposition='top center',
-            line=dict(width=3),
-            line_shape='spline'
-        ))
-        fig.add_trace(go.Scatter(
-            x=daily_sel['date'].apply(thai_label),
-            y=daily_sel['riders_active'],
-            mode='lines+markers+text',
-            name='Rider Active',
-            text=daily_sel['riders_active'],
-            textposition='top center',
-            line=dict(width=2, dash='dot'),
-            line_shape='spline',
-            visible='legendonly'
-        ))
-
-    fig.update_layout(
-        xaxis_title='วัน/เดือน/ปี', yaxis_title='จำนวน',
-        xaxis_tickangle=-40,
-        margin=dict(t=30, r=20, b=80, l=60)
-    )
+    fig = cached_figure('daily_trend', lambda: daily_trend_figure(daily_sel, daily_back), daily_sel, daily_back)
     st.markdown('#### แนวโน้มรายวัน')
     st.plotly_chart(fig, use_container_width=True, config={'displaylogo': False})
     st.session_state.setdefault('figs', {})['line_daily_trend'] = fig
 
+# ---------- Dashboard rows ----------
+def load_filtered_rows(hospitals_df: pd.DataFrame, load_from: date, end_date: date,
+                       hospital_ids: tuple | None, filters: dict | None = None) -> pd.DataFrame:
+    """โหลด transactions ช่วง load_from..end_date แล้ว merge กับโรงพยาบาลและกรองตามตัวกรองทั้งหมด"""
+    tx_all = load_tx(load_from, end_date, hospital_ids)
+    return merge_hospitals(tx_all, hospitals_df, active_filters() if filters is None else filters)
+
+@st.cache_resource(show_spinner=False)
+def _cube_cache() -> CubeCache:
+    return CubeCache()
+
+def dashboard_cube() -> FilterCube | None:
+    """filter cube ของข้อมูลใน incremental cache (สร้างใหม่เมื่อ version เปลี่ยนเท่านั้น)"""
+    if not INCREMENTAL_CACHE:
+        return None
+    t = data_tables()
+    return _cube_cache().get(t['transactions'], t['hospitals'])
+
+# ---------- Dashboard aggregates (RPC / pandas) ----------
+# auto = ลอง RPC ก่อน ถ้ายังไม่ได้ติดตั้งฟังก์ชัน (sql/dashboard_aggregates.sql)
+#        ค่อยใช้ filter cube (หรือ pandas เมื่อปิด INCREMENTAL_CACHE)
+# rpc  = บังคับ RPC (แจ้งเตือนถ้าล้มแล้ว fallback) | pandas = คำนวณฝั่งแอปเสมอ
+AGG_MODE = (get_env('DASHBOARD_AGG_MODE', 'auto') or 'auto').lower()
+RPC_MISSING_CODES = {'PGRST202', '42883'}  # ไม่พบฟังก์ชันใน schema cache / undefined_function
+
+@st.cache_resource(show_spinner=False)
+def _rpc_status() -> dict:
+    """จำว่า RPC ไหนไม่มีใน DB (ต่อ process) จะได้ไม่ยิงซ้ำทุก rerun"""
+    return {'missing': set()}
+
+def rpc_dashboard_aggregates(start_date: date, end_date: date, load_from: date,
+                             hospital_ids: tuple | None) -> dict | None:
+    """
+    เรียก public.dashboard_aggregates() ให้ Postgres ทำ KPI + groupby ในรอบเดียว
+    - คืน None เมื่อใช้ RPC ไม่ได้ (ผู้เรียก fallback ไป aggregate_dashboard)
+    """
+    status = _rpc_status()
+    if AGG_MODE == 'pandas' or (AGG_MODE == 'auto' and 'dashboard_aggregates' in status['missing']):
+        return None
+    try:
+        with PERF.timer('rpc:dashboard_aggregates', 'supabase') as t:
+            data = sb.rpc('dashboard_aggregates', {
+                'p_start': start_date.isoformat(), 'p_end': end_date.isoformat(),
+                'p_from': load_from.isoformat(),
+                'p_hospital_ids': list(hospital_ids) if hospital_ids is not None else None,
+            }).execute().data
+            t.nbytes = perf.nbytes(data)
+        if isinstance(data, list): data = data[0] if data else {}
+        out = {'kpi': {k: int(round(float(v or 0))) for k, v in (data.get('kpi') or {}).items()}}
+        for key, cols in AGG_FRAMES.items():
+            out[key] = pd.DataFrame(data.get(key) or [], columns=cols)
+        out['daily']['date'] = pd.to_datetime(out['daily']['date']).dt.date
+        return out
+    except Exception as e:
+        if isinstance(e, APIError) and e.code in RPC_MISSING_CODES:
+            status['missing'].add('dashboard_aggregates')
+        if AGG_MODE == 'rpc':
+            st.warning('⚠️ เรียก RPC dashboard_aggregates ไม่สำเร็จ — ใช้การคำนวณในแอปแทน')
+        return None
+
+# ---------- Lazy exports ----------
+# widget ที่มีผลกับหน้าตากราฟ (ใช้ประกอบ key ของไฟล์ PNG)
+EXPORT_STATE_KEYS = ('trend_backfill','sort_metric_type','sort_dir_type',
+                     'sort_by_hosp','sort_dir_hosp_tx','sort_dir_hosp_name','hosp_bar_size','hosp_bar_page')
+EXPORT_MEMO_SIZE = 32
+
+def data_version() -> tuple:
+    """ตัวระบุเวอร์ชันข้อมูลปัจจุบัน (ไม่มี incremental cache → เปลี่ยนตามรอบ TTL 60 วินาที)"""
+    if INCREMENTAL_CACHE:
+        t = data_tables()
+        return tables_version(t['transactions'], t['hospitals'])
+    return ('ttl', int(time.time() // 60))
+
+def export_key(filters: dict, start: date, end: date, dark: bool) -> str:
+    return cache_key(filters=filters, start=start, end=end, version=data_version(), dark=dark,
+                     ui={k: st.session_state.get(k) for k in EXPORT_STATE_KEYS})
+
+@st.cache_resource(show_spinner=False)
+def _export_memo() -> dict:
+    """ไฟล์ส่งออกที่สร้างแล้ว (LRU ต่อ process) key = (ชนิด, export_key)"""
+    return {'items': OrderedDict(), 'lock': threading.Lock()}
+
+def export_cached(kind: str, key: str) -> bytes | None:
+    memo = _export_memo()
+    with memo['lock']:
+        if (kind, key) in memo['items']:
+            memo['items'].move_to_end((kind, key))
+            return memo['items'][(kind, key)]
+    return None
+
+def build_export(kind: str, ctx: dict) -> bytes:
+    """สร้างไฟล์ส่งออกตาม ctx ที่ render_dashboard เก็บไว้ แล้วจำผลไว้"""
+    data = export_cached(kind, ctx['key'])
+    if data is not None:
+        return data
+    with PERF.timer(f'export:{kind}', 'export') as t:
+        data = _build_export(kind, ctx)
+        t.nbytes = len(data)
+    memo = _export_memo()
+    with memo['lock']:
+        memo['items'][(kind, ctx['key'])] = data
+        while len(memo['items']) > EXPORT_MEMO_SIZE:
+            memo['items'].popitem(last=False)
+    return data
+
+def report_key(month: date) -> str:
+    """key ของไฟล์รายงานรายเดือน (เปลี่ยนเมื่อเดือนหรือเวอร์ชันข้อมูลเปลี่ยน)"""
+    return cache_key(report=month, version=data_version())
+
+def _build_export(kind: str, ctx: dict) -> bytes:
+    if kind == 'report_excel':
+        data = df_to_excel_bytes(ctx['sheets'])
+    elif kind == 'report_parquet':
+        data = snapshot.to_parquet_bytes(monthly_rollup.hospital_rows(ctx['start'], ctx['by_hosp'], ctx['hospitals']))
+    elif kind == 'png':
+        data = build_dashboard_png(ctx['figs'], "DashBoard Telemedicine", ctx['subtitle'], dark=ctx['dark'])
+    elif not ctx['has_rows']:
+        data = b""
+    else:
+        start, end, agg = ctx['start'], ctx['end'], ctx['agg']
+        rows = load_filtered_rows(load_df('hospitals'), ctx['load_from'], end, ctx['hosp_ids'], ctx['filters'])
+        sheets = export_sheets(rows, agg, start, end)
+        if kind == 'csv':
+            data = sheets['filtered'].to_csv(index=False).encode('utf-8-sig')
+        elif kind == 'parquet':
+            data = snapshot.to_parquet_bytes(sheets['filtered'])
+        else:
+            data = df_to_excel_bytes(sheets)
+    return data
+
+EXPORTS = [
+    ('png', "📸 ดาวน์โหลดภาพ PNG", "telemed_dashboard_{d}.png", "image/png"),
+    ('csv', "CSV (ข้อมูลที่กรองแล้ว)", "telemed_filtered_{d}.csv", "text/csv"),
+    ('excel', "Excel (หลายชีต)", "telemed_export_{d}.xlsx",
+     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ('parquet', "Parquet (ข้อมูลที่กรองแล้ว)", "telemed_filtered_{d}.parquet", "application/vnd.apache.parquet"),
+]
+REPORT_EXPORTS = [
+    ('report_excel', "รายงาน (Excel)", "telemed_monthly_{d}.xlsx",
+     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ('report_parquet', "รายงาน (Parquet)", "telemed_monthly_{d}.parquet", "application/vnd.apache.parquet"),
+]
+
+def export_buttons(exports: list, ctx: dict, d: str) -> None:
+    """ปุ่ม "เตรียม …" → สร้างไฟล์เมื่อกดเท่านั้น จากนั้น (หรือถ้ามีใน memo แล้ว) แสดงปุ่มดาวน์โหลด"""
+    for kind, label, fname, mime in exports:
+        if kind != 'png' and not ctx['has_rows']:
+            continue
+        data = export_cached(kind, ctx['key'])
+        if data is None and st.button(f"เตรียม {label}", key=f"prep_export_{kind}", use_container_width=True):
+            with st.spinner('กำลังสร้างไฟล์...'):
+                data = build_export(kind, ctx)
+        if data:
+            st.download_button(label, data=data, file_name=fname.format(d=d),
+                               mime=mime, use_container_width=True, key=f"dl_export_{kind}")
+
 # ====================== DASHBOARD ======================
 def render_chart_placeholder(title:str, key:str):
-    fig = go.Figure()
-    fig.add_annotation(text="ไม่มีข้อมูล", x=0.5, y=0.5, showarrow=False, font=dict(size=16))
-    fig.update_xaxes(visible=False); fig.update_yaxes(visible=False)
-    fig.update_layout(height=360, margin=dict(l=0,r=0,t=10,b=10))
     st.markdown(title)
-    plot(fig, key=key)
+    plot(empty_figure(font_size=16), key=key)
 
 def render_dashboard():
     apply_ui_patches()
     st.markdown("# DashBoard Telemedicine")
+    lap = PERF.laps('dashboard', 'render')
 
     hospitals_df = load_df('hospitals')
-    tx_all = load_df('transactions')
     figs: Dict[str, go.Figure] = {}
     st.session_state['figs'] = figs
 
@@ -576,86 +858,60 @@ def render_dashboard():
     st.markdown("</div>", unsafe_allow_html=True)
 
     start_date, end_date = st.session_state['date_range']
-
-    # ---- Merge & filter ----
-    if not tx_all.empty:
-        tx_all['date'] = pd.to_datetime(tx_all['date']).dt.date
-        df_all_no_date = tx_all.merge(hospitals_df, left_on='hospital_id', right_on='id', how='left', suffixes=('','_h'))
-    else:
-        df_all_no_date = pd.DataFrame(columns=['date','hospital_id','transactions_count','riders_active',
-                                               'name','site_control','region','riders_count','hospital_type'])
-
-    if st.session_state.get('site_filter') and 'site_control' in df_all_no_date.columns:
-        df_all_no_date = df_all_no_date[df_all_no_date['site_control'].isin(st.session_state['site_filter'])]
-    if st.session_state.get('hosp_sel') and 'name' in df_all_no_date.columns:
-        df_all_no_date = df_all_no_date[df_all_no_date['name'].isin(st.session_state['hosp_sel'])]
-    if st.session_state.get('region_filter') and 'region' in df_all_no_date.columns:
-        df_all_no_date = df_all_no_date[df_all_no_date['region'].isin(st.session_state['region_filter'])]
-    if st.session_state.get('type_filter') and 'hospital_type' in df_all_no_date.columns:
-        df_all_no_date = df_all_no_date[df_all_no_date['hospital_type'].isin(st.session_state['type_filter'])]
-
-    if not df_all_no_date.empty:
-        df = df_all_no_date[(df_all_no_date['date'] >= start_date) & (df_all_no_date['date'] <= end_date)].copy()
-    else:
-        df = df_all_no_date.copy()
+    lap('filters')
+
+    # ---- Load & aggregate (ช่วงที่ใช้: วันที่เลือก + ย้อนหลังสำหรับกราฟ + สะสมต้นเดือน) ----
+    load_from = min(start_date - timedelta(days=BACKFILL_MAX_DAYS), end_date.replace(day=1))
+    hosp_ids = filtered_hospital_ids(hospitals_df)
+    agg = rpc_dashboard_aggregates(start_date, end_date, load_from, hosp_ids)
+    df_all_no_date = None
+    if agg is None:
+        cube = dashboard_cube()
+        if cube is not None:
+            agg = cube.aggregate(start_date, end_date, load_from, active_filters())
+    if agg is None:
+        df_all_no_date = load_filtered_rows(hospitals_df, load_from, end_date, hosp_ids)
+        agg = aggregate_dashboard(df_all_no_date, start_date, end_date)
+    kpi = agg['kpi']
+    lap('aggregate')
 
     # ---- KPI ----
     st.markdown("### 📈 ภาพรวม")
-    month_start = end_date.replace(day=1)
-    df_month_to_end = df_all_no_date[(df_all_no_date['date'] >= month_start) & (df_all_no_date['date'] <= end_date)]
-    month_accum = int(df_month_to_end['transactions_count'].sum()) if not df_month_to_end.empty else 0
-
     k1,k2,k3,k4,k5,k6 = st.columns(6)
-    total_tx = int(df['transactions_count'].sum()) if not df.empty else 0
-    uniq_h   = df['hospital_id'].nunique() if not df.empty else 0
-    riders_cap = int(df['riders_count'].fillna(0).sum()) if not df.empty else 0
-    avg_day  = int(df.groupby('date')['transactions_count'].sum().mean()) if not df.empty else 0
-    riders_active = int(df['riders_active'].sum()) if not df.empty else 0
     for col, title, val in [
-        (k1,'Transaction รวม', f"{total_tx:,}"),
-        (k2,'โรงพยาบาลทั้งหมด', f"{uniq_h}"),
-        (k3,'จำนวนไรเดอร์รวม', f"{riders_cap:,}"),
-        (k4,'เฉลี่ยต่อวัน', f"{avg_day:,}"),
-        (k5,'ไรเดอร์ Active', f"{riders_active:,}"),
-        (k6,'Transaction สะสม (เดือนนี้ถึงวันที่เลือก)', f"{month_accum:,}")
+        (k1,'Transaction รวม', f"{kpi['total_tx']:,}"),
+        (k2,'โรงพยาบาลทั้งหมด', f"{kpi['hospitals']}"),
+        (k3,'จำนวนไรเดอร์รวม', f"{kpi['riders_cap']:,}"),
+        (k4,'เฉลี่ยต่อวัน', f"{kpi['avg_day']:,}"),
+        (k5,'ไรเดอร์ Active', f"{kpi['riders_active']:,}"),
+        (k6,'Transaction สะสม (เดือนนี้ถึงวันที่เลือก)', f"{kpi['month_accum']:,}")
     ]:
         col.markdown(f"<div class='kpi-card'><div class='kpi-title'>{title}</div><div class='kpi-value'>{val}</div></div>", unsafe_allow_html=True)
+    lap('kpi')
 
     # ---- Pie by SiteControl ----
     st.markdown('#### จำนวน Transaction ตามทีมภูมิภาค (กราฟวงกลม)')
-    if not df.empty and df['site_control'].notna().any():
-        gsite = df.groupby('site_control').agg({'transactions_count':'sum'}).reset_index().sort_values('transactions_count', ascending=False)
-        if not gsite.empty:
-            pie = px.pie(gsite, names='site_control', values='transactions_count',
-                         color='site_control', color_discrete_sequence=PALETTE, hole=0.55)
-            pie.update_traces(textposition='outside',
-                              texttemplate='<b>%{label}</b><br>%{value:,} (%{percent:.1%})',
-                              marker=dict(line=dict(color=('#fff' if not DARK else '#111'), width=2)),
-                              pull=[0.02]*len(gsite))
-            pie.update_layout(annotations=[dict(text=f"{int(gsite['transactions_count'].sum()):,}<br>รวม", x=0.5, y=0.5, showarrow=False, font=dict(size=18))])
-            st.plotly_chart(pie, use_container_width=True, config={'displaylogo': False})
-            st.session_state.setdefault('figs', {})['pie_sitecontrol'] = pie
-        else:
-            render_chart_placeholder('#### จำนวน Transaction ตามทีมภูมิภาค (กราฟวงกลม)', key="ph_site_pie")
+    gsite = agg['by_site'].sort_values('transactions_count', ascending=False)
+    if not gsite.empty:
+        pie = cached_figure('site_pie', lambda: donut_figure(gsite, 'site_control', PALETTE, DARK),
+                            gsite, PALETTE, DARK)
+        st.plotly_chart(pie, use_container_width=True, config={'displaylogo': False})
+        st.session_state.setdefault('figs', {})['pie_sitecontrol'] = pie
     else:
         render_chart_placeholder('#### จำนวน Transaction ตามทีมภูมิภาค (กราฟวงกลม)', key="ph_site_pie")
+    lap('site_pie')
 
     # ---- Daily Trend ----
-    render_daily_trend_with_backfill(df_selected=df,
-                                     df_all_no_date=df_all_no_date,
+    render_daily_trend_with_backfill(daily=agg['daily'],
                                      start_date=start_date,
                                      end_date=end_date,
                                      dark=DARK)
+    lap('daily_trend')
 
     # ---- By Hospital Type ----
     st.markdown('### 🏷️ ประเภทโรงพยาบาล (สรุป)')
-    if not df.empty and 'hospital_type' in df.columns and df['hospital_type'].notna().any():
-        gtype_sum = df.groupby('hospital_type', dropna=True).agg(
-            transactions_count=('transactions_count','sum'),
-            riders_active=('riders_active','sum'),
-            riders_total=('riders_count','sum'),
-            hospitals_count=('hospital_id','nunique')
-        ).reset_index()
+    if not agg['by_type'].empty:
+        gtype_sum = agg['by_type'].copy()
         gtype_sum['avg_tx_per_hosp'] = gtype_sum['transactions_count'] / gtype_sum['hospitals_count']
         gtype_sum = gtype_sum.sort_values('transactions_count', ascending=False)
 
@@ -673,133 +929,146 @@ def render_dashboard():
         c1, c2 = st.columns(2)
         with c1:
             st.markdown('#### สัดส่วนตามประเภทโรงพยาบาล (กราฟวงกลม)')
-            pie_t = px.pie(gtype_sum, names='hospital_type', values='transactions_count',
-                           color='hospital_type', color_discrete_sequence=PALETTE, hole=0.55)
-            pie_t.update_traces(textposition='outside',
-                                texttemplate='<b>%{label}</b><br>%{value:,} (%{percent:.1%})',
-                                marker=dict(line=dict(color=('#fff' if not DARK else '#111'), width=2)),
-                                pull=[0.02]*len(gtype_sum))
-            pie_t.update_layout(annotations=[dict(text=f"{int(gtype_sum.transactions_count.sum()):,}<br>รวม", x=0.5, y=0.5, showarrow=False, font=dict(size=16))])
+            pie_t = cached_figure('type_pie', lambda: donut_figure(gtype_sum, 'hospital_type', PALETTE, DARK, total_font=16),
+                                  gtype_sum, PALETTE, DARK)
             st.plotly_chart(pie_t, use_container_width=True, config={'displaylogo': False})
             st.session_state.setdefault('figs', {})['pie_hospital_type'] = pie_t
 
         with c2:
             st.markdown('#### ภาพรวมตามประเภทโรงพยาบาล')
-            bar_t = px.bar(
-                gtype_for_bar, y='hospital_type', x='transactions_count', orientation='h',
-                text='transactions_count',
-                color='hospital_type', color_discrete_sequence=PALETTE
-            )
-            bar_t.update_traces(textposition='outside')
-            bar_t.update_layout(showlegend=False, margin=dict(l=160,r=40,t=30,b=30),
-                                yaxis_title='ประเภท', xaxis_title='Transactions',
-                                height=max(420, 50*len(gtype_for_bar)+180))
+            bar_t = cached_figure('type_bar', lambda: type_bar_figure(gtype_for_bar, PALETTE), gtype_for_bar, PALETTE)
             st.plotly_chart(bar_t, use_container_width=True, config={'displaylogo': False})
             st.session_state.setdefault('figs', {})['bar_hospital_type'] = bar_t
     else:
         render_chart_placeholder('#### สัดส่วน/ภาพรวมตามประเภทโรงพยาบาล', key="ph_type_summary")
+    lap('hospital_type')
 
     # ---- Hospital Overview ----
     st.markdown('#### ภาพรวมต่อโรงพยาบาล')
-    if not df.empty:
-        gh = df.groupby('name').agg({'transactions_count':'sum'}).reset_index()
-        cs1, cs2, _ = st.columns([1.3, 1.2, 3])
+    if not agg['by_hospital'].empty:
+        gh = agg['by_hospital'][['name','transactions_count']]
+        cs1, cs2, cs3, cs4, _ = st.columns([1.3, 1.2, .9, .9, 1.2])
         with cs1:
-            sort_by = st.selectbox('เรียงตาม', ['ยอด Transaction','ชื่อโรงพยาบาล'], index=0)
+            sort_by = st.selectbox('เรียงตาม', ['ยอด Transaction','ชื่อโรงพยาบาล'], index=0, key='sort_by_hosp')
         with cs2:
             if sort_by == 'ยอด Transaction':
-                order = st.selectbox('ทิศทาง', ['มาก→น้อย','น้อย→มาก'], index=0)
+                order = st.selectbox('ทิศทาง', ['มาก→น้อย','น้อย→มาก'], index=0, key='sort_dir_hosp_tx')
                 gh = gh.sort_values('transactions_count', ascending=(order=='น้อย→มาก'))
             else:
-                order = st.selectbox('ทิศทาง', ['ก→ฮ','ฮ→ก'], index=0)
+                order = st.selectbox('ทิศทาง', ['ก→ฮ','ฮ→ก'], index=0, key='sort_dir_hosp_name')
                 gh = gh.sort_values('name', ascending=(order=='ก→ฮ'))
         gh = gh.reset_index(drop=True)
-        bar = px.bar(gh, y='name', x='transactions_count', orientation='h', text='transactions_count',
-                     color='name', color_discrete_sequence=PALETTE)
-        bar.update_traces(textposition='outside')
-        bar.update_layout(
-            showlegend=False,
-            height=max(520, 30*len(gh)+200),
-            margin=dict(l=160,r=40,t=30,b=40),
-            yaxis_title='ชื่อโรงพยาบาล',
-            xaxis_title='Transactions'
-        )
+        # แสดงทีละหน้า (top-N + แท่ง 'อื่น ๆ') → จำนวนแท่งคงที่ไม่ว่าโรงพยาบาลจะมีกี่แห่ง
+        with cs3:
+            per_page = st.selectbox('แสดง', HOSPITAL_BAR_SIZES, index=1, key='hosp_bar_size',
+                                    format_func=lambda n: f'{n} แห่ง')
+        n_pages = max(1, -(-len(gh) // per_page))
+        page = 1
+        if n_pages > 1:
+            if st.session_state.get('hosp_bar_page', 1) > n_pages:  # เปลี่ยนขนาดหน้า/ตัวกรองแล้วหน้าเกิน
+                st.session_state['hosp_bar_page'] = n_pages
+            with cs4:
+                page = int(st.number_input('หน้า', 1, n_pages, key='hosp_bar_page'))
+        gpage = hospital_page(gh, page, per_page)
+        bar = cached_figure('hospital_bar', lambda: hospital_bar_figure(gpage, PALETTE), gpage, PALETTE)
         st.plotly_chart(bar, use_container_width=True, config={'displaylogo': False})
         st.session_state.setdefault('figs', {})['bar_hospital_overview'] = bar
+        with st.expander(f'📋 อันดับทั้งหมด ({len(gh):,} แห่ง)'):
+            st.dataframe(hospital_ranking(gh), use_container_width=True, hide_index=True, height=420,
+                         column_config={'Transactions': st.column_config.NumberColumn(format='%d'),
+                                        'สัดส่วน (%)': st.column_config.NumberColumn(format='%.2f')})
     else:
         render_chart_placeholder('#### ภาพรวมต่อโรงพยาบาล', key="ph_hospital_overview")
+    lap('hospital_bar')
 
     # ---- Table by site ----
     st.markdown('#### ตารางจำนวน Transaction แยกตามทีมภูมิภาค')
-    if not df.empty:
-        site_tbl = df.groupby('site_control').agg(
-            Transactions=('transactions_count','sum'),
-            Rider_Active=('riders_active','sum'),
-            Riders_Total=('riders_count','sum')
-        ).reset_index().rename(columns={'site_control':'ทีมภูมิภาค'})
-        if not site_tbl.empty:
-            show_df = site_tbl.copy()
-            show_df['Transactions']  = show_df['Transactions'].map('{:,}'.format)
-            show_df['Rider_Active']  = show_df['Rider_Active'].map('{:,}'.format)
-            show_df['Riders_Total']  = show_df['Riders_Total'].map('{:,}'.format)
-
-            header_fill = '#111827' if DARK else '#E6EFFF'
-            header_font = '#E5E7EB' if DARK else '#1F2937'
-            header_line = '#374151' if DARK else '#BFD2FF'
-            rgba = [
-                'rgba(167,199,231,0.15)','rgba(248,200,220,0.15)','rgba(182,226,211,0.15)',
-                'rgba(253,226,179,0.15)','rgba(234,215,247,0.15)','rgba(205,229,240,0.15)'
-            ]
-            row_colors = [rgba[i % len(rgba)] for i in range(len(show_df))]
-            fill_matrix = [row_colors]*len(show_df.columns)
-
-            figt = go.Figure(data=[go.Table(
-                header=dict(
-                    values=[f"<b>{c}</b>" for c in show_df.columns],
-                    fill_color=header_fill,
-                    font=dict(color=header_font, size=13),
-                    align='left', height=34,
-                    line_color=header_line, line_width=1.2
-                ),
-                cells=dict(
-                    values=[show_df[c] for c in show_df.columns],
-                    fill_color=fill_matrix,
-                    align='left', height=28
-                )
-            )])
-            figt.update_layout(margin=dict(l=0,r=0,t=0,b=0))
-            st.plotly_chart(figt, use_container_width=True, config={'displaylogo': False})
-        else:
-            st.info('ไม่มีข้อมูลตารางในช่วงที่เลือก')
+    if not agg['by_site'].empty:
+        figt = cached_figure('site_table', lambda: site_table_figure(agg['by_site'], DARK), agg['by_site'], DARK)
+        st.plotly_chart(figt, use_container_width=True, config={'displaylogo': False})
     else:
         st.info('ไม่มีข้อมูลตารางในช่วงที่เลือก')
+    lap('site_table')
 
-    # ===== Prepare downloads =====
+    # ===== Exports (สร้างจริงเมื่อกดปุ่มใน sidebar เท่านั้น) =====
     subtitle = (
         f"ช่วง {th_date(start_date)} – {th_date(end_date)}  |  "
         f"โรงพยาบาล: "
         f"{'ทั้งหมด' if not st.session_state.get('hosp_sel') else ', '.join(st.session_state['hosp_sel'])}  |  "
         f"ทีม: {'ทั้งหมด' if not st.session_state.get('site_filter') else ', '.join(st.session_state['site_filter'])}"
     )
-    png_bytes = build_dashboard_png(st.session_state.get('figs', {}), "DashBoard Telemedicine", subtitle, dark=DARK)
-
-    if not df.empty:
-        df_csv = df.copy()
-        df_csv['date'] = pd.to_datetime(df_csv['date'])
-        gh = df.groupby('name').agg({'transactions_count':'sum'}).reset_index()
-        gsite = df.groupby('site_control').agg({'transactions_count':'sum','riders_active':'sum'}).reset_index()
-        daily = df.groupby('date').agg({'transactions_count':'sum','riders_active':'sum'}).reset_index()
-        excel_bytes = df_to_excel_bytes({"filtered": df_csv, "by_hospital": gh, "by_site": gsite, "daily": daily})
-    else:
-        df_csv = pd.DataFrame()
-        excel_bytes = b""
-
-    st.session_state['downloads'] = {
-        'png_bytes': png_bytes,
-        'csv_bytes': (df_csv.to_csv(index=False).encode('utf-8-sig') if not df_csv.empty else b""),
-        'excel_bytes': excel_bytes
+    filters = active_filters()
+    st.session_state['export_ctx'] = {
+        'key': export_key(filters, start_date, end_date, DARK),
+        'subtitle': subtitle, 'dark': DARK, 'figs': st.session_state.get('figs', {}),
+        'start': start_date, 'end': end_date, 'load_from': load_from,
+        'hosp_ids': hosp_ids, 'filters': filters, 'agg': agg,
+        'has_rows': bool(kpi['hospitals']),
     }
 
+# ---------- Admin: transaction grid (server-side paging) ----------
+GRID_SORT_LABELS = {'วันที่':'date', 'Transactions':'transactions_count', 'Rider Active':'riders_active'}
+
+@st.cache_resource(show_spinner=False)
+def tx_grid() -> TxGrid:
+    """cache หน้า + prefetch ต่อ process (ดู tx_grid.py)"""
+    return TxGrid(sb)
+
+def render_tx_grid(hospitals_df: pd.DataFrame, name2id: Dict[str, str]):
+    g1, g2, g3, g4, g5 = st.columns([2.2, 1.6, 1, .9, .8])
+    with g1:
+        sel_names = st.multiselect('โรงพยาบาล', list(name2id.keys()), key='txg_hosp', placeholder='ทั้งหมด')
+    with g2:
+        use_range = st.checkbox('กรองช่วงวันที่', key='txg_use_range')
+        rng = st.date_input('ช่วงวันที่', value=(date.today()-timedelta(days=30), date.today()),
+                            format="DD/MM/YYYY", key='txg_range', disabled=not use_range,
+                            label_visibility='collapsed')
+    with g3:
+        sort_label = st.selectbox('เรียงตาม', list(GRID_SORT_LABELS.keys()), key='txg_sort')
+    with g4:
+        desc = st.selectbox('ทิศทาง', ['มาก→น้อย','น้อย→มาก'], key='txg_dir') == 'มาก→น้อย'
+    with g5:
+        size = st.selectbox('ต่อหน้า', PAGE_SIZES, index=1, key='txg_size')
+
+    start = end = None
+    if use_range and isinstance(rng, tuple) and len(rng) == 2:
+        start, end = rng
+    q = GridQuery(hospital_ids=tuple(sorted(str(name2id[n]) for n in sel_names)) if sel_names else None,
+                  start=start, end=end, sort=GRID_SORT_LABELS[sort_label], desc=desc, page_size=size)
+    if st.session_state.get('txg_query') != q:  # เปลี่ยนตัวกรอง → กลับหน้าแรก
+        st.session_state['txg_query'] = q
+        st.session_state['txg_page'] = 1
+
+    grid, version = tx_grid(), data_version()
+    page = int(st.session_state.get('txg_page', 1))
+    try:
+        rows, total = grid.page(q, version, page - 1)
+    except Exception as e:
+        st.error('โหลดรายการไม่สำเร็จ'); st.exception(e); return
+    n_pages = grid.pages(q, version)
+
+    if rows.empty:
+        st.info('ไม่มีข้อมูลตามตัวกรอง')
+    else:
+        names = hospitals_df.set_index(hospitals_df['id'].astype(str))['name'] if 'id' in hospitals_df.columns else pd.Series(dtype=object)
+        view = pd.DataFrame({
+            'วันที่': date_labels(rows['date']),
+            'โรงพยาบาล': rows['hospital_id'].astype(str).map(names),
+            'Transactions': rows['transactions_count'],
+            'Rider Active': rows['riders_active'],
+        })
+        st.dataframe(view, use_container_width=True, hide_index=True)
+
+    p1, p2, p3, _ = st.columns([.5, 1.2, .5, 3])
+    with p1:
+        if st.button('◀', key='txg_prev', disabled=page <= 1):
+            st.session_state['txg_page'] = page - 1; rerun()
+    with p2:
+        st.caption(f"หน้า {page:,} / {n_pages:,} · ทั้งหมด {(total or 0):,} รายการ")
+    with p3:
+        if st.button('▶', key='txg_next', disabled=page >= n_pages):
+            st.session_state['txg_page'] = page + 1; rerun()
+
 # ====================== ADMIN ======================
 def render_admin():
     apply_ui_patches()
@@ -864,34 +1133,23 @@ def render_admin():
                                'hospital_type':hospital_type,
                                'service_models':models,
                                'riders_count':int(riders_count)}
+                    payload = CAPS.strip('hospitals', payload)  # ตัดคอลัมน์ที่ตารางยังไม่มี
                     try:
-                        if edit_mode: sb_exec(sb.table('hospitals').update(payload).eq('id', row['id']),
-                                              'บันทึกเรียบร้อย', 'บันทึกโรงพยาบาลไม่สำเร็จ')
-                        else: sb_exec(sb.table('hospitals').insert(payload),
-                                      'บันทึกเรียบร้อย', 'บันทึกโรงพยาบาลไม่สำเร็จ')
-                        load_df.clear(); rerun()
+                        if edit_mode: res = sb_exec(sb.table('hospitals').update(payload).eq('id', row['id']),
+                                                    'บันทึกเรียบร้อย', 'บันทึกโรงพยาบาลไม่สำเร็จ')
+                        else: res = sb_exec(sb.table('hospitals').insert(payload),
+                                            'บันทึกเรียบร้อย', 'บันทึกโรงพยาบาลไม่สำเร็จ')
+                        cache_upsert('hospitals', res.data or [payload]); rerun()
                     except Exception:
-                        st.warning('⚠️ อาจยังไม่มีคอลัมน์ hospital_type/service_models ในตาราง hospitals')
-                        try:
-                            payload_fallback = dict(payload)
-                            payload_fallback.pop('hospital_type', None)
-                            payload_fallback.pop('service_models', None)
-                            if edit_mode:
-                                sb_exec(sb.table('hospitals').update(payload_fallback).eq('id', row['id']))
-                            else:
-                                sb_exec(sb.table('hospitals').insert(payload_fallback))
-                            st.success('บันทึกส่วนที่ระบบรองรับแล้ว'); load_df.clear(); rerun()
-                        except Exception:
-                            st.error('บันทึกไม่สำเร็จ')
+                        pass
 
             with c2:
                 confirm = st.checkbox('ยืนยันการลบโรงพยาบาลนี้และธุรกรรมทั้งหมดที่เกี่ยวข้อง', value=False, key='confirm_del_hosp',
                                       disabled=not can_edit)
                 if edit_mode and st.button('🗑️ ยืนยันลบ', disabled=(not can_edit or not confirm)):
                     try:
-                        sb_exec(sb.table('transactions').delete().eq('hospital_id', row['id']))
-                        sb_exec(sb.table('hospitals').delete().eq('id', row['id']))
-                        st.success('ลบเรียบร้อย'); load_df.clear(); rerun()
+                        n_h, n_tx = delete_hospitals([row['id']])
+                        st.success(f'ลบเรียบร้อย (โรงพยาบาล {n_h} แห่ง, transaction {n_tx:,} รายการ)'); rerun()
                     except Exception:
                         st.error('ลบไม่สำเร็จ')
 
@@ -922,103 +1180,73 @@ def render_admin():
                     if st.button('บันทึก Transaction', key='add_tx_btn', disabled=not can_edit):
                         hid = name2id[hname]
                         try:
-                            rc_series = hospitals_df.loc[hospitals_df['id']==hid,'riders_count']
-                            rc = int(rc_series.iloc[0]) if not rc_series.empty else 0
-                            if riders_active > rc:
-                                st.error('Rider Active มากกว่า Capacity'); st.stop()
-
-                            # --- เช็คซ้ำก่อน ---
-                            existing = sb_exec(
-                                sb.table('transactions').select('id').eq('hospital_id', hid).eq('date', tx_date.isoformat()).limit(1),
-                                msg_fail='ตรวจสอบรายการซ้ำไม่สำเร็จ'
-                            ).data
-                            if existing:
-                                # update
-                                tx_id = existing[0]['id']
-                                sb_exec(
-                                    sb.table('transactions').update({
-                                        'transactions_count':int(tx_num),
-                                        'riders_active':int(riders_active)
-                                    }).eq('id', tx_id),
-                                    msg_ok='อัปเดตข้อมูลแล้ว', msg_fail='อัปเดตไม่สำเร็จ'
-                                )
-                            else:
-                                # insert
-                                sb_exec(
-                                    sb.table('transactions').insert({
-                                        'id': str(uuid.uuid4()),
-                                        'hospital_id':hid,
-                                        'date':tx_date.isoformat(),
-                                        'transactions_count':int(tx_num),
-                                        'riders_active':int(riders_active),
-                                        'created_at': datetime.now().isoformat()
-                                    }),
-                                    msg_ok='บันทึกข้อมูลแล้ว', msg_fail='บันทึกไม่สำเร็จ'
-                                )
-                            load_df.clear(); rerun()
-                        except Exception:
-                            pass
+                            saved = save_transaction(hid, tx_date, int(tx_num), int(riders_active), hospitals_df)
+                            st.success('บันทึกข้อมูลแล้ว')
+                            cache_upsert('transactions', saved); rerun()
+                        except ValueError as e:
+                            st.error(str(e))
+                        except Exception as e:
+                            st.error('❌ บันทึกไม่สำเร็จ'); st.code(getattr(e, 'message', None) or str(e))
                 with cbtn2:
                     if st.button('ยกเลิก', key='cancel_add_tx'):
                         st.session_state['open_add_tx'] = False
                         rerun()
 
-            with st.expander('📥 นำเข้า CSV (hospital_name,date,transactions_count,riders_active)'):
-                up = st.file_uploader('เลือกไฟล์ CSV', type=['csv'], disabled=not can_edit)
+            with st.expander('📥 นำเข้า CSV / Excel (hospital_name,date,transactions_count,riders_active)'):
+                up = st.file_uploader('เลือกไฟล์ CSV หรือ Excel', type=['csv','xlsx'], disabled=not can_edit)
                 auto_create = st.checkbox('สร้างโรงพยาบาลอัตโนมัติถ้าไม่พบ', value=False, disabled=not can_edit)
                 if up is not None and can_edit:
-                    try:
-                        df_imp = pd.read_csv(up)
-                        required = {'hospital_name','date','transactions_count','riders_active'}
-                        if not required.issubset(set(df_imp.columns)):
-                            st.error(f'คอลัมน์ต้องมี: {required}')
-                        else:
-                            for _, r in df_imp.iterrows():
-                                hname = str(r['hospital_name']).strip()
-                                dt = pd.to_datetime(r['date']).date()
-                                tx = int(r['transactions_count'])
-                                ra = int(r['riders_active'])
-                                hid = name2id.get(hname)
-                                if not hid and auto_create:
-                                    hid = str(uuid.uuid4())
-                                    payload={'id':hid,'name':hname,'province':'กรุงเทพมหานคร','region':TH_PROVINCES['กรุงเทพมหานคร'],
-                                             'site_control':'ทีมเหนือ','system_type':'WebPortal','riders_count':0}
-                                    try:
-                                        sb_exec(sb.table('hospitals').insert(payload))
-                                        name2id[hname]=hid
-                                    except Exception:
-                                        pass
-                                if not hid:
-                                    st.warning(f'ข้าม: ไม่พบโรงพยาบาล {hname}')
-                                    continue
-                                # upsert แบบ manual (เช็คซ้ำก่อน)
-                                existing = sb_exec(
-                                    sb.table('transactions').select('id').eq('hospital_id', hid).eq('date', dt.isoformat()).limit(1),
-                                    msg_fail='ตรวจสอบรายการซ้ำไม่สำเร็จ'
-                                ).data
-                                if existing:
-                                    sb_exec(
-                                        sb.table('transactions').update({
-                                            'transactions_count':tx,
-                                            'riders_active':ra
-                                        }).eq('id', existing[0]['id'])
-                                    )
-                                else:
-                                    sb_exec(
-                                        sb.table('transactions').insert({
-                                            'id': str(uuid.uuid4()),
-                                            'hospital_id':hid,
-                                            'date':dt.isoformat(),
-                                            'transactions_count':tx,
-                                            'riders_active':ra,
-                                            'created_at': datetime.now().isoformat()
-                                        })
-                                    )
-                            st.success('นำเข้าเสร็จสิ้น'); load_df.clear(); rerun()
-                    except Exception:
-                        st.error('นำเข้าไม่สำเร็จ')
+                    # checkpoint ต่อไฟล์: นำเข้าล้มกลางทาง → ทำต่อจากก้อนสุดท้ายที่บันทึกสำเร็จ
+                    fp = tx_import.file_fingerprint(up, up.name)
+                    ckpt = st.session_state.get('import_ckpt')
+                    resume = ckpt if (ckpt and ckpt['fp'] == fp and not ckpt['done']) else None
+                    if resume:
+                        st.info(f"ไฟล์นี้นำเข้าค้างไว้ (บันทึกแล้ว {resume['rows_done']:,} แถว) — กด 'นำเข้าต่อ' เพื่อทำต่อ")
+                    ic1, ic2 = st.columns(2)
+                    go_btn = ic1.button('นำเข้าต่อ' if resume else 'เริ่มนำเข้า', key='import_csv_btn')
+                    restart = bool(resume) and ic2.button('เริ่มใหม่ทั้งไฟล์', key='import_restart_btn')
+                    if go_btn or restart:
+                        if restart or not resume:
+                            ckpt = {'fp': fp, 'rows_done': 0, 'written': 0, 'new_hospitals': 0,
+                                    'rejects': [], 'done': False}
+                        st.session_state['import_ckpt'] = ckpt
+                        bar = st.progress(0.0); stat = st.empty()
+                        t0, base = time.time(), ckpt['rows_done']
+                        try:
+                            for res in tx_import.stream_import(sb, up, up.name, name2id, auto_create, TH_PROVINCES,
+                                                               skip_rows=ckpt['rows_done'],
+                                                               on_hospitals=lambda rows: cache_upsert('hospitals', rows)):
+                                cache_upsert('transactions', res['written'])
+                                ckpt['rows_done'] = res['rows_done']
+                                ckpt['written'] += len(res['written'])
+                                ckpt['new_hospitals'] += len(res['new_hospitals'])
+                                if not res['rejects'].empty: ckpt['rejects'].append(res['rejects'])
+                                rate = (ckpt['rows_done'] - base) / max(time.time() - t0, 1e-6)
+                                bar.progress(res['fraction'])
+                                stat.caption(f"อ่านแล้ว {ckpt['rows_done']:,} แถว · {rate:,.0f} แถว/วินาที")
+                            ckpt['done'] = True
+                            rejects = pd.concat(ckpt['rejects'], ignore_index=True) if ckpt['rejects'] else None
+                            st.session_state['import_result'] = {
+                                'rows': ckpt['rows_done'], 'written': ckpt['written'],
+                                'new_hospitals': ckpt['new_hospitals'],
+                                'rejects': rejects.to_csv(index=False).encode('utf-8-sig') if rejects is not None else None,
+                                'rejected': len(rejects) if rejects is not None else 0,
+                            }
+                            rerun()
+                        except Exception as e:
+                            st.error(f"นำเข้าไม่สำเร็จหลังแถวที่ {ckpt['rows_done']:,} "
+                                     f"(บันทึกแล้ว {ckpt['written']:,} รายการ) — กด 'นำเข้าต่อ' เพื่อทำต่อจากจุดนี้")
+                            st.exception(e)
+                res_imp = st.session_state.get('import_result')
+                if res_imp:
+                    msg = (f"นำเข้าเสร็จสิ้น: บันทึก {res_imp['written']:,} จาก {res_imp['rows']:,} แถว"
+                           f" · สร้างโรงพยาบาลใหม่ {res_imp['new_hospitals']:,} แห่ง")
+                    (st.warning if res_imp['rejected'] else st.success)(
+                        msg + (f" · ข้าม {res_imp['rejected']:,} แถว" if res_imp['rejected'] else ''))
+                    if res_imp['rejects']:
+                        st.download_button('ดาวน์โหลดแถวที่ไม่ผ่าน (CSV)', data=res_imp['rejects'],
+                                           file_name='import_rejects.csv', mime='text/csv', key='dl_import_rejects')
 
-            raw_tx = load_df('transactions')
             default_h = st.session_state.get('edit_target_h')
             default_d = st.session_state.get('edit_target_d', date.today())
             try:
@@ -1040,55 +1268,41 @@ def render_admin():
                         st.session_state.pop(k, None)
                     rerun()
 
-                if raw_tx.empty:
-                    st.info('ยังไม่มีข้อมูล')
+                row = find_tx(name2id[h_edit], d_edit)
+                if row is None:
+                    st.info('ไม่พบข้อมูลของโรงพยาบาล/วันที่นี้')
                 else:
-                    raw_tx['date'] = pd.to_datetime(raw_tx['date']).dt.date
-                    pick_df = raw_tx[(raw_tx['hospital_id']==name2id[h_edit]) & (raw_tx['date']==d_edit)]
-                    if pick_df.empty:
-                        st.info('ไม่พบข้อมูลของโรงพยาบาล/วันที่นี้')
-                    else:
-                        row = pick_df.iloc[0].to_dict()
-                        nsel = st.number_input('Transactions', min_value=0, step=1, value=int(row.get('transactions_count',0)), disabled=not can_edit)
-                        rsel = st.number_input('Rider Active', min_value=0, step=1, value=int(row.get('riders_active',0)), disabled=not can_edit)
-                        c1,c2 = st.columns(2)
-                        with c1:
-                            if st.button('บันทึกการแก้ไข', key='save_edit_tx', disabled=not can_edit):
-                                try:
-                                    sb_exec(
-                                        sb.table('transactions').update({
-                                            'transactions_count':int(nsel),'riders_active':int(rsel)
-                                        }).eq('id', row['id']),
-                                        msg_ok='อัปเดตแล้ว', msg_fail='อัปเดตไม่สำเร็จ'
-                                    )
-                                    for k in ['open_edit_tx','edit_target_h','edit_target_d']:
-                                        st.session_state.pop(k, None)
-                                    load_df.clear(); rerun()
-                                except Exception:
-                                    pass
-                        with c2:
-                            if st.button('ลบรายการนี้', key='del_edit_tx', disabled=not can_edit):
-                                try:
-                                    sb_exec(sb.table('transactions').delete().eq('id', row['id']),
-                                           msg_ok='ลบแล้ว', msg_fail='ลบไม่สำเร็จ')
-                                    for k in ['open_edit_tx','edit_target_h','edit_target_d']:
-                                        st.session_state.pop(k, None)
-                                    load_df.clear(); rerun()
-                                except Exception:
-                                    pass
+                    nsel = st.number_input('Transactions', min_value=0, step=1, value=int(row.get('transactions_count',0)), disabled=not can_edit)
+                    rsel = st.number_input('Rider Active', min_value=0, step=1, value=int(row.get('riders_active',0)), disabled=not can_edit)
+                    c1,c2 = st.columns(2)
+                    with c1:
+                        if st.button('บันทึกการแก้ไข', key='save_edit_tx', disabled=not can_edit):
+                            try:
+                                res = sb_exec(
+                                    sb.table('transactions').update({
+                                        'transactions_count':int(nsel),'riders_active':int(rsel)
+                                    }).eq('id', row['id']),
+                                    msg_ok='อัปเดตแล้ว', msg_fail='อัปเดตไม่สำเร็จ'
+                                )
+                                for k in ['open_edit_tx','edit_target_h','edit_target_d']:
+                                    st.session_state.pop(k, None)
+                                cache_upsert('transactions', res.data or [{'id':row['id'],'transactions_count':int(nsel),'riders_active':int(rsel)}])
+                                rerun()
+                            except Exception:
+                                pass
+                    with c2:
+                        if st.button('ลบรายการนี้', key='del_edit_tx', disabled=not can_edit):
+                            try:
+                                sb_exec(sb.table('transactions').delete().eq('id', row['id']),
+                                       msg_ok='ลบแล้ว', msg_fail='ลบไม่สำเร็จ')
+                                for k in ['open_edit_tx','edit_target_h','edit_target_d']:
+                                    st.session_state.pop(k, None)
+                                cache_delete('transactions', 'id', [row['id']]); rerun()
+                            except Exception:
+                                pass
 
             st.markdown('#### รายการ Transaction (มุมมอง)')
-            if raw_tx.empty:
-                st.info('ยังไม่มีข้อมูล')
-            else:
-                raw_tx['date'] = pd.to_datetime(raw_tx['date']).dt.date
-                tx_view = raw_tx.merge(hospitals_df[['id','name']], left_on='hospital_id', right_on='id', how='left')
-                tx_view['วันที่'] = tx_view['date'].apply(th_date)
-                show = safe_cols(tx_view, ['วันที่','name','transactions_count','riders_active'])
-                st.dataframe(
-                    tx_view[show].rename(columns={'name':'โรงพยาบาล','transactions_count':'Transactions','riders_active':'Rider Active'}),
-                    use_container_width=True
-                )
+            render_tx_grid(hospitals_df, name2id)
 
     # ---- Master Data ----
     with tabs[2]:
@@ -1103,19 +1317,19 @@ def render_admin():
             new_t = st.text_input('เพิ่มประเภท (เช่น รพช. ขนาด S)')
             if st.button('เพิ่มประเภท'):
                 if new_t.strip():
-                    upsert_master('hospital_types', new_t.strip()); load_df.clear(); rerun()
+                    upsert_master('hospital_types', new_t.strip()); rerun()
         with c2:
             if not show_types.empty:
                 old_t = st.selectbox('เปลี่ยนชื่อ (เลือก)', show_types.tolist())
                 new_name = st.text_input('ชื่อใหม่')
                 if st.button('บันทึกชื่อใหม่'):
                     if new_name.strip():
-                        rename_master('hospital_types', old_t, new_name.strip()); load_df.clear(); rerun()
+                        rename_master('hospital_types', old_t, new_name.strip()); rerun()
         with c3:
             if not show_types.empty:
                 del_t = st.selectbox('ลบประเภท (เลือก)', show_types.tolist(), key='del_type_sel')
                 if st.button('ลบประเภทนี้'):
-                    delete_master('hospital_types', del_t); load_df.clear(); rerun()
+                    delete_master('hospital_types', del_t); rerun()
 
         st.divider()
 
@@ -1128,19 +1342,19 @@ def render_admin():
             new_m = st.text_input('เพิ่มโมเดลบริการ (เช่น Rider Hub)')
             if st.button('เพิ่มโมเดล'):
                 if new_m.strip():
-                    upsert_master('service_models_master', new_m.strip()); load_df.clear(); rerun()
+                    upsert_master('service_models_master', new_m.strip()); rerun()
         with s2:
             if not show_sm.empty:
                 old_m = st.selectbox('เปลี่ยนชื่อโมเดล (เลือก)', show_sm.tolist())
                 new_m_name = st.text_input('ชื่อโมเดลใหม่')
                 if st.button('บันทึกชื่อโมเดลใหม่'):
                     if new_m_name.strip():
-                        rename_master('service_models_master', old_m, new_m_name.strip()); load_df.clear(); rerun()
+                        rename_master('service_models_master', old_m, new_m_name.strip()); rerun()
         with s3:
             if not show_sm.empty:
                 del_m = st.selectbox('ลบโมเดล (เลือก)', show_sm.tolist(), key='del_model_sel')
                 if st.button('ลบโมเดลนี้'):
-                    delete_master('service_models_master', del_m); load_df.clear(); rerun()
+                    delete_master('service_models_master', del_m); rerun()
 
     # ---- Admin users / Roles ----
     with tabs[3]:
@@ -1175,7 +1389,7 @@ def render_admin():
                         }),
                         msg_ok='เพิ่มผู้ดูแลแล้ว', msg_fail='เพิ่มผู้ดูแลไม่สำเร็จ'
                     )
-                    load_df.clear(); rerun()
+                    clear_data_cache(); rerun()
                 except Exception:
                     pass
 
@@ -1191,7 +1405,7 @@ def render_admin():
                         try:
                             sb_exec(sb.table('admins').update({'password_hash':hash_pw(newpw)}).eq('username', selu),
                                     msg_ok='เปลี่ยนแล้ว', msg_fail='เปลี่ยนรหัสผ่านไม่สำเร็จ')
-                            load_df.clear(); rerun()
+                            clear_data_cache(); rerun()
                         except Exception:
                             pass
                 with c2:
@@ -1199,7 +1413,7 @@ def render_admin():
                         try:
                             sb_exec(sb.table('admins').update({'role':newrole}).eq('username', selu),
                                     msg_ok='อัปเดตบทบาทแล้ว', msg_fail='อัปเดตบทบาทไม่สำเร็จ')
-                            load_df.clear(); rerun()
+                            clear_data_cache(); rerun()
                         except Exception:
                             pass
                 with c3:
@@ -1207,7 +1421,7 @@ def render_admin():
                         try:
                             sb_exec(sb.table('admins').delete().eq('username', selu),
                                     msg_ok='ลบแล้ว', msg_fail='ลบผู้ใช้ไม่สำเร็จ')
-                            load_df.clear(); rerun()
+                            clear_data_cache(); rerun()
                         except Exception:
                             pass
 
@@ -1219,54 +1433,55 @@ def render_admin():
         start = ym.replace(day=1)
         end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
 
+        first = monthly_rollup.add_months(start, -12)
         hospitals_df = load_df('hospitals')
-        tx_df = load_df('transactions')
-        if tx_df.empty or hospitals_df.empty:
+        with PERF.timer('rollup:month', 'data') as t:
+            roll = rollup_source(first, start)
+            by_hosp = roll.month(start)
+            totals = roll.totals(first, start)
+            t.nbytes = perf.nbytes(by_hosp) + perf.nbytes(totals)
+        if by_hosp.empty or hospitals_df.empty:
             st.info('ยังไม่มีข้อมูลเพียงพอ')
         else:
-            tx_df['date'] = pd.to_datetime(tx_df['date']).dt.date
-            mm = tx_df[(tx_df['date']>=start) & (tx_df['date']<=end)].merge(
-                hospitals_df, left_on='hospital_id', right_on='id', how='left'
-            )
-            by_hosp = mm.groupby('name').agg(transactions=('transactions_count','sum'),
-                                             ra=('riders_active','sum')).reset_index()
-            by_site = mm.groupby('site_control').agg(transactions=('transactions_count','sum'),
-                                                     ra=('riders_active','sum')).reset_index()
-            daily = mm.groupby('date').agg(transactions=('transactions_count','sum'),
-                                           ra=('riders_active','sum')).reset_index()
-
-            st.dataframe(by_hosp.rename(columns={'name':'โรงพยาบาล','transactions':'Transactions','ra':'Rider Active'}),
+            report = monthly_rollup.report_tables(by_hosp, roll.daily(start, end), hospitals_df)
+            cmp = monthly_rollup.compare_months(totals, start)
+            cur = cmp['current']
+            c1, c2, c3 = st.columns(3)
+            for col, label, ref in ((c1, 'เทียบเดือนก่อน', cmp['prev_month']),
+                                    (c2, 'เทียบเดือนเดียวกันปีก่อน', cmp['prev_year'])):
+                delta = (f"{(cur['transactions_count'] - ref['transactions_count']) / ref['transactions_count'] * 100:+.1f}%"
+                         if ref and ref['transactions_count'] else None)
+                col.metric(f'Transactions ({label})', f"{cur['transactions_count']:,}", delta)
+            c3.metric('โรงพยาบาลที่มีข้อมูล', f"{cur['hospitals']:,}")
+
+            st.dataframe(report['by_hospital'].rename(columns={'name':'โรงพยาบาล','transactions':'Transactions','ra':'Rider Active'}),
                          use_container_width=True, height=300)
-
-            ebytes = df_to_excel_bytes({
-                f"{start.strftime('%Y-%m')}_by_hospital": by_hosp,
-                f"{start.strftime('%Y-%m')}_by_site": by_site,
-                f"{start.strftime('%Y-%m')}_daily": daily
-            })
-            st.download_button("ดาวน์โหลดรายงาน (Excel)", data=ebytes,
-                               file_name=f"telemed_monthly_{start.strftime('%Y_%m')}.xlsx",
-                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-            settings_df = load_df('settings')
-            def get_setting(key, default):
-                try:
-                    v = settings_df.loc[settings_df['key']==key, 'value'].iloc[0]
-                    return v if isinstance(v, dict) else default
-                except Exception:
-                    return default
-            line_cfg = get_setting('line_notify', {'enabled':False,'token':''})
+            with st.expander('ยอดรวม 13 เดือนล่าสุด'):
+                st.dataframe(totals.rename(columns={'month':'เดือน','transactions_count':'Transactions',
+                                                    'riders_active':'Rider Active','hospitals':'โรงพยาบาล'}),
+                             use_container_width=True, hide_index=True)
+
+            ym_label = start.strftime('%Y-%m')
+            report_ctx = {'key': report_key(start), 'has_rows': True, 'start': start,
+                          'by_hosp': by_hosp, 'hospitals': hospitals_df,
+                          'sheets': {f"{ym_label}_by_hospital": report['by_hospital'],
+                                     f"{ym_label}_by_site": report['by_site'],
+                                     f"{ym_label}_daily": report['daily'],
+                                     f"{ym_label}_months": totals}}
+            for col, export in zip(st.columns(len(REPORT_EXPORTS)), REPORT_EXPORTS):
+                with col:
+                    export_buttons([export], report_ctx, start.strftime('%Y_%m'))
+
+            line_cfg = master_data().setting('line_notify', {'enabled':False,'token':''})
             if st.button('ส่งสรุปไป LINE Notify'):
                 if not line_cfg.get('enabled') or not line_cfg.get('token'):
                     st.error('ยังไม่ตั้งค่า LINE Notify')
                 else:
                     try:
-                        summary_text = f"สรุป {start.strftime('%Y-%m')}\n" \
-                                       f"รวมธุรกรรม: {int(mm['transactions_count'].sum()):,} รายการ\n" \
-                                       f"โรงพยาบาล: {mm['hospital_id'].nunique()} แห่ง"
                         requests.post(
                             "https://notify-api.line.me/api/notify",
                             headers={"Authorization": f"Bearer {line_cfg['token']}"},
-                            data={"message": summary_text}
+                            data={"message": monthly_rollup.summary_text(start, by_hosp)}
                         )
                         st.success('ส่ง LINE แล้ว')
                     except Exception:
@@ -1276,16 +1491,8 @@ def render_admin():
     with tabs[5]:
         st.markdown('### ตั้งค่า & ข้อมูลตัวอย่าง')
         settings_df = load_df('settings')
-
-        def get_setting(key, default):
-            try:
-                v = settings_df.loc[settings_df['key']==key, 'value'].iloc[0]
-                return v if isinstance(v, dict) else default
-            except Exception:
-                return default
-
-        targets = get_setting('targets', {'daily_transactions':50,'utilization_alert_pct':90})
-        line_cfg = get_setting('line_notify', {'enabled':False,'token':''})
+        targets = master_data().setting('targets', {'daily_transactions':50,'utilization_alert_pct':90})
+        line_cfg = master_data().setting('line_notify', {'enabled':False,'token':''})
 
         c1,c2 = st.columns(2)
         with c1:
@@ -1294,25 +1501,48 @@ def render_admin():
         with c2:
             util_th = st.number_input('แจ้งเตือนเมื่อ Utilization ≥ (%)', min_value=0, max_value=100, step=1,
                                       value=int(targets.get('utilization_alert_pct',90)))
-        if st.button('บันทึกเป้าหมาย'):
+        if st.button('บันทึกเป้าหมาย', disabled=not CAPS.has_table('settings')):
             try:
                 sb_exec(sb.table('settings').upsert({'key':'targets','value':{'daily_transactions':int(daily_target),'utilization_alert_pct':int(util_th)}}),
                         msg_ok='บันทึกแล้ว', msg_fail='บันทึกตั้งค่าไม่สำเร็จ')
-                load_df.clear()
+                master_data().invalidate('settings')
             except Exception:
                 pass
 
         st.markdown('#### LINE Notify')
         en_line = st.checkbox('เปิดใช้ LINE Notify', value=bool(line_cfg.get('enabled',False)))
         token = st.text_input('LINE Notify Token', value=line_cfg.get('token',''), type='password')
-        if st.button('บันทึก LINE Notify'):
+        if st.button('บันทึก LINE Notify', disabled=not CAPS.has_table('settings')):
             try:
                 sb_exec(sb.table('settings').upsert({'key':'line_notify','value':{'enabled':bool(en_line),'token':token.strip()}}),
                         msg_ok='บันทึกแล้ว', msg_fail='บันทึก LINE Notify ไม่สำเร็จ')
-                load_df.clear()
+                master_data().invalidate('settings')
             except Exception:
                 pass
 
+        st.markdown('#### โครงสร้างฐานข้อมูล')
+        if CAPS.missing():
+            st.warning('ยังไม่มี: ' + ', '.join(CAPS.missing()) + ' — ฟีเจอร์ที่เกี่ยวข้องถูกปิดไว้')
+        else:
+            st.caption('ตาราง/คอลัมน์เสริมครบ')
+        if st.button('🔄 ตรวจสอบโครงสร้างใหม่', help='ใช้หลังรัน SQL เพิ่มตาราง/คอลัมน์ (ปกติตรวจครั้งเดียวตอนเริ่ม process)'):
+            app_capabilities.clear(); rerun()
+
+        st.markdown('#### Snapshot (Parquet)')
+        st.caption(f'transactions + hospitals ทั้งตาราง → {snapshot.SNAPSHOT_DIR}/<วันที่>/ '
+                   '— เปิดแอปจาก snapshot ได้ด้วย DATA_BACKEND=snapshot SNAPSHOT_PATH=<โฟลเดอร์|latest> (ไม่อ่าน Supabase)')
+        if st.button('เขียน snapshot วันนี้'):
+            try:
+                with st.spinner('กำลังอ่านข้อมูลและเขียน Parquet...'):
+                    frames = snapshot.fetch_tables(sb, page_size=PAGE_SIZE)
+                    path = snapshot.write_snapshot(frames)
+                st.success(f"เขียนแล้ว: {path} (" + ', '.join(f'{t} {len(df):,} แถว' for t, df in frames.items()) + ')')
+            except Exception as e:
+                st.error(f'เขียน snapshot ไม่สำเร็จ: {e}')
+        snaps = snapshot.list_snapshots()
+        if snaps:
+            st.caption('มีอยู่: ' + ', '.join(os.path.basename(p) for p in snaps[-10:]))
+
         st.markdown('#### ตาราง settings (Raw)')
         if not settings_df.empty:
             st.dataframe(settings_df, use_container_width=True)
@@ -1320,50 +1550,36 @@ def render_admin():
             st.info('ยังไม่มีข้อมูลในตาราง settings')
 
         st.markdown('#### ข้อมูลตัวอย่าง')
+        st.caption('สร้างโรงพยาบาลทดสอบ (ชื่อขึ้นต้น "' + demo_seed.DEMO_PREFIX.strip() + '") พร้อมยอดรายวันย้อนหลัง — ใช้ทดสอบโหลดได้')
+        c1, c2, c3 = st.columns(3)
+        n_demo_h = c1.number_input('จำนวนโรงพยาบาล', 1, 2000, 5, key='demo_n_h')
+        n_demo_d = c2.number_input('จำนวนวัน', 1, 3650, 3, key='demo_n_d')
+        demo_rng = c3.number_input('seed (0 = สุ่ม)', 0, 10**9, 0, key='demo_seed')
         a,b = st.columns(2)
         with a:
-            if st.button('เติมข้อมูลตัวอย่าง (5 รพ. x 3 วัน)'):
-                demo = [
-                    ('รพ.หาดใหญ่','สงขลา','ภาคใต้','ทีมใต้','WebPortal',['Rider','App','Station to Station'],5,'รพ.ศูนย์/รพ.ทั่วไป'),
-                    ('รพ.เชียงใหม่','เชียงใหม่','ภาคเหนือ','ทีมเหนือ','HOSxpV4',['Rider','Station to Station'],7,'รพ.ศูนย์/รพ.ทั่วไป'),
-                    ('รพ.ขอนแก่น','ขอนแก่น','ภาคอีสาน','ทีมอีสาน','HOSxpV3',['App'],4,'รพ.ชุมชน'),
-                    ('รพ.ชลบุรี','ชลบุรี','ภาคตะวันออก','ทีมเหนือ','WebPortal',['Rider','App'],6,'รพ.ศูนย์/รพ.ทั่วไป'),
-                    ('รพ.นครศรีธรรมราช','นครศรีธรรมราช','ภาคใต้','ทีมใต้','HOSxpV4',['Rider','App'],6,'รพ.ศูนย์/รพ.ทั่วไป'),
-                ]
-                name2id={}
-                for n,prov,reg,site,sys,models,rc,ht in demo:
-                    try:
-                        ex=sb.table('hospitals').select('id').eq('name',n).execute().data
-                        hid=ex[0]['id'] if ex else str(uuid.uuid4())
-                        payload={'id':hid,'name':n,'province':prov,'region':reg,
-                                 'site_control':site,'system_type':sys,'service_models':models,
-                                 'riders_count':rc,'hospital_type':ht}
-                        if not ex:
-                            try:
-                                sb_exec(sb.table('hospitals').insert(payload))
-                            except Exception:
-                                payload.pop('hospital_type', None); payload.pop('service_models', None)
-                                sb_exec(sb.table('hospitals').insert(payload))
-                        name2id[n]=hid
-                    except Exception: pass
-                days=[date.today()-timedelta(days=2),date.today()-timedelta(days=1),date.today()]
-                rows=[]
-                for n,hid in name2id.items():
-                    for d in days:
-                        rows.append({'id':str(uuid.uuid4()),'hospital_id':hid,'date':d.isoformat(),
-                                     'transactions_count':random.randint(20,60),'riders_active':random.randint(2,7),
-                                     'created_at': datetime.now().isoformat()})
-                if rows:
-                    try: sb_exec(sb.table('transactions').insert(rows)); st.success('เติมข้อมูลแล้ว'); load_df.clear(); rerun()
-                    except Exception: st.error('เติมข้อมูลไม่สำเร็จ')
+            if st.button(f'เติมข้อมูลตัวอย่าง ({int(n_demo_h):,} รพ. x {int(n_demo_d):,} วัน)'):
+                bar = st.progress(0.0, text='กำลังเขียนข้อมูลตัวอย่าง...')
+                try:
+                    out = demo_seed.seed(sb, int(n_demo_h), int(n_demo_d), seed_value=int(demo_rng) or None,
+                                         strip=lambda h: CAPS.strip('hospitals', h),
+                                         on_batch=lambda done, total: bar.progress(done / max(total, 1),
+                                                                                  text=f'{done:,}/{total:,} รายการ'))
+                    if not out['hospitals']:
+                        bar.empty()
+                        st.info(f'มีโรงพยาบาลทดสอบหมายเลข 1–{int(n_demo_h):,} ครบแล้ว (เพิ่มจำนวนโรงพยาบาลเพื่อสร้างเพิ่ม)')
+                    else:
+                        cache_upsert('hospitals', out['hospitals'])
+                        cache_upsert('transactions', out['transactions'].to_dict('records'))
+                        st.success(f"เติมข้อมูลแล้ว (โรงพยาบาล {len(out['hospitals']):,} แห่ง, "
+                                   f"transaction {len(out['transactions']):,} รายการ)"); rerun()
+                except Exception:
+                    clear_data_cache()
+                    st.error('เติมข้อมูลไม่สำเร็จ (อาจเขียนไปแล้วบางส่วน — ลบได้ด้วยปุ่มลบข้อมูลตัวอย่าง)')
         with b:
             if st.button('ลบข้อมูลตัวอย่าง'):
                 try:
-                    targets=['รพ.หาดใหญ่','รพ.เชียงใหม่','รพ.ขอนแก่น','รพ.ชลบุรี','รพ.นครศรีธรรมราช']
-                    ids=[r['id'] for r in sb.table('hospitals').select('id').in_('name',targets).execute().data]
-                    for hid in ids: sb_exec(sb.table('transactions').delete().eq('hospital_id',hid))
-                    if ids: sb_exec(sb.table('hospitals').delete().in_('id',ids))
-                    st.success('ลบแล้ว'); load_df.clear(); rerun()
+                    n_h, n_tx = delete_hospitals(demo_seed.demo_hospital_ids(sb))
+                    st.success(f'ลบแล้ว (โรงพยาบาล {n_h} แห่ง, transaction {n_tx:,} รายการ)'); rerun()
                 except Exception:
                     st.error('ลบข้อมูลตัวอย่างไม่สำเร็จ')
 
@@ -1376,17 +1592,9 @@ else:
 # ---------------- Sidebar downloads ----------------
 with sidebar_dl_container:
     st.markdown("## ⬇️ บันทึก/ส่งออก")
-    dls = st.session_state.get('downloads', {})
-    if dls.get('png_bytes'):
-        st.download_button("📸 ดาวน์โหลดภาพ PNG", data=dls['png_bytes'],
-                           file_name=f"telemed_dashboard_{date.today().isoformat()}.png", mime="image/png",
-                           use_container_width=True)
-    if dls.get('csv_bytes'):
-        st.download_button("CSV (ข้อมูลที่กรองแล้ว)", data=dls['csv_bytes'],
-                           file_name=f"telemed_filtered_{date.today().isoformat()}.csv", mime="text/csv",
-                           use_container_width=True)
-    if dls.get('excel_bytes'):
-        st.download_button("Excel (หลายชีต)", data=dls['excel_bytes'],
-                           file_name=f"telemed_export_{date.today().isoformat()}.xlsx",
-                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                           use_container_width=True)
+    ctx = st.session_state.get('export_ctx')
+    if ctx:
+        png_renderer().start()  # อุ่น kaleido ไว้เบื้องหลังก่อนผู้ใช้กด
+        export_buttons(EXPORTS, ctx, date.today().isoformat())
+
+PERF.end_rerun()
@@ -2,15 +2,18 @@ import os
 from functools import lru_cache
 from supabase import create_client, Client
 
-URL = os.environ["SUPABASE_URL"]
+import local_backend
 
 @lru_cache(maxsize=1)
 def supabase_readonly() -> Client:
-    """ใช้สำหรับ SELECT/อ่านข้อมูลทั่วไป"""
-    return create_client(URL, os.environ["SUPABASE_ANON_KEY"])
+    """ใช้สำหรับ SELECT/อ่านข้อมูลทั่วไป (DATA_BACKEND=local → SQLite ในเครื่อง)"""
+    return local_backend.from_env() or create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_ANON_KEY"])
 
 @lru_cache(maxsize=1)
 def supabase_admin() -> Client:
     """ใช้เฉพาะจุดที่ต้องสิทธิ์สูงจริง ๆ (update/insert/delete/เรียก RPC แอดมิน)"""
+    local = local_backend.from_env()
+    if local is not None:
+        return local
     key = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-    return create_client(URL, key)
+    return create_client(os.environ["SUPABASE_URL"], key)
@@ -0,0 +1,379 @@
+# telemed_core.py
+# ============================================================
+# ส่วนที่ไม่มี side effect ของแอป (import ครั้งเดียวต่อ process)
+# - ค่าคงที่ / จังหวัด (วันที่ภาษาไทยอยู่ใน thai_dates.py)
+# - helper ข้อมูล (slice_tx, merge_hospitals, aggregate_dashboard, export_sheets, df_to_excel_bytes)
+# - ตัวสร้างกราฟ plotly (คืน Figure อย่างเดียว การแสดงผลอยู่ใน streamlit_app.py)
+# streamlit_app.py ถูก exec ใหม่ทุก rerun จึงควรเหลือเฉพาะส่วนหน้าเพจ
+# ============================================================
+
+import io
+from datetime import date
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from PIL import Image, ImageDraw, ImageFont
+
+from excel_export import to_xlsx_bytes
+from thai_dates import TH_MONTHS, th_date, date_labels, weekday_labels  # noqa: F401 (re-export)
+
+APP_VERSION = "v4.9.5"
+
+PALETTE_PASTEL = ["#A7C7E7","#F8C8DC","#B6E2D3","#FDE2B3","#EAD7F7","#CDE5F0",
+                  "#FFD6E8","#C8E6C9","#FFF3B0","#D7E3FC","#F2D7EE","#B8F1ED"]
+PALETTE_DARK   = ["#60A5FA","#F472B6","#34D399","#FBBF24","#C084FC","#67E8F9",
+                  "#FCA5A5","#86EFAC","#FDE68A","#A5B4FC","#F5D0FE","#99F6E4"]
+
+SITE_CONTROL_CHOICES = ['ทีมใต้', 'ทีมเหนือ', 'ทีมอีสาน']
+SYSTEM_CHOICES = ['HOSxpV4', 'HOSxpV3', 'WebPortal']
+DEFAULT_SERVICE_MODELS = ['Rider', 'App', 'Station to Station']
+DEFAULT_HOSPITAL_TYPES = ['รพ.ศูนย์/รพ.ทั่วไป','รพ.ชุมชน','สถาบัน/เฉพาะทาง','เอกชน/คลินิก']
+
+# -------- 77 จังหวัด + ภูมิภาค --------
+TH_PROVINCES = {
+    'กรุงเทพมหานคร':'ภาคกลาง','นนทบุรี':'ภาคกลาง','ปทุมธานี':'ภาคกลาง','พระนครศรีอยุธยา':'ภาคกลาง',
+    'อ่างทอง':'ภาคกลาง','ลพบุรี':'ภาคกลาง','สิงห์บุรี':'ภาคกลาง','ชัยนาท':'ภาคกลาง','สระบุรี':'ภาคกลาง',
+    'นครปฐม':'ภาคกลาง','สมุทรสาคร':'ภาคกลาง','สมุทรสงคราม':'ภาคกลาง','สุพรรณบุรี':'ภาคกลาง','สมุทรปราการ':'ภาคกลาง',
+    'นครนายก':'ภาคกลาง',
+    'ชลบุรี':'ภาคตะวันออก','ระยอง':'ภาคตะวันออก','จันทบุรี':'ภาคตะวันออก','ตราด':'ภาคตะวันออก',
+    'ฉะเชิงเทรา':'ภาคตะวันออก','ปราจีนบุรี':'ภาคตะวันออก','สระแก้ว':'ภาคตะวันออก',
+    'กาญจนบุรี':'ภาคตะวันตก','ตาก':'ภาคตะวันตก','ราชบุรี':'ภาคตะวันตก','เพชรบุรี':'ภาคตะวันตก','ประจวบคีรีขันธ์':'ภาคตะวันตก',
+    'เชียงใหม่':'ภาคเหนือ','เชียงราย':'ภาคเหนือ','ลำปาง':'ภาคเหนือ','ลำพูน':'ภาคเหนือ','พะเยา':'ภาคเหนือ','แพร่':'ภาคเหนือ',
+    'น่าน':'ภาคเหนือ','แม่ฮ่องสอน':'ภาคเหนือ','อุตรดิตถ์':'ภาคเหนือ','สุโขทัย':'ภาคเหนือ','พิษณุโลก':'ภาคเหนือ',
+    'พิจิตร':'ภาคเหนือ','กำแพงเพชร':'ภาคเหนือ','เพชรบูรณ์':'ภาคเหนือ','นครสวรรค์':'ภาคเหนือ','อุทัยธานี':'ภาคเหนือ',
+    'เลย':'ภาคอีสาน','หนองคาย':'ภาคอีสาน','บึงกาฬ':'ภาคอีสาน','หนองบัวลำภู':'ภาคอีสาน','อุดรธานี':'ภาคอีสาน',
+    'สกลนคร':'ภาคอีสาน','นครพนม':'ภาคอีสาน','กาฬสินธุ์':'ภาคอีสาน','มุกดาหาร':'ภาคอีสาน','ขอนแก่น':'ภาคอีสาน',
+    'ชัยภูมิ':'ภาคอีสาน','นครราชสีมา':'ภาคอีสาน','บุรีรัมย์':'ภาคอีสาน','สุรินทร์':'ภาคอีสาน','ศรีสะเกษ':'ภาคอีสาน',
+    'อุบลราชธานี':'ภาคอีสาน','ยโสธร':'ภาคอีสาน','อำนาจเจริญ':'ภาคอีสาน','มหาสารคาม':'ภาคอีสาน','ร้อยเอ็ด':'ภาคอีสาน',
+    'ชุมพร':'ภาคใต้','ระนอง':'ภาคใต้','สุราษฎร์ธานี':'ภาคใต้','พังงา':'ภาคใต้','ภูเก็ต':'ภาคใต้','กระบี่':'ภาคใต้',
+    'ตรัง':'ภาคใต้','พัทลุง':'ภาคใต้','นครศรีธรรมราช':'ภาคใต้','สงขลา':'ภาคใต้','สตูล':'ภาคใต้','ปัตตานี':'ภาคใต้',
+    'ยะลา':'ภาคใต้','นราธิวาส':'ภาคใต้',
+}
+
+# ---------------- Transactions ----------------
+TX_COLS = ('hospital_id', 'date', 'transactions_count', 'riders_active')
+
+def slice_tx(frame: pd.DataFrame, start: date | None = None, end: date | None = None,
+             hospital_ids: tuple | None = None, cols: tuple = TX_COLS) -> pd.DataFrame:
+    """กรองช่วงวัน/โรงพยาบาลจาก frame ใน cache (date เป็น datetime64) แล้วคืน date เป็น datetime.date"""
+    if frame.empty or (hospital_ids is not None and not hospital_ids):
+        return pd.DataFrame(columns=list(cols))
+    mask = pd.Series(True, index=frame.index)
+    if start: mask &= frame['date'] >= pd.Timestamp(start)
+    if end: mask &= frame['date'] <= pd.Timestamp(end)
+    if hospital_ids is not None: mask &= frame['hospital_id'].isin(hospital_ids)
+    out = frame.loc[mask, list(cols)]
+    if 'date' in out.columns:
+        out['date'] = out['date'].dt.date
+    return out.reset_index(drop=True)
+
+def hospital_ids_for(hospitals_df: pd.DataFrame, filters: Dict[str, list]) -> tuple | None:
+    """
+    ตัวกรองฝั่งโรงพยาบาล {คอลัมน์: ค่าที่เลือก} → tuple ของ hospital_id (สำหรับ in_/slice_tx)
+    - None = ผ่านทุกแห่ง
+    """
+    if hospitals_df.empty or 'id' not in hospitals_df.columns:
+        return None
+    mask = pd.Series(True, index=hospitals_df.index)
+    for col, values in filters.items():
+        if col in hospitals_df.columns:
+            mask &= hospitals_df[col].isin(values)
+    if mask.all():
+        return None
+    return tuple(sorted(hospitals_df.loc[mask, 'id'].astype(str)))
+
+ROW_COLS = ['date','hospital_id','transactions_count','riders_active',
+            'name','site_control','region','riders_count','hospital_type']
+
+def merge_hospitals(tx_all: pd.DataFrame, hospitals_df: pd.DataFrame, filters: Dict[str, list]) -> pd.DataFrame:
+    """transactions + คุณสมบัติโรงพยาบาล (left merge) แล้วกรองตามตัวกรองทั้งหมด"""
+    if not tx_all.empty:
+        d = tx_all.merge(hospitals_df, left_on='hospital_id', right_on='id', how='left', suffixes=('','_h'))
+    else:
+        d = pd.DataFrame(columns=ROW_COLS)
+    for col, values in filters.items():
+        if col in d.columns:
+            d = d[d[col].isin(values)]
+    return d
+
+def export_sheets(rows: pd.DataFrame, agg: dict, start: date, end: date) -> Dict[str, pd.DataFrame]:
+    """ชีตของไฟล์ส่งออก ('filtered' ใช้เป็น CSV ด้วย)"""
+    df_csv = rows[(rows['date'] >= start) & (rows['date'] <= end)]   # date เป็น datetime.date → CSV/Excel เป็นวันที่อยู่แล้ว
+    daily = agg['daily'][(agg['daily']['date'] >= start) & (agg['daily']['date'] <= end)]
+    return {"filtered": df_csv,
+            "by_hospital": agg['by_hospital'][['name','transactions_count']],
+            "by_site": agg['by_site'][['site_control','transactions_count','riders_active']],
+            "daily": daily}
+
+def safe_cols(df: pd.DataFrame, cols: List[str]) -> List[str]:
+    return [c for c in cols if c in df.columns]
+
+def df_to_excel_bytes(sheets: Dict[str, pd.DataFrame]) -> bytes:
+    """.xlsx แบบ streaming ไม่ copy DataFrame วันที่เป็น cell วันที่ (ดู excel_export.py)"""
+    return to_xlsx_bytes(sheets)
+
+# ---------- Dashboard aggregates ----------
+AGG_FRAMES = {
+    'by_site': ['site_control','transactions_count','riders_active','riders_count'],
+    'by_type': ['hospital_type','transactions_count','riders_active','riders_total','hospitals_count'],
+    'by_hospital': ['name','transactions_count','riders_active'],
+    'daily': ['date','transactions_count','riders_active'],
+}
+
+def aggregate_dashboard(df_all_no_date: pd.DataFrame, start_date: date, end_date: date) -> dict:
+    """
+    คำนวณ KPI + groupby ทั้งหมดของหน้า dashboard จากแถวที่ merge/กรองแล้ว (pandas fallback)
+    - df_all_no_date: ผ่านตัวกรองโรงพยาบาลแล้ว แต่ยังครอบคลุมช่วงย้อนหลัง/ต้นเดือน
+    - daily ครอบคลุมทั้งช่วงที่โหลด (ใช้เติมกราฟย้อนหลัง)
+    """
+    d = df_all_no_date
+    df = d[(d['date'] >= start_date) & (d['date'] <= end_date)]
+    month = d[(d['date'] >= end_date.replace(day=1)) & (d['date'] <= end_date)]
+
+    by_site = df.groupby('site_control').agg(transactions_count=('transactions_count','sum'),
+                                            riders_active=('riders_active','sum'),
+                                            riders_count=('riders_count','sum')).reset_index()
+    if 'hospital_type' in df.columns:
+        by_type = df.groupby('hospital_type', dropna=True).agg(transactions_count=('transactions_count','sum'),
+                                                              riders_active=('riders_active','sum'),
+                                                              riders_total=('riders_count','sum'),
+                                                              hospitals_count=('hospital_id','nunique')).reset_index()
+    else:   # ตาราง hospitals ไม่มีคอลัมน์ประเภท → ไม่มีกราฟตามประเภท
+        by_type = pd.DataFrame(columns=AGG_FRAMES['by_type'])
+    by_hosp = df.groupby('name').agg(transactions_count=('transactions_count','sum'),
+                                     riders_active=('riders_active','sum')).reset_index()
+    daily = d.groupby('date').agg(transactions_count=('transactions_count','sum'),
+                                  riders_active=('riders_active','sum')).reset_index()
+    kpi = {
+        'total_tx': int(df['transactions_count'].sum()) if not df.empty else 0,
+        'hospitals': int(df['hospital_id'].nunique()) if not df.empty else 0,
+        'riders_cap': int(df['riders_count'].fillna(0).sum()) if not df.empty else 0,
+        'avg_day': int(round(df.groupby('date')['transactions_count'].sum().mean())) if not df.empty else 0,
+        'riders_active': int(df['riders_active'].sum()) if not df.empty else 0,
+        'month_accum': int(month['transactions_count'].sum()) if not month.empty else 0,
+    }
+    return {'kpi': kpi, 'by_site': by_site, 'by_type': by_type, 'by_hospital': by_hosp, 'daily': daily}
+
+# ---------- Daily trend ----------
+BACKFILL_OPTIONS = {'ไม่เติม':0,'ย้อนหลัง 7 วัน':7,'ย้อนหลัง 14 วัน':14,'ย้อนหลัง 30 วัน':30}
+BACKFILL_MAX_DAYS = max(BACKFILL_OPTIONS.values())
+
+# ---------- Chart builders ----------
+def empty_figure(text: str = "ไม่มีข้อมูล", font_size: int | None = None) -> go.Figure:
+    fig = go.Figure()
+    fig.add_annotation(text=text, x=0.5, y=0.5, showarrow=False,
+                       **({'font': dict(size=font_size)} if font_size else {}))
+    fig.update_xaxes(visible=False); fig.update_yaxes(visible=False)
+    fig.update_layout(height=360, margin=dict(l=0,r=0,t=10,b=10))
+    return fig
+
+def donut_figure(df: pd.DataFrame, names: str, palette: List[str], dark: bool, total_font: int = 18) -> go.Figure:
+    pie = px.pie(df, names=names, values='transactions_count',
+                 color=names, color_discrete_sequence=palette, hole=0.55)
+    pie.update_traces(textposition='outside',
+                      texttemplate='<b>%{label}</b><br>%{value:,} (%{percent:.1%})',
+                      marker=dict(line=dict(color=('#fff' if not dark else '#111'), width=2)),
+                      pull=[0.02]*len(df))
+    pie.update_layout(annotations=[dict(text=f"{int(df['transactions_count'].sum()):,}<br>รวม", x=0.5, y=0.5,
+                                        showarrow=False, font=dict(size=total_font))])
+    return pie
+
+def daily_trend_figure(daily_sel: pd.DataFrame, daily_back: pd.DataFrame) -> go.Figure:
+    """กราฟแนวโน้มรายวัน (ช่วงที่เลือก + ช่วงย้อนหลังแบบเส้นประ)"""
+    fig = go.Figure()
+
+    if not daily_back.empty:
+        x_back = weekday_labels(daily_back['date'])
+        fig.add_trace(go.Scatter(
+            x=x_back,
+            y=daily_back['transactions_count'],
+            mode='lines+markers+text',
+            name='ย้อนหลัง (Transactions)',
+            text=daily_back['transactions_count'],
+            textposition='top center',
+            textfont=dict(size=10),
+            line=dict(width=2, dash='dot'),
+            line_shape='spline',
+            opacity=0.85
+        ))
+        fig.add_trace(go.Scatter(
+            x=x_back,
+            y=daily_back['riders_active'],
+            mode='lines+markers+text',
+            name='ย้อนหลัง (Rider Active)',
+            text=daily_back['riders_active'],
+            textposition='top center',
+            textfont=dict(size=10),
+            line=dict(width=1.5, dash='dot'),
+            line_shape='spline',
+            opacity=0.7,
+            visible='legendonly'
+        ))
+
+    if not daily_sel.empty:
+        x_sel = weekday_labels(daily_sel['date'])
+        fig.add_trace(go.Scatter(
+            x=x_sel,
+            y=daily_sel['transactions_count'],
+            mode='lines+markers+text',
+            name='Transactions',
+            text=daily_sel['transactions_count'],
+            textposition='top center',
+            line=dict(width=3),
+            line_shape='spline'
+        ))
+        fig.add_trace(go.Scatter(
+            x=x_sel,
+            y=daily_sel['riders_active'],
+            mode='lines+markers+text',
+            name='Rider Active',
+            text=daily_sel['riders_active'],
+            textposition='top center',
+            line=dict(width=2, dash='dot'),
+            line_shape='spline',
+            visible='legendonly'
+        ))
+
+    fig.update_layout(
+        xaxis_title='วัน/เดือน/ปี', yaxis_title='จำนวน',
+        xaxis_tickangle=-40,
+        margin=dict(t=30, r=20, b=80, l=60)
+    )
+    return fig
+
+def type_bar_figure(gtype: pd.DataFrame, palette: List[str]) -> go.Figure:
+    bar_t = px.bar(
+        gtype, y='hospital_type', x='transactions_count', orientation='h',
+        text='transactions_count',
+        color='hospital_type', color_discrete_sequence=palette
+    )
+    bar_t.update_traces(textposition='outside')
+    bar_t.update_layout(showlegend=False, margin=dict(l=160,r=40,t=30,b=30),
+                        yaxis_title='ประเภท', xaxis_title='Transactions',
+                        height=max(420, 50*len(gtype)+180))
+    return bar_t
+
+HOSPITAL_BAR_SIZES = (10, 20, 30, 50)   # จำนวนแท่งต่อหน้าของกราฟภาพรวมต่อโรงพยาบาล
+OTHERS_COLOR = '#CBD5E1'
+
+def hospital_ranking(gh: pd.DataFrame) -> pd.DataFrame:
+    """ตารางอันดับเต็ม (ตามลำดับแถวของ gh): อันดับ / ชื่อ / Transactions / สัดส่วน %"""
+    total = gh['transactions_count'].sum()
+    return pd.DataFrame({
+        'อันดับ': range(1, len(gh) + 1),
+        'โรงพยาบาล': gh['name'].to_numpy(),
+        'Transactions': gh['transactions_count'].to_numpy(),
+        'สัดส่วน (%)': (gh['transactions_count'] / total * 100).round(2).to_numpy() if total else 0.0,
+    })
+
+def hospital_page(gh: pd.DataFrame, page: int, per_page: int) -> pd.DataFrame:
+    """
+    แถวของหน้า page (นับจาก 1) ตามลำดับของ gh + แถว 'อื่น ๆ' รวมยอดโรงพยาบาลที่ไม่อยู่ในหน้านี้
+    - คอลัมน์ others=True สำหรับแถวรวม
+    """
+    lo = (page - 1) * per_page
+    part = gh.iloc[lo:lo + per_page][['name', 'transactions_count']].assign(others=False)
+    rest = len(gh) - len(part)
+    if rest > 0:
+        other = int(gh['transactions_count'].sum() - part['transactions_count'].sum())
+        part = pd.concat([part, pd.DataFrame([{'name': f'อื่น ๆ ({rest:,} แห่ง)', 'transactions_count': other,
+                                               'others': True}])], ignore_index=True)
+    return part.reset_index(drop=True)
+
+def hospital_bar_figure(gh: pd.DataFrame, palette: List[str]) -> go.Figure:
+    """
+    แท่งแนวนอน trace เดียว (สีวนตาม palette, แถว others สีเทา) แถวแรกอยู่บนสุด
+    - ใช้กับผลของ hospital_page() → จำนวนแท่ง/ความสูง/ขนาด payload ไม่ขึ้นกับจำนวนโรงพยาบาล
+    """
+    others = gh['others'].to_numpy(dtype=bool) if 'others' in gh.columns else np.zeros(len(gh), dtype=bool)
+    colors = [OTHERS_COLOR if o else palette[i % len(palette)] for i, o in enumerate(others)]
+    bar = go.Figure(go.Bar(
+        y=gh['name'], x=gh['transactions_count'], orientation='h',
+        text=gh['transactions_count'].map('{:,}'.format), textposition='outside',
+        marker_color=colors, hovertemplate='%{y}: %{x:,}<extra></extra>',
+    ))
+    bar.update_layout(
+        showlegend=False,
+        height=max(520, 30*len(gh)+200),
+        margin=dict(l=160,r=40,t=30,b=40),
+        yaxis=dict(title='ชื่อโรงพยาบาล', autorange='reversed', type='category'),
+        xaxis_title='Transactions'
+    )
+    return bar
+
+def site_table_figure(by_site: pd.DataFrame, dark: bool) -> go.Figure:
+    show_df = by_site.rename(columns={'site_control':'ทีมภูมิภาค', 'transactions_count':'Transactions',
+                                      'riders_active':'Rider_Active', 'riders_count':'Riders_Total'})
+    show_df['Transactions']  = show_df['Transactions'].map('{:,}'.format)
+    show_df['Rider_Active']  = show_df['Rider_Active'].map('{:,}'.format)
+    show_df['Riders_Total']  = show_df['Riders_Total'].map('{:,}'.format)
+
+    header_fill = '#111827' if dark else '#E6EFFF'
+    header_font = '#E5E7EB' if dark else '#1F2937'
+    header_line = '#374151' if dark else '#BFD2FF'
+    rgba = [
+        'rgba(167,199,231,0.15)','rgba(248,200,220,0.15)','rgba(182,226,211,0.15)',
+        'rgba(253,226,179,0.15)','rgba(234,215,247,0.15)','rgba(205,229,240,0.15)'
+    ]
+    row_colors = [rgba[i % len(rgba)] for i in range(len(show_df))]
+    fill_matrix = [row_colors]*len(show_df.columns)
+
+    figt = go.Figure(data=[go.Table(
+        header=dict(
+            values=[f"<b>{c}</b>" for c in show_df.columns],
+            fill_color=header_fill,
+            font=dict(color=header_font, size=13),
+            align='left', height=34,
+            line_color=header_line, line_width=1.2
+        ),
+        cells=dict(
+            values=[show_df[c] for c in show_df.columns],
+            fill_color=fill_matrix,
+            align='left', height=28
+        )
+    )])
+    figt.update_layout(margin=dict(l=0,r=0,t=0,b=0))
+    return figt
+
+# -------- PNG Builder (Server-side) --------
+PNG_ORDER = ['pie_sitecontrol','line_daily_trend','pie_hospital_type','bar_hospital_type','bar_hospital_overview']
+
+def compose_dashboard_png(pngs: List[bytes], title: str, subtitle: str, dark: bool=False) -> bytes:
+    images = []
+    for img_bytes in pngs:
+        try:
+            images.append(Image.open(io.BytesIO(img_bytes)))
+        except Exception:
+            pass
+
+    bg = (17,24,39) if dark else (248,250,252)
+    title_color = (229,231,235) if dark else (17,24,39)
+    sub_color   = (203,213,225) if dark else (55,65,81)
+
+    if not images:
+        im = Image.new("RGB", (1280, 320), bg)
+        d = ImageDraw.Draw(im); f = ImageFont.load_default()
+        d.text((40,40), title, fill=title_color, font=f)
+        d.text((40,80), subtitle, fill=sub_color, font=f)
+        buf = io.BytesIO(); im.save(buf, "PNG"); return buf.getvalue()
+
+    pad, header = 40, 140
+    width = max(i.width for i in images)
+    height = header + sum(i.height for i in images) + pad*(len(images)+1)
+    canvas = Image.new("RGB", (width+pad*2, height), bg)
+
+    d = ImageDraw.Draw(canvas); f = ImageFont.load_default()
+    d.text((pad, 16), title, fill=title_color, font=f)
+    d.text((pad, 52), subtitle, fill=sub_color, font=f)
+
+    y = header - 20
+    for im in images:
+        canvas.paste(im, (pad, y))
+        y += im.height + pad
+
+    buf = io.BytesIO()
+    canvas.save(buf, "PNG")
+    return buf.getvalue()
@@ -0,0 +1,49 @@
+# tests/conftest.py
+# ============================================================
+# ข้อมูลตัวอย่างสำหรับ test (demo_seed ด้วย seed คงที่) + ให้ import โมดูลที่ root ของ repo ได้
+# ============================================================
+
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import demo_seed  # noqa: E402
+import local_backend  # noqa: E402
+from data_cache import TableCache  # noqa: E402
+
+END = date(2025, 1, 31)
+
+
+@pytest.fixture
+def hospitals() -> pd.DataFrame:
+    return pd.DataFrame(demo_seed.generate_hospitals(12, seed=1))
+
+
+@pytest.fixture
+def transactions(hospitals) -> pd.DataFrame:
+    """transactions 45 วันถึง END (date เป็น datetime64)"""
+    tx = demo_seed.generate_transactions(hospitals.to_dict("records"), END, 45, seed=1)
+    tx["date"] = pd.to_datetime(tx["date"])
+    return tx
+
+
+@pytest.fixture
+def client(hospitals, transactions):
+    """LocalClient (SQLite ใน memory) ที่มี hospitals + transactions ชุดเดียวกับ fixture ด้านบน"""
+    client = local_backend.LocalClient(":memory:")
+    client.load_frame("hospitals", hospitals)
+    client.load_frame("transactions", transactions.assign(date=transactions["date"].dt.date.astype(str)))
+    return client
+
+
+@pytest.fixture
+def tx_cache(client) -> TableCache:
+    """TableCache ของ transactions แบบเดียวกับ streamlit_app.data_tables"""
+    return TableCache(client, "transactions", columns=("id", "hospital_id", "date", "transactions_count", "riders_active"),
+                      date_cols=("date",), int_cols=("transactions_count", "riders_active"),
+                      index_cols=("hospital_id", "date"))
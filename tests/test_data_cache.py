@@ -0,0 +1,133 @@
+from datetime import date
+
+import pytest
+
+from data_cache import TableCache, cache_key, tables_version
+
+
+@pytest.fixture
+def cache(tx_cache):
+    return tx_cache
+
+
+@pytest.fixture
+def events(cache):
+    seen = []
+    cache.subscribe(lambda removed, added: seen.append((removed, added)))
+    return seen
+
+
+def test_subscribe_before_and_after_load(cache, events, transactions):
+    cache.refresh()
+    assert len(events) == 1
+    removed, added = events[0]
+    assert removed is None and len(added) == len(transactions)
+    late = []
+    cache.subscribe(lambda removed, added: late.append((removed, added)))
+    assert late[0][0] is None and late[0][1] is cache.frame   # ตั้งต้นทันทีเมื่อโหลดแล้ว
+
+
+def test_upsert_partial_update_reports_old_row(cache, events):
+    frame = cache.snapshot()
+    old = frame.iloc[3]
+    version = cache.version
+    cache.upsert_rows([{"id": old["id"], "transactions_count": int(old["transactions_count"]) + 5}])
+
+    removed, added = events[-1]
+    assert list(removed["id"]) == [old["id"]]
+    assert int(removed["transactions_count"].iloc[0]) == int(old["transactions_count"])
+    row = added.iloc[0]
+    assert row["transactions_count"] == old["transactions_count"] + 5
+    assert row["riders_active"] == old["riders_active"] and row["hospital_id"] == old["hospital_id"]
+    assert cache.version == version + 1 and len(cache.frame) == len(frame)
+
+
+def test_upsert_new_row(cache, events, hospitals):
+    n = len(cache.snapshot())
+    cache.upsert_rows([{"id": "new-1", "hospital_id": hospitals["id"][0], "date": "2030-01-05",
+                        "transactions_count": 7, "riders_active": 1}])
+    removed, added = events[-1]
+    assert removed.empty and list(added["id"]) == ["new-1"]
+    assert len(cache.frame) == n + 1
+    assert cache.lookup(hospitals["id"][0], date(2030, 1, 5))["transactions_count"] == 7
+
+
+def test_merge_drops_duplicate_keys(cache, events):
+    frame = cache.snapshot()
+    key = frame["id"].iloc[0]
+    cache._merge(cache._normalize([{**frame.iloc[0].to_dict(), "transactions_count": 1},
+                                   {**frame.iloc[0].to_dict(), "transactions_count": 2}]))
+    removed, added = events[-1]
+    assert len(removed) == 1 and len(added) == 1
+    assert (cache.frame["id"] == key).sum() == 1
+    assert int(cache.frame.loc[cache.frame["id"] == key, "transactions_count"].iloc[0]) == 2
+
+
+def test_delete_where(cache, events, hospitals):
+    frame = cache.snapshot()
+    hid = hospitals["id"][1]
+    n = cache.delete_where("hospital_id", [hid])
+    assert n == int((frame["hospital_id"] == hid).sum()) > 0
+    removed, added = events[-1]
+    assert len(removed) == n and added.empty
+    assert not (cache.frame["hospital_id"] == hid).any()
+    assert cache.delete_where("hospital_id", [hid]) == 0 and events[-1][0] is removed
+
+
+def test_lookup_tracks_updates(cache, hospitals):
+    frame = cache.snapshot()
+    row = frame.iloc[0]
+    day = row["date"].date()
+    assert cache.lookup(row["hospital_id"], day)["id"] == row["id"]
+    cache.delete_where("id", [row["id"]])
+    assert cache.lookup(row["hospital_id"], day) is None
+
+
+def test_refresh_without_writes_keeps_version(cache, events):
+    cache.refresh()
+    version, n_events = cache.version, len(events)
+    cache.refresh(force=True)
+    cache.refresh(force=True)
+    assert cache.version == version and len(events) == n_events
+
+
+def test_full_resync_without_writes_keeps_version(cache, events):
+    cache.refresh()
+    cache.upsert_rows([{"id": cache.frame["id"].iloc[0]}])   # ลำดับแถวใน frame ต่างจากที่โหลด
+    version, n_events = cache.version, len(events)
+    cache.full_every = 0
+    cache.refresh(force=True)
+    assert cache.version == version and len(events) == n_events
+
+
+def test_refresh_picks_up_changed_row(cache, events):
+    frame = cache.snapshot()
+    row = frame.iloc[0]
+    cache.client.table("transactions").update({"transactions_count": int(row["transactions_count"]) + 1}) \
+        .eq("id", row["id"]).execute()
+    version = cache.version
+    cache.refresh(force=True)
+    removed, added = events[-1]
+    assert cache.version == version + 1
+    assert list(removed["id"]) == [row["id"]] and list(added["id"]) == [row["id"]]
+    assert int(added["transactions_count"].iloc[0]) == int(row["transactions_count"]) + 1
+
+
+def test_export_key_stable_without_writes(client, cache):
+    hosp = TableCache(client, "hospitals")
+
+    def key():
+        cache.refresh(force=True)
+        hosp.refresh(force=True)
+        return cache_key(filters={"site_control": ["ทีมใต้"]}, start=date(2025, 1, 1), end=date(2025, 1, 31),
+                         version=tables_version(cache, hosp), dark=False)
+
+    first = key()
+    assert key() == first
+    cache.delete_where("id", [cache.frame["id"].iloc[0]])
+    assert key() != first
+
+
+def test_cache_key_ignores_argument_order():
+    assert cache_key(a=1, b=date(2025, 1, 1)) == cache_key(b=date(2025, 1, 1), a=1)
+    assert cache_key(a=1) != cache_key(a=2)
@@ -0,0 +1,30 @@
+from datetime import date
+
+import pandas as pd
+
+import demo_seed
+import local_backend
+
+
+def test_reseed_skips_existing_hospitals():
+    client = local_backend.LocalClient(":memory:")
+    first = demo_seed.seed(client, 5, 3, end=date(2025, 1, 31), seed_value=1)
+    again = demo_seed.seed(client, 5, 3, end=date(2025, 1, 31), seed_value=2)   # seed อื่น → จังหวัดในชื่อต่างกัน
+    assert len(first["hospitals"]) == 5 and again["hospitals"] == [] and again["transactions"].empty
+    more = demo_seed.seed(client, 8, 3, end=date(2025, 1, 31), seed_value=1)
+    assert [h["name"][len(demo_seed.DEMO_PREFIX):][:4] for h in more["hospitals"]] == ["0006", "0007", "0008"]
+    assert demo_seed.existing_numbers(client) == set(range(1, 9))
+    assert len(client.table("transactions").select("id").execute().data) == 8 * 3
+
+
+def test_generate_hospitals_skip_keeps_other_rows():
+    full = demo_seed.generate_hospitals(6, seed=3)
+    part = demo_seed.generate_hospitals(6, seed=3, skip={2, 5})
+    assert [h["name"] for h in part] == [full[i]["name"] for i in (0, 2, 3, 5)]
+
+
+def test_created_at_is_utc():
+    hospitals = demo_seed.generate_hospitals(2, seed=1)
+    tx = demo_seed.generate_transactions(hospitals, date(2025, 1, 31), 2, seed=1)
+    ts = pd.to_datetime(tx["created_at"], format="ISO8601")
+    assert str(ts.dt.tz) == "UTC"
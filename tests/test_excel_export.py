@@ -0,0 +1,40 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from excel_export import SHEET_NAME_MAX, sheet_parts, to_xlsx_bytes
+
+
+def test_sheet_parts_single():
+    assert list(sheet_parts("daily", 0, max_rows=5)) == [("daily", 0, 0)]
+    assert list(sheet_parts("daily", 4, max_rows=5)) == [("daily", 0, 4)]
+
+
+def test_sheet_parts_split():
+    assert list(sheet_parts("daily", 9, max_rows=5)) == [("daily", 0, 4), ("daily_2", 4, 8), ("daily_3", 8, 9)]
+
+
+def test_sheet_parts_long_name():
+    name = "x" * 40
+    parts = [p for p, _, _ in sheet_parts(name, 10, max_rows=5)]
+    assert all(len(p) <= SHEET_NAME_MAX for p in parts)
+    assert parts[0] == name[:SHEET_NAME_MAX] and parts[2].endswith("_3")
+
+
+def test_round_trip():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-01-01", "2025-01-02", None]),
+        "name": ["ก", None, "ค"],
+        "n": [1, 2, 3],
+        "models": [["a", "b"], "x", None],
+    })
+    wb = load_workbook(io.BytesIO(to_xlsx_bytes({"rows": df}, max_rows=3)))
+    assert wb.sheetnames == ["rows", "rows_2"]
+    rows = [r for ws in wb for r in ws.iter_rows(min_row=2, values_only=True)]
+    assert [c.value for c in wb["rows"][1]] == ["date", "name", "n", "models"]
+    assert rows[0] == (datetime(2025, 1, 1), "ก", 1, "['a', 'b']")
+    assert rows[1] == (datetime(2025, 1, 2), None, 2, "x")
+    assert rows[2] == (None, "ค", 3, None)
+    assert wb["rows"]["A2"].is_date
@@ -0,0 +1,83 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from data_cache import TableCache
+from filter_cube import CubeCache, FilterCube
+from telemed_core import AGG_FRAMES, aggregate_dashboard, merge_hospitals
+
+START, END, LOAD_FROM = date(2025, 1, 10), date(2025, 1, 31), date(2024, 12, 20)
+
+
+def pandas_aggregate(tx: pd.DataFrame, hospitals: pd.DataFrame, filters: dict) -> dict:
+    rows = tx.assign(date=tx["date"].dt.date)
+    rows = rows[rows["date"] >= LOAD_FROM]
+    return aggregate_dashboard(merge_hospitals(rows, hospitals, filters), START, END)
+
+
+def cube_aggregate(tx: pd.DataFrame, hospitals: pd.DataFrame, filters: dict) -> dict:
+    return FilterCube.build(tx, hospitals).aggregate(START, END, LOAD_FROM, filters)
+
+
+def assert_same(expected: dict, got: dict) -> None:
+    assert got["kpi"] == expected["kpi"]
+    for key, cols in AGG_FRAMES.items():
+        e = expected[key][cols].sort_values(cols[0]).reset_index(drop=True)
+        g = got[key][cols].sort_values(cols[0]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(g, e, check_dtype=False, check_index_type=False)
+
+
+def _filters(hospitals: pd.DataFrame) -> list:
+    sites = sorted(hospitals["site_control"].dropna().unique())
+    types = sorted(hospitals["hospital_type"].dropna().unique())
+    return [{}, {"site_control": sites[:1]}, {"hospital_type": types[:2]},
+            {"site_control": sites, "name": list(hospitals["name"][:5])}]
+
+
+@pytest.mark.parametrize("case", range(4))
+def test_aggregate_matches_pandas(transactions, hospitals, case):
+    filters = _filters(hospitals)[case]
+    assert_same(pandas_aggregate(transactions, hospitals, filters),
+                cube_aggregate(transactions, hospitals, filters))
+
+
+def test_missing_hospital_type_column(transactions, hospitals):
+    hospitals = hospitals.drop(columns="hospital_type")
+    filters = {"hospital_type": ["รพ.ชุมชน"]}   # ตัวกรองของคอลัมน์ที่ไม่มีถูกข้าม
+    expected = pandas_aggregate(transactions, hospitals, filters)
+    got = cube_aggregate(transactions, hospitals, filters)
+    assert_same(expected, got)
+    assert got["kpi"]["total_tx"] > 0
+    assert got["kpi"]["hospitals"] == len(hospitals)
+    assert got["by_type"].empty and list(got["by_type"].columns) == AGG_FRAMES["by_type"]
+
+
+def test_transactions_without_hospital_row(transactions, hospitals):
+    # โรงพยาบาลที่ถูกลบไปแล้ว: นับใน KPI (left merge) แต่ไม่มีชื่อ/ทีม
+    known = hospitals.iloc[1:]
+    expected = pandas_aggregate(transactions, known, {})
+    got = cube_aggregate(transactions, known, {})
+    assert_same(expected, got)
+    assert got["kpi"]["hospitals"] == len(hospitals)
+
+
+def test_empty_range(transactions, hospitals):
+    got = FilterCube.build(transactions, hospitals).aggregate(date(2030, 1, 1), date(2030, 1, 31), None, {})
+    assert got["kpi"] == dict.fromkeys(got["kpi"], 0)
+    assert got["by_hospital"].empty and got["daily"].empty
+
+
+def test_cube_cache_reuses_cube_until_data_changes(client, tx_cache):
+    hosp_cache = TableCache(client, "hospitals")
+    cubes = CubeCache()
+    first = cubes.get(tx_cache, hosp_cache)
+    tx_cache.refresh(force=True)
+    hosp_cache.refresh(force=True)
+    assert cubes.get(tx_cache, hosp_cache) is first
+
+    row = tx_cache.frame.iloc[0]
+    tx_cache.upsert_rows([{"id": row["id"], "transactions_count": int(row["transactions_count"]) + 1}])
+    second = cubes.get(tx_cache, hosp_cache)
+    assert second is not first
+    assert second.tx.sum() == first.tx.sum() + 1
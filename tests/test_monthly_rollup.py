@@ -0,0 +1,110 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import monthly_rollup as mr
+
+
+def expected_months(frame: pd.DataFrame) -> pd.DataFrame:
+    f = frame.assign(month=frame["date"].values.astype("datetime64[M]"))
+    return (f.groupby(["month", "hospital_id"])
+            .agg(transactions_count=("transactions_count", "sum"),
+                 riders_active=("riders_active", "sum"), days=("id", "size"))
+            .reset_index())
+
+
+def assert_matches(roll: mr.MonthlyRollup, frame: pd.DataFrame) -> None:
+    exp = expected_months(frame)
+    assert sum(len(h) for h in roll.by_hosp.values()) == len(exp)
+    for m, part in exp.groupby("month"):
+        got = roll.month(pd.Timestamp(m).date()).sort_values("hospital_id").reset_index(drop=True)
+        want = part.drop(columns="month").sort_values("hospital_id").reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, want, check_dtype=False)
+    daily = frame.groupby(frame["date"].dt.date)[["transactions_count", "riders_active"]].sum()
+    got = roll.daily(date(2000, 1, 1), date(2100, 1, 1)).set_index("date")
+    pd.testing.assert_frame_equal(got, daily, check_dtype=False, check_names=False)
+
+
+def test_apply_add_then_remove(transactions):
+    roll = mr.MonthlyRollup()
+    roll.apply(None, transactions)
+    assert_matches(roll, transactions)
+    part = transactions[transactions["date"] < "2025-01-01"]
+    roll.apply(part, None)
+    assert_matches(roll, transactions.drop(part.index))
+    assert date(2024, 12, 1) not in roll.by_hosp   # เดือนที่ไม่เหลือแถวถูกลบทิ้ง
+    roll.apply(transactions.drop(part.index), None)
+    assert roll.by_hosp == {} and roll.by_day == {}
+
+
+def test_apply_update_keeps_days(transactions):
+    roll = mr.MonthlyRollup()
+    roll.reset(transactions)
+    old = transactions.iloc[[0]]
+    new = old.assign(transactions_count=old["transactions_count"] + 10)
+    roll.apply(old, new)
+    m = roll.month(old["date"].iloc[0].date()).set_index("hospital_id").loc[old["hospital_id"].iloc[0]]
+    before = transactions[(transactions["hospital_id"] == old["hospital_id"].iloc[0])
+                          & (transactions["date"].dt.to_period("M") == old["date"].iloc[0].to_period("M"))]
+    assert m["transactions_count"] == before["transactions_count"].sum() + 10
+    assert m["days"] == len(before)
+
+
+def test_follows_table_cache(hospitals, tx_cache):
+    cache = tx_cache
+    roll = mr.MonthlyRollup()
+    cache.subscribe(roll.on_change)
+    cache.refresh()
+    assert_matches(roll, cache.frame)
+
+    row = cache.frame.iloc[5]
+    cache.upsert_rows([{"id": row["id"], "transactions_count": int(row["transactions_count"]) + 100}])
+    assert_matches(roll, cache.frame)
+    cache.upsert_rows([{"id": "new-1", "hospital_id": hospitals["id"][0], "date": "2030-01-05",
+                        "transactions_count": 7, "riders_active": 1}])
+    assert_matches(roll, cache.frame)
+    cache.delete_where("hospital_id", [hospitals["id"][1]])
+    assert_matches(roll, cache.frame)
+    cache.delete_where("id", ["new-1"])
+    assert_matches(roll, cache.frame)
+    assert date(2030, 1, 1) not in roll.by_hosp
+
+
+def test_totals_and_compare(transactions):
+    roll = mr.MonthlyRollup()
+    roll.reset(transactions)
+    totals = roll.totals(date(2024, 12, 1), date(2025, 1, 31))
+    assert list(totals["month"]) == [date(2024, 12, 1), date(2025, 1, 1)]
+    jan = transactions[transactions["date"] >= "2025-01-01"]
+    assert totals["transactions_count"].iloc[1] == jan["transactions_count"].sum()
+    cmp = mr.compare_months(totals, date(2025, 1, 15))
+    assert cmp["current"]["month"] == date(2025, 1, 1)
+    assert cmp["prev_month"]["month"] == date(2024, 12, 1)
+    assert cmp["prev_year"] is None
+
+
+@pytest.mark.parametrize("m, n, expected", [
+    (date(2025, 1, 1), -1, date(2024, 12, 1)),
+    (date(2025, 1, 1), -12, date(2024, 1, 1)),
+    (date(2024, 11, 1), 3, date(2025, 2, 1)),
+])
+def test_add_months(m, n, expected):
+    assert mr.add_months(m, n) == expected
+
+
+def test_month_end():
+    assert mr.month_end(date(2024, 2, 1)) == date(2024, 2, 29)
+    assert mr.month_end(date(2024, 12, 1)) == date(2024, 12, 31)
+
+
+def test_unchanged_refresh_keeps_rollup_version(tx_cache):
+    roll = mr.MonthlyRollup()
+    tx_cache.subscribe(roll.on_change)
+    tx_cache.refresh()
+    version = roll.version
+    tx_cache.refresh(force=True)
+    tx_cache.refresh(force=True)
+    assert roll.version == version
+    tx_cache.delete_where("id", [tx_cache.frame["id"].iloc[0]])
+    assert roll.version == version + 1
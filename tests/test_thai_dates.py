@@ -0,0 +1,25 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from thai_dates import date_labels, th_date, weekday_labels
+
+
+def test_th_date():
+    assert th_date(date(2024, 1, 5)) == "5 ม.ค. 2567"
+
+
+def test_labels_match_scalar():
+    days = pd.date_range("2023-12-25", "2024-03-05", freq="D")
+    assert list(date_labels(days)) == [th_date(d.date()) for d in days]
+
+
+def test_weekday_labels():
+    assert list(weekday_labels([date(2024, 1, 5), date(2024, 1, 8)])) == ["วันศุกร์ 5/1/24", "วันจันทร์ 8/1/24"]
+
+
+def test_mixed_inputs_and_missing():
+    out = date_labels(np.array([date(2024, 2, 29), None, "2024-12-31", pd.Timestamp("2024-02-29")], dtype=object))
+    assert list(out) == ["29 ก.พ. 2567", "", "31 ธ.ค. 2567", "29 ก.พ. 2567"]
+    assert len(date_labels([])) == 0
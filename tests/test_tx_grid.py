@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+import tx_grid
+from tx_grid import GridQuery, TxGrid
+
+
+@pytest.fixture
+def grid(client):
+    g = TxGrid(client, cache_size=4, prefetch=0)
+    yield g
+    g._pool.shutdown(wait=True)
+
+
+def all_pages(grid: TxGrid, q: GridQuery, version=1) -> pd.DataFrame:
+    first, total = grid.page(q, version, 0)
+    parts = [first] + [grid.page(q, version, p)[0] for p in range(1, grid.pages(q, version))]
+    out = pd.concat(parts, ignore_index=True)
+    assert len(out) == total
+    return out
+
+
+@pytest.mark.parametrize("sort, desc", [("date", True), ("transactions_count", False)])
+def test_chunked_hospital_filter_matches_single_query(client, hospitals, monkeypatch, sort, desc):
+    q = GridQuery(hospital_ids=tuple(sorted(hospitals["id"][:7])), sort=sort, desc=desc, page_size=25)
+    expected = all_pages(TxGrid(client, prefetch=0), q)
+    monkeypatch.setattr(tx_grid, "IN_CHUNK", 3)   # 7 โรงพยาบาล → 3 ก้อน
+    got = all_pages(TxGrid(client, prefetch=0), q)
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_caches_are_bounded(grid):
+    for version in range(10):
+        grid.page(GridQuery(page_size=25), version, 0)
+    assert len(grid._pages) <= grid.cache_size and len(grid._totals) <= grid.cache_size
+    assert grid.total(GridQuery(page_size=25), 9) is not None
+    assert grid.total(GridQuery(page_size=25), 0) is None
+
+
+def test_empty_selection(grid):
+    rows, total = grid.page(GridQuery(hospital_ids=()), 1, 0)
+    assert rows.empty and total == 0
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from tx_import import REQUIRED_COLS, validate
+
+NAME2ID = {"รพ.ก": "h1", "รพ.ข": "h2"}
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=list(REQUIRED_COLS))
+
+
+def test_valid_rows():
+    ok, rej, missing = validate(frame([("รพ.ก", "2025-01-05", 3, 1), (" รพ.ข ", "2025/01/06", "4", 0)]), NAME2ID)
+    assert rej.empty and missing == []
+    assert list(ok["hospital_id"]) == ["h1", "h2"]
+    assert list(ok["date"]) == ["2025-01-05", "2025-01-06"]
+    assert list(ok["transactions_count"]) == [3, 4] and list(ok["row"]) == [2, 3]
+
+
+def test_rejects_keep_file_row():
+    ok, rej, _ = validate(frame([
+        ("", "2025-01-05", 1, 1),
+        ("รพ.ก", "ไม่ใช่วันที่", 1, 1),
+        ("รพ.ก", "2025-01-06", -1, 1),
+        ("รพ.ก", "2025-01-07", 1, 1.5),
+        ("รพ.ไม่มี", "2025-01-08", 1, 1),
+        ("รพ.ก", "2025-01-09", 1, 1),
+    ]), NAME2ID, row_offset=10)
+    assert list(ok["row"]) == [17]
+    assert list(rej["row"]) == [12, 13, 14, 15, 16]
+    assert rej["error"].str.len().gt(0).all()
+
+
+def test_duplicates_keep_last():
+    ok, rej, _ = validate(frame([("รพ.ก", "2025-01-05", 1, 0), ("รพ.ก", "2025-01-05", 9, 0)]), NAME2ID)
+    assert list(ok["transactions_count"]) == [9]
+    assert list(rej["row"]) == [2]
+
+
+def test_auto_create_lists_missing():
+    ok, rej, missing = validate(frame([("รพ.ใหม่", "2025-01-05", 1, 0), ("รพ.ก", "2025-01-05", 1, 0)]),
+                                NAME2ID, auto_create=True)
+    assert rej.empty and missing == ["รพ.ใหม่"]
+    assert ok["hospital_id"].isna().sum() == 1
+
+
+def test_blank_trailing_rows_ignored():
+    ok, rej, _ = validate(frame([("รพ.ก", "2025-01-05", 1, 0), (None, None, None, None)]), NAME2ID)
+    assert len(ok) == 1 and rej.empty
@@ -0,0 +1,88 @@
+# thai_dates.py
+# ============================================================
+# ป้ายวันที่ภาษาไทยแบบ vectorized (ใช้กับแกนกราฟและตาราง)
+# - แยก วัน/เดือน/ปี/วันในสัปดาห์ ด้วย datetime64 arithmetic ทั้ง array
+# - คำนวณเฉพาะวันที่ไม่ซ้ำ แล้วกระจายกลับด้วย inverse index
+# - ป้ายของแต่ละวันจำไว้ต่อ process (วันเดียวกันไม่ต้องสร้างสตริงใหม่)
+# ============================================================
+
+from __future__ import annotations
+
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+TH_MONTHS = ["ม.ค.","ก.พ.","มี.ค.","เม.ย.","พ.ค.","มิ.ย.","ก.ค.","ส.ค.","ก.ย.","ต.ค.","พ.ย.","ธ.ค."]
+TH_WEEKDAYS = ['วันจันทร์','วันอังคาร','วันพุธ','วันพฤหัสบดี','วันศุกร์','วันเสาร์','วันอาทิตย์']
+BE_OFFSET = 543
+MEMO_SIZE = 20000  # จำนวนวันที่จำป้ายไว้ต่อรูปแบบ (~55 ปี)
+
+_memo = {"date": {}, "weekday": {}}
+_lock = threading.Lock()
+
+
+def th_date(d: date) -> str:
+    """วันที่เดียว: '5 ม.ค. 2567'"""
+    return f"{d.day} {TH_MONTHS[d.month-1]} {d.year+BE_OFFSET}"
+
+
+def _to_days(values) -> np.ndarray:
+    """date/Timestamp/สตริง → datetime64[D] (ค่าว่างเป็น NaT)"""
+    arr = np.asarray(values)
+    if arr.dtype.kind != "M":
+        arr = pd.to_datetime(pd.Series(arr, dtype=object), errors="coerce").to_numpy()
+    return arr.astype("datetime64[D]")
+
+
+def _parts(days: np.ndarray):
+    months = days.astype("datetime64[M]")
+    year = days.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12           # 0..11
+    day = (days - months).astype(np.int64) + 1
+    weekday = (days.astype(np.int64) + 3) % 7       # 1970-01-01 เป็นวันพฤหัสบดี → จันทร์ = 0
+    return year, month, day, weekday
+
+
+def _build(days: np.ndarray, kind: str) -> np.ndarray:
+    year, month, day, weekday = _parts(days)
+    s = lambda a: a.astype(str).astype(object)
+    if kind == "date":
+        return s(day) + " " + np.asarray(TH_MONTHS, dtype=object)[month] + " " + s(year + BE_OFFSET)
+    return (np.asarray(TH_WEEKDAYS, dtype=object)[weekday] + " " + s(day) + "/" + s(month + 1)
+            + "/" + np.char.zfill((year % 100).astype(str), 2).astype(object))
+
+
+def labels(values, kind: str = "date") -> np.ndarray:
+    """
+    ป้ายทั้ง array (object ndarray, ค่าว่างเป็น '')
+    - kind='date'    : '5 ม.ค. 2567' (ปี พ.ศ.)
+    - kind='weekday' : 'วันศุกร์ 5/1/24' (ใช้บนแกนกราฟรายวัน)
+    """
+    days = _to_days(values)
+    if not len(days):
+        return np.array([], dtype=object)
+    uniq, inv = np.unique(days, return_inverse=True)
+    ok = ~np.isnat(uniq)
+    keys = uniq.astype(np.int64)
+    memo = _memo[kind]
+    with _lock:
+        out = np.array([memo.get(k, None) if o else "" for k, o in zip(keys.tolist(), ok)], dtype=object)
+    todo = np.array([o and v is None for v, o in zip(out, ok)], dtype=bool)
+    if todo.any():
+        built = _build(uniq[todo], kind)
+        out[todo] = built
+        with _lock:
+            if len(memo) + len(built) > MEMO_SIZE:
+                memo.clear()
+            memo.update(zip(keys[todo].tolist(), built.tolist()))
+    return out[inv.reshape(-1)]
+
+
+def date_labels(values) -> np.ndarray:
+    return labels(values, "date")
+
+
+def weekday_labels(values) -> np.ndarray:
+    return labels(values, "weekday")
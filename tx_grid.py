@@ -0,0 +1,140 @@
+# tx_grid.py
+# ============================================================
+# ตาราง transactions แบบแบ่งหน้าฝั่ง server (หน้า admin)
+# - ตัวกรองโรงพยาบาล/ช่วงวัน, คอลัมน์เรียง และขนาดหน้า ส่งไปเป็น query ของ Supabase
+#   แล้วอ่านด้วย range() ทีละหน้า → ส่งไปเบราว์เซอร์แค่หน้าที่ดูอยู่
+# - จำนวนแถวทั้งหมดใช้ count='exact' มากับหน้าแรก (จำไว้ต่อชุดตัวกรอง)
+# - โรงพยาบาลที่เลือกเกิน IN_CHUNK แห่ง → query ทีละก้อนของ id (กัน URL ยาวเกิน)
+#   แต่ละก้อนอ่านแถวแรก ๆ ถึงท้ายหน้าที่ต้องการ แล้วเรียงรวมกันในแอปก่อนตัดเป็นหน้า
+# - cache หน้าและจำนวนแถวแบบ LRU + prefetch หน้าก่อน/ถัดไปใน thread เบื้องหลัง
+# - key ของ cache รวม version ของข้อมูล → เขียนแล้วหน้าเก่าไม่ถูกใช้อีก
+# ============================================================
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+GRID_COLS = ("id", "hospital_id", "date", "transactions_count", "riders_active")
+SORTABLE = ("date", "transactions_count", "riders_active")
+PAGE_SIZES = (25, 50, 100, 200)
+IN_CHUNK = 150  # จำนวน id ต่อ in_() หนึ่งครั้ง (กัน URL ยาวเกิน)
+
+
+class GridQuery(NamedTuple):
+    hospital_ids: Optional[tuple] = None   # None = ทุกโรงพยาบาล
+    start: Optional[date] = None
+    end: Optional[date] = None
+    sort: str = "date"
+    desc: bool = True
+    page_size: int = 50
+
+
+class TxGrid:
+    def __init__(self, client, cache_size: int = 24, prefetch: int = 1):
+        self.client = client
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        self._pages: OrderedDict = OrderedDict()   # (query, version, page) -> DataFrame
+        self._totals: OrderedDict = OrderedDict()  # (query, version) -> จำนวนแถว
+        self._inflight: set = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(2, thread_name_prefix="tx-grid")
+
+    # ---------- internal ----------
+    def _query(self, q: GridQuery, count: bool, ids: Optional[list] = None):
+        b = self.client.table("transactions").select(",".join(GRID_COLS), count="exact" if count else None)
+        if ids is not None:
+            b = b.in_("hospital_id", ids)
+        if q.start:
+            b = b.gte("date", q.start.isoformat())
+        if q.end:
+            b = b.lte("date", q.end.isoformat())
+        sort = q.sort if q.sort in SORTABLE else "date"
+        return b.order(sort, desc=q.desc).order("id", desc=q.desc)  # id ตัดสินลำดับให้คงที่ข้ามหน้า
+
+    def _read(self, q: GridQuery, count: bool, lo: int) -> Tuple[list, Optional[int]]:
+        """แถว lo..lo+page_size-1 ตามลำดับของ q + จำนวนแถวทั้งหมด (ถ้าขอ count)"""
+        hi = lo + q.page_size - 1
+        if q.hospital_ids is None or len(q.hospital_ids) <= IN_CHUNK:
+            ids = list(q.hospital_ids) if q.hospital_ids is not None else None
+            res = self._query(q, count, ids).range(lo, hi).execute()
+            return res.data or [], getattr(res, "count", None)
+        ids = list(q.hospital_ids)
+        rows, total = [], 0
+        for i in range(0, len(ids), IN_CHUNK):
+            res = self._query(q, count, ids[i:i + IN_CHUNK]).range(0, hi).execute()
+            rows.extend(res.data or [])
+            total = None if total is None or getattr(res, "count", None) is None else total + int(res.count)
+        sort = q.sort if q.sort in SORTABLE else "date"
+        df = pd.DataFrame(rows, columns=list(GRID_COLS))
+        df = df.sort_values([sort, "id"], ascending=not q.desc, kind="stable").iloc[lo:hi + 1]
+        return df.to_dict("records"), total
+
+    def _fetch(self, q: GridQuery, version, page: int) -> pd.DataFrame:
+        if q.hospital_ids is not None and not q.hospital_ids:
+            with self._lock:
+                self._remember(self._totals, (q, version), 0)
+            return pd.DataFrame(columns=list(GRID_COLS))
+        need_count = (q, version) not in self._totals
+        rows, count = self._read(q, need_count, page * q.page_size)
+        df = pd.DataFrame(rows, columns=list(GRID_COLS))
+        with self._lock:
+            if need_count and count is not None:
+                self._remember(self._totals, (q, version), int(count))
+            self._remember(self._pages, (q, version, page), df)
+        return df
+
+    def _remember(self, store: OrderedDict, key, value) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.cache_size:
+            store.popitem(last=False)
+
+    def _prefetch(self, q: GridQuery, version, page: int) -> None:
+        key = (q, version, page)
+        with self._lock:
+            if key in self._pages or key in self._inflight:
+                return
+            self._inflight.add(key)
+
+        def run():
+            try:
+                self._fetch(q, version, page)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+        self._pool.submit(run)
+
+    # ---------- public ----------
+    def total(self, q: GridQuery, version) -> Optional[int]:
+        with self._lock:
+            n = self._totals.get((q, version))
+            if n is not None:
+                self._totals.move_to_end((q, version))
+        return n
+
+    def pages(self, q: GridQuery, version) -> int:
+        total = self.total(q, version) or 0
+        return max(1, -(-total // q.page_size))
+
+    def page(self, q: GridQuery, version, page: int) -> Tuple[pd.DataFrame, Optional[int]]:
+        """คืน (แถวของหน้า, จำนวนแถวทั้งหมด) page นับจาก 0"""
+        with self._lock:
+            df = self._pages.get((q, version, page))
+            if df is not None:
+                self._pages.move_to_end((q, version, page))
+        if df is None:
+            df = self._fetch(q, version, page)
+        last = self.pages(q, version) - 1
+        for p in range(page - self.prefetch, page + self.prefetch + 1):
+            if p != page and 0 <= p <= last:
+                self._prefetch(q, version, p)
+        return df, self.total(q, version)
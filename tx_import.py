@@ -0,0 +1,299 @@
+# tx_import.py
+# ============================================================
+# นำเข้า transactions จาก CSV / Excel แบบ batch (ใช้ในหน้า admin แท็บ Transactions)
+# - ตรวจ/แปลงชนิดข้อมูลทั้งไฟล์ในรอบเดียว (vectorized) แถวที่ผิดเก็บเป็น rejects พร้อมเหตุผล
+# - map ชื่อโรงพยาบาล → id ด้วย dict, โรงพยาบาลที่ไม่พบสร้างทีเดียวเป็น batch
+# - เขียนด้วย upsert(on_conflict='hospital_id,date') ทีละก้อน (ต้องติดตั้ง sql/transactions_unique.sql)
+#   ถ้ายังไม่มี unique constraint → ดึง id เดิมทีละก้อนแล้ว upsert ด้วย id แทน
+# - ไฟล์ใหญ่: stream_import() อ่านทีละก้อน (CSV chunksize / XLSX openpyxl read-only)
+#   เขียนเสร็จทีละก้อนแล้วคืน rows_done ไว้เป็น checkpoint → ล้มกลางทางนำเข้าต่อจากก้อนล่าสุดได้
+#   (upsert ซ้ำก้อนเดิมได้ผลเหมือนเดิม จึง resume ได้ปลอดภัย)
+# ============================================================
+
+from __future__ import annotations
+
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from postgrest.exceptions import APIError
+
+REQUIRED_COLS = ("hospital_name", "date", "transactions_count", "riders_active")
+UPSERT_CHUNK = 500
+STREAM_CHUNK = 5000  # แถวต่อก้อนที่อ่านจากไฟล์ (1 ก้อน = 1 checkpoint)
+IN_CHUNK = 150
+CONFLICT_KEY = "hospital_id,date"
+# ไม่มี unique constraint ตรงกับ on_conflict / id ไม่มีค่า default → ใช้ทางสำรอง
+NO_CONFLICT_CODES = {"42P10", "23502"}
+
+_state = {"conflict_upsert": True}  # ต่อ process: จำว่าใช้ on_conflict ได้หรือไม่
+
+
+def new_hospital_payload(name: str, province: str = "กรุงเทพมหานคร", region: str = "ภาคกลาง") -> dict:
+    """ค่าเริ่มต้นของโรงพยาบาลที่สร้างอัตโนมัติจากไฟล์นำเข้า"""
+    return {"id": str(uuid.uuid4()), "name": name, "province": province, "region": region,
+            "site_control": "ทีมเหนือ", "system_type": "WebPortal", "riders_count": 0}
+
+
+def _reject(df: pd.DataFrame, mask: pd.Series, reason: str, out: List[pd.DataFrame]) -> pd.DataFrame:
+    if mask.any():
+        bad = df.loc[mask, list(REQUIRED_COLS) + ["row"]].copy()
+        bad["error"] = reason
+        out.append(bad)
+    return df.loc[~mask]
+
+
+def validate(df: pd.DataFrame, name2id: Dict[str, str], auto_create: bool = False,
+             row_offset: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """
+    ตรวจ/แปลงทั้งก้อน คืน (ok, rejects, ชื่อโรงพยาบาลที่ต้องสร้าง)
+    - ok: hospital_name, hospital_id (None = รอสร้าง), date (iso), transactions_count, riders_active, row
+    - row: เลขแถวในไฟล์ (นับหัวตารางเป็นแถวที่ 1) ใช้ในไฟล์ rejects
+    """
+    df = df[list(REQUIRED_COLS)].copy()
+    df["row"] = range(row_offset + 2, row_offset + 2 + len(df))
+    df = df[df[list(REQUIRED_COLS)].notna().any(axis=1)]  # แถวว่างท้ายไฟล์ Excel
+    rejects: List[pd.DataFrame] = []
+
+    name = df["hospital_name"].where(df["hospital_name"].notna(), "").astype(str).str.strip()
+    dt = pd.to_datetime(df["date"], errors="coerce", format="mixed")
+    tx = pd.to_numeric(df["transactions_count"], errors="coerce")
+    ra = pd.to_numeric(df["riders_active"], errors="coerce")
+
+    df = _reject(df, name.eq(""), "ไม่มีชื่อโรงพยาบาล", rejects)
+    df = _reject(df, dt.loc[df.index].isna(), "วันที่ไม่ถูกต้อง", rejects)
+    for col, vals in (("transactions_count", tx), ("riders_active", ra)):
+        v = vals.loc[df.index]
+        df = _reject(df, v.isna() | (v < 0) | (v != v.round()), f"{col} ต้องเป็นจำนวนเต็มไม่ติดลบ", rejects)
+
+    idx = df.index
+    out = pd.DataFrame({
+        "hospital_name": name.loc[idx],
+        "hospital_id": name.loc[idx].map(name2id),
+        "date": dt.loc[idx].dt.strftime("%Y-%m-%d"),
+        "transactions_count": tx.loc[idx].astype("int64"),
+        "riders_active": ra.loc[idx].astype("int64"),
+        "row": df["row"],
+    })
+
+    unknown = out["hospital_id"].isna()
+    if not auto_create:
+        _reject(df, unknown, "ไม่พบโรงพยาบาล", rejects)
+        out = out.loc[~unknown]
+        missing: List[str] = []
+    else:
+        missing = sorted(out.loc[unknown, "hospital_name"].unique())
+
+    # (โรงพยาบาล, วัน) ซ้ำในไฟล์ → ใช้แถวหลังสุด (upsert เดียวกันแก้แถวเดิมซ้ำไม่ได้)
+    dup = out.duplicated(["hospital_name", "date"], keep="last")
+    _reject(df.loc[out.index], dup, "ซ้ำ (โรงพยาบาล, วันที่) ในไฟล์ — ใช้แถวหลังสุด", rejects)
+    out = out.loc[~dup]
+
+    rej = pd.concat(rejects, ignore_index=True) if rejects else pd.DataFrame(columns=list(REQUIRED_COLS) + ["row", "error"])
+    return out, rej.sort_values("row", ignore_index=True), missing
+
+
+def create_hospitals(client, names: Iterable[str], provinces: Optional[Dict[str, str]] = None,
+                     chunk_size: int = UPSERT_CHUNK) -> List[dict]:
+    """สร้างโรงพยาบาลที่ไม่พบทีละ batch คืนแถวที่สร้างสำเร็จ"""
+    region = (provinces or {}).get("กรุงเทพมหานคร", "ภาคกลาง")
+    payloads = [new_hospital_payload(n, region=region) for n in names]
+    created = []
+    for i in range(0, len(payloads), chunk_size):
+        part = payloads[i:i + chunk_size]
+        res = client.table("hospitals").insert(part).execute()
+        created.extend(res.data or part)
+    return created
+
+
+def _existing_ids(client, rows: pd.DataFrame) -> Dict[Tuple[str, str], str]:
+    """(hospital_id, date) → id ของแถวที่มีอยู่แล้ว (ทางสำรองเมื่อไม่มี unique constraint)"""
+    hids = sorted(rows["hospital_id"].astype(str).unique())
+    found = {}
+    for i in range(0, len(hids), IN_CHUNK):
+        res = (client.table("transactions").select("id,hospital_id,date")
+               .in_("hospital_id", hids[i:i + IN_CHUNK])
+               .gte("date", rows["date"].min()).lte("date", rows["date"].max())
+               .execute())
+        for r in res.data or []:
+            found[(str(r["hospital_id"]), str(r["date"])[:10])] = r["id"]
+    return found
+
+
+def _write_by_id(client, part: pd.DataFrame) -> list:
+    ids = _existing_ids(client, part)
+    keys = list(zip(part["hospital_id"].astype(str), part["date"]))
+    recs = part[["hospital_id", "date", "transactions_count", "riders_active"]].to_dict("records")
+    upd = [dict(r, id=ids[k]) for r, k in zip(recs, keys) if k in ids]
+    now = datetime.now(timezone.utc).isoformat()
+    ins = [dict(r, id=str(uuid.uuid4()), created_at=now) for r, k in zip(recs, keys) if k not in ids]
+    written = []
+    if upd:
+        written.extend(client.table("transactions").upsert(upd, on_conflict="id").execute().data or [])
+    if ins:
+        written.extend(client.table("transactions").insert(ins).execute().data or [])
+    return written
+
+
+def write_chunk(client, part: pd.DataFrame) -> list:
+    """upsert หนึ่งก้อน (ไม่ส่ง id/created_at → แถวเดิมคงค่าเดิม แถวใหม่ใช้ค่า default ของตาราง)"""
+    if part.empty:
+        return []
+    if _state["conflict_upsert"]:
+        recs = part[["hospital_id", "date", "transactions_count", "riders_active"]].to_dict("records")
+        try:
+            return client.table("transactions").upsert(recs, on_conflict=CONFLICT_KEY).execute().data or []
+        except APIError as e:
+            if e.code not in NO_CONFLICT_CODES:
+                raise
+            _state["conflict_upsert"] = False
+    return _write_by_id(client, part)
+
+
+def upsert_transactions(client, rows: pd.DataFrame, chunk_size: int = UPSERT_CHUNK,
+                        on_chunk=None, strict: bool = False) -> Tuple[list, pd.DataFrame]:
+    """
+    เขียน rows (ผลจาก validate ที่มี hospital_id ครบแล้ว) ทีละ chunk_size แถว
+    - ก้อนที่ล้มเหลว → แถวในก้อนนั้นเป็น rejects พร้อมข้อความ error (strict=True → raise แทน)
+    - on_chunk(done, total): callback หลังเขียนแต่ละก้อน
+    """
+    written, failed = [], []
+    total = len(rows)
+    for i in range(0, total, chunk_size):
+        part = rows.iloc[i:i + chunk_size]
+        try:
+            written.extend(write_chunk(client, part))
+        except Exception as e:
+            if strict:
+                raise
+            bad = part[["hospital_name", "date", "transactions_count", "riders_active", "row"]].copy()
+            bad["error"] = f"บันทึกไม่สำเร็จ: {getattr(e, 'message', None) or e}"
+            failed.append(bad)
+        if on_chunk:
+            on_chunk(min(i + chunk_size, total), total)
+    rej = pd.concat(failed, ignore_index=True) if failed else pd.DataFrame(columns=list(REQUIRED_COLS) + ["row", "error"])
+    return written, rej
+
+
+def import_frame(client, df: pd.DataFrame, name2id: Dict[str, str], auto_create: bool = False,
+                 provinces: Optional[Dict[str, str]] = None, row_offset: int = 0,
+                 chunk_size: int = UPSERT_CHUNK, on_chunk=None, strict: bool = False,
+                 on_hospitals: Optional[Callable[[List[dict]], None]] = None) -> dict:
+    """
+    pipeline เต็ม: validate → สร้างโรงพยาบาลที่ขาด → upsert
+    name2id ถูกเติมโรงพยาบาลที่สร้างใหม่ (ใช้ต่อกับก้อนถัดไปได้)
+    - on_hospitals(rows): เรียกทันทีหลังสร้างโรงพยาบาล (ก่อนเขียน transactions)
+    - strict: ข้อผิดพลาดตอนเขียน → raise (ใช้กับ stream_import เพื่อ resume)
+    คืน {'written', 'new_hospitals', 'rejects', 'rows'}
+    """
+    ok, rejects, missing = validate(df, name2id, auto_create, row_offset)
+    new_hosp = []
+    if missing:
+        try:
+            new_hosp = create_hospitals(client, missing, provinces)
+            name2id.update({h["name"]: h["id"] for h in new_hosp})
+            if on_hospitals:
+                on_hospitals(new_hosp)
+        except Exception as e:
+            if strict:
+                raise
+            msg = f"สร้างโรงพยาบาลไม่สำเร็จ: {getattr(e, 'message', None) or e}"
+            failed = ok["hospital_name"].isin(missing)
+            bad = ok.loc[failed, list(REQUIRED_COLS) + ["row"]].copy()
+            bad["error"] = msg
+            rejects = pd.concat([rejects, bad], ignore_index=True)
+            ok = ok.loc[~failed]
+        ok = ok.assign(hospital_id=ok["hospital_name"].map(name2id))
+    written, failed = upsert_transactions(client, ok, chunk_size, on_chunk, strict)
+    if not failed.empty:
+        rejects = pd.concat([rejects, failed], ignore_index=True)
+    return {"written": written, "new_hospitals": new_hosp,
+            "rejects": rejects.sort_values("row", ignore_index=True), "rows": len(df)}
+
+
+# ---------- streaming (ไฟล์ใหญ่) ----------
+def is_excel(filename: str) -> bool:
+    return filename.lower().endswith((".xlsx", ".xlsm"))
+
+
+def file_fingerprint(f, filename: str) -> str:
+    """ระบุไฟล์สำหรับ checkpoint (ชื่อ + ขนาด + hash ของ 1 MB แรก)"""
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(0)
+    head = f.read(1 << 20)
+    f.seek(0)
+    return hashlib.sha1(f"{filename}|{size}|".encode("utf-8") + head).hexdigest()
+
+
+def _count_lines(f, block: int = 1 << 20) -> int:
+    """นับบรรทัดทีละ block (ไม่ต้องโหลดทั้งไฟล์เป็นสตริง) ใช้ทำ progress"""
+    f.seek(0)
+    n, last = 0, b"\n"
+    while True:
+        buf = f.read(block)
+        if not buf:
+            break
+        n += buf.count(b"\n")
+        last = buf[-1:]
+    f.seek(0)
+    return n + (last != b"\n")
+
+
+def iter_frames(f, filename: str, chunk_rows: int = STREAM_CHUNK,
+                skip_rows: int = 0) -> Iterator[Tuple[int, pd.DataFrame, float]]:
+    """
+    อ่านไฟล์ทีละก้อน yield (row_offset, chunk, สัดส่วนที่อ่านแล้ว 0..1)
+    - skip_rows: ข้ามแถวข้อมูลที่นำเข้าแล้ว (resume)
+    """
+    offset = skip_rows
+    if is_excel(filename):
+        from openpyxl import load_workbook
+        wb = load_workbook(f, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            total = max((ws.max_row or 0) - 1, 1)
+            rows = ws.iter_rows(values_only=True)
+            header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+            n = len(header)
+            for _ in islice(rows, skip_rows):
+                pass
+            while True:
+                batch = list(islice(rows, chunk_rows))
+                if not batch:
+                    return
+                batch = [tuple(r[:n]) + (None,) * (n - len(r)) for r in batch]
+                yield offset, pd.DataFrame(batch, columns=header), min((offset + len(batch)) / total, 1.0)
+                offset += len(batch)
+        finally:
+            wb.close()
+    else:
+        total = max(_count_lines(f) - 1, 1)
+        reader = pd.read_csv(f, chunksize=chunk_rows, dtype=str, skipinitialspace=True,
+                             skiprows=range(1, skip_rows + 1) if skip_rows else None)
+        for chunk in reader:
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            yield offset, chunk, min((offset + len(chunk)) / total, 1.0)
+            offset += len(chunk)
+
+
+def stream_import(client, f, filename: str, name2id: Dict[str, str], auto_create: bool = False,
+                  provinces: Optional[Dict[str, str]] = None, chunk_rows: int = STREAM_CHUNK,
+                  skip_rows: int = 0, on_hospitals=None) -> Iterator[dict]:
+    """
+    นำเข้าทีละก้อน yield ผลของแต่ละก้อนหลังเขียนสำเร็จ
+    (ผลของ import_frame + 'rows_done' = จำนวนแถวข้อมูลที่ commit แล้ว, 'fraction')
+    ก้อนที่เขียนไม่สำเร็จ → exception ลอยขึ้น ผู้เรียกเก็บ rows_done ล่าสุดไว้ resume
+    """
+    for offset, chunk, frac in iter_frames(f, filename, chunk_rows, skip_rows):
+        missing = set(REQUIRED_COLS) - set(chunk.columns)
+        if missing:
+            raise ValueError(f"คอลัมน์ต้องมี: {sorted(REQUIRED_COLS)} (ไม่พบ {sorted(missing)})")
+        res = import_frame(client, chunk, name2id, auto_create, provinces, row_offset=offset,
+                           strict=True, on_hospitals=on_hospitals)
+        res["rows_done"] = offset + len(chunk)
+        res["fraction"] = frac
+        yield res